@@ -0,0 +1,124 @@
+"""
+Throughput and latency of the sync and async product views under ASGI.
+
+Each variant runs in its own process (PRODUCTS_ASYNC_VIEWS=0/1) with the same
+single ASGI application instance, driven in-process by --concurrency clients
+issuing a mix of catalog, cart and order requests for --seconds. Both use the
+same on-disk SQLite database, seeded once.
+
+Usage:
+    python -m benchmarks.bench_async_views --concurrency 32 --seconds 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PRODUCTS = 200
+
+# (weight, method, path) of the requests each client picks from
+WORKLOAD = [
+    (50, 'get', '/api/v1/products/'),
+    (20, 'get', '/api/v1/products/{product}/'),
+    (15, 'get', '/api/v1/cart/'),
+    (10, 'get', '/api/v1/orders/'),
+    (5, 'post', '/api/v1/cart/'),
+]
+
+
+def run(concurrency, seconds):
+    """
+    Drives the ASGI application and returns throughput and latency percentiles.
+    """
+    from benchmarks.utils import setup_django
+    setup_django()
+
+    from django.test import AsyncClient
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from products.models import Product
+    from users.models import User
+
+    clients = list(User.objects.filter(username__startswith='client').order_by('pk')[:concurrency])
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    weights = [weight for weight, _, _ in WORKLOAD]
+
+    async def client_loop(user, deadline, latencies, errors):
+        client = AsyncClient()
+        # AsyncClient ignores headers given to its constructor, so pass them per request
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        while time.perf_counter() < deadline:
+            _, method, path = random.choices(WORKLOAD, weights)[0]
+            path = path.format(product=random.choice(product_ids))
+            start = time.perf_counter()
+            if method == 'post':
+                response = await client.post(path, {'product_id': random.choice(product_ids), 'quantity': 1}, content_type='application/json', headers=headers)
+            else:
+                response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+
+    async def main():
+        latencies, errors = [], []
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(client_loop(user, deadline, latencies, errors) for user in clients))
+        return latencies, errors
+
+    started = time.perf_counter()
+    latencies, errors = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentiles[49] * 1000,
+        'p99_ms': percentiles[98] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args.concurrency, args.seconds)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, 'BENCH_DB_PATH': os.path.join(tmp, 'bench.sqlite3')}
+        os.environ.update(env)
+
+        from benchmarks.seed import seed
+        from benchmarks.utils import setup_django
+        setup_django()
+        seed(clients=args.concurrency, products=PRODUCTS, orders_per_client=1)
+
+        print(f"{'views':<8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, flag in (('sync', '0'), ('async', '1')):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_async_views', '--run',
+                 '--concurrency', str(args.concurrency), '--seconds', str(args.seconds)],
+                env={**env, 'PRODUCTS_ASYNC_VIEWS': flag}, check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{name:<8}{result['requests']:>10}{result['errors']:>8}{result['rps']:>10.0f}"
+                f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
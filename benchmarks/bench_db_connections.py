@@ -0,0 +1,89 @@
+"""
+Per-request database connection overhead with and without connection reuse.
+
+Each iteration is a request cycle reduced to its database work: the
+request_started signal, one trivial query and the request_finished signal,
+which is where Django closes or recycles the connection. Every mode runs in its
+own process so it picks up its DATABASES settings:
+
+    new connection   CONN_MAX_AGE=0, a connection is opened per request
+    persistent       CONN_MAX_AGE=60 with CONN_HEALTH_CHECKS
+    pool             psycopg 3 pool (DB_POOL=1)
+
+Meaningful against PostgreSQL only:
+    BENCH_DB=postgres RDS_HOSTNAME=... python -m benchmarks.bench_db_connections
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+MODES = {
+    'new connection': {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '0'},
+    'persistent': {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '60'},
+    'pool': {'DB_POOL': '1'},
+}
+
+
+def run(iterations):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.core.signals import request_finished, request_started
+    from django.db import connection
+
+    from core.db import pool_stats
+
+    def request_cycle():
+        request_started.send(sender=None)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        request_finished.send(sender=None)
+
+    request_cycle()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        request_cycle()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'vendor': connection.vendor,
+        'mean_us': elapsed / iterations * 1e6,
+        'pool': pool_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args.iterations)))
+        return
+
+    results = {}
+    for name, env in MODES.items():
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_db_connections', '--run', '--iterations', str(args.iterations)],
+            env={**os.environ, **env}, check=True, capture_output=True, text=True,
+        ).stdout
+        results[name] = json.loads(output.strip().splitlines()[-1])
+
+    baseline = results['persistent']['mean_us']
+    print(f"database: {results['persistent']['vendor']}")
+    print(f"  {'mode':<18}{'mean µs':>12}{'overhead µs':>14}")
+    for name, result in results.items():
+        print(f"  {name:<18}{result['mean_us']:>12.1f}{result['mean_us'] - baseline:>14.1f}")
+        if result['pool']:
+            print(f"  {'':<18}pool: {result['pool']}")
+
+
+if __name__ == '__main__':
+    main()
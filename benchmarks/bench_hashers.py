@@ -0,0 +1,82 @@
+"""
+Password verifications (≈ logins) per second per core for each hasher cost setting,
+and the aggregate rate when verifications run in the users.hashing thread pool.
+
+Usage:
+    python -m benchmarks.bench_hashers --seconds 2 --workers 4
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import hashers  # noqa: E402
+
+PASSWORD = 'Zq8!mvLp#x2'
+
+COST_SETTINGS = [
+    ('pbkdf2', {'iterations': 600_000}),
+    ('pbkdf2', {'iterations': hashers.PBKDF2PasswordHasher.iterations}),
+    ('scrypt', {'work_factor': 2**14}),
+    ('scrypt', {'work_factor': 2**15, 'maxmem': 64 * 1024 * 1024}),
+    ('argon2', {'time_cost': 2, 'memory_cost': 19_456, 'parallelism': 1}),
+    ('argon2', {'time_cost': 3, 'memory_cost': 65_536, 'parallelism': 1}),
+]
+
+HASHER_CLASSES = {
+    'pbkdf2': hashers.PBKDF2PasswordHasher,
+    'scrypt': hashers.ScryptPasswordHasher,
+    'argon2': hashers.Argon2PasswordHasher,
+}
+
+
+def make_hasher(name, params):
+    hasher = HASHER_CLASSES[name]()
+    for param, value in params.items():
+        setattr(hasher, param, value)
+    return hasher
+
+
+def verifications_per_second(hasher, encoded, seconds, workers):
+    def worker():
+        count = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            hasher.verify(PASSWORD, encoded)
+            count += 1
+        return count
+
+    with ThreadPoolExecutor(workers) as pool:
+        counts = list(pool.map(lambda _: worker(), range(workers)))
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'hasher':<8}{'params':<52}{'logins/s/core':>14}{f'pool x{args.workers}':>12}")
+    for name, params in COST_SETTINGS:
+        try:
+            hasher = make_hasher(name, params)
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+        except (ImportError, ValueError) as exc:
+            print(f'{name:<8}{str(params):<52}  skipped: {exc}')
+            continue
+
+        single = verifications_per_second(hasher, encoded, args.seconds, 1)
+        pooled = verifications_per_second(hasher, encoded, args.seconds, args.workers)
+        print(f'{name:<8}{str(params):<52}{single:>14.1f}{pooled:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
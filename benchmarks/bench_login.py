@@ -0,0 +1,86 @@
+"""
+Login throughput: legacy phone-number credential resolution vs EmailOrPhoneBackend.
+
+Usage:
+    python -m benchmarks.bench_login --users 1000 --iterations 2000
+"""
+
+import argparse
+import random
+
+from benchmarks.utils import setup_django, measure, report
+
+
+def legacy_authenticate(identifier, password):
+    """
+    The credential resolution MyTokenObtainPairSerializer.validate used to do:
+    validate_email, an uncached phonenumbers.parse, a lookup by phone and then
+    a second lookup by email inside authenticate().
+    """
+    import phonenumbers
+    from django.contrib.auth.backends import ModelBackend
+    from django.core.exceptions import ValidationError
+    from django.core.validators import validate_email
+    from users.models import User
+
+    try:
+        validate_email(identifier)
+        email = identifier
+    except ValidationError:
+        digits = ''.join(filter(str.isdigit, identifier))
+        if digits.startswith('254'):
+            digits = digits[3:]
+        parsed = phonenumbers.parse('+254' + digits.lstrip('0'), None)
+        phone = phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+        email = User.objects.get(phone=phone).email
+    return ModelBackend().authenticate(None, username=email, password=password)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth import authenticate
+    from django.contrib.auth.hashers import make_password
+    from users.models import User
+
+    password = 'Secret@123'
+    hashed = make_password(password)
+    User.objects.bulk_create(
+        User(
+            email=f'user{i}@example.com',
+            phone=f'+2547{i:08d}',
+            first_name='Bench',
+            last_name=str(i),
+            username=f'user{i}',
+            passport_or_id=f'ID{i}',
+            role=User.Roles.CLIENT,
+            password=hashed,
+        )
+        for i in range(args.users)
+    )
+
+    rng = random.Random(0)
+    phones = [f'07{i:08d}' for i in range(args.users)]
+
+    def legacy():
+        assert legacy_authenticate(rng.choice(phones), password) is not None
+
+    def backend():
+        assert authenticate(None, email=rng.choice(phones), password=password) is not None
+
+    report(
+        f'Phone-number login ({args.users} users, {args.iterations} iterations)',
+        {
+            'legacy serializer lookup': measure(legacy, args.iterations),
+            'EmailOrPhoneBackend': measure(backend, args.iterations),
+        },
+    )
+
+
+if __name__ == '__main__':
+    main()
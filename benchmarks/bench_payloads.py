@@ -0,0 +1,64 @@
+"""
+Payload size and encode time of the API formats: JSON (core.renderers.
+ORJSONRenderer) and MessagePack, each uncompressed, gzipped and brotli'd
+(when brotli is installed) as CompressionMiddleware would send them.
+
+Encode time covers rendering plus compression of a ProductSerializer page and
+of OrderSerializer orders with their items.
+
+Usage:
+    python -m benchmarks.bench_payloads --products 200 --orders 50 --iterations 200
+"""
+
+import argparse
+import time
+
+from benchmarks.utils import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=200, help='Products in the catalog payload.')
+    parser.add_argument('--orders', type=int, default=50, help='Orders in the orders payload.')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from benchmarks.seed import seed
+    from core.compression import brotli, compress
+    from core.renderers import MessagePackRenderer, ORJSONRenderer
+    from products.models import Order, Product
+    from products.serializers import OrderSerializer, ProductSerializer
+
+    seed(clients=args.orders, products=args.products, orders_per_client=1)
+    payloads = {
+        'products': ProductSerializer(Product.objects.order_by('pk'), many=True).data,
+        'orders': OrderSerializer(Order.objects.with_items().order_by('pk'), many=True).data,
+    }
+    renderers = {'json': ORJSONRenderer(), 'msgpack': MessagePackRenderer()}
+    encodings = [None, 'gzip'] + (['br'] if brotli is not None else [])
+
+    for name, data in payloads.items():
+        print(f'{name} ({len(data)} rows)')
+        print(f"  {'format':<20}{'bytes':>10}{'vs json':>10}{'encode µs':>12}")
+        baseline = None
+        for format_, renderer in renderers.items():
+            for encoding in encodings:
+                def encode():
+                    content = renderer.render(data)
+                    return compress(content, encoding) if encoding else content
+
+                size = len(encode())
+                start = time.perf_counter()
+                for _ in range(args.iterations):
+                    encode()
+                mean_us = (time.perf_counter() - start) / args.iterations * 1e6
+                baseline = baseline or size
+                label = f'{format_} + {encoding}' if encoding else format_
+                print(f'  {label:<20}{size:>10}{size / baseline:>10.0%}{mean_us:>12.1f}')
+        print()
+
+
+if __name__ == '__main__':
+    main()
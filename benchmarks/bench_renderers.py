@@ -0,0 +1,67 @@
+"""
+Rendering and parsing throughput of DRF's JSONRenderer/JSONParser and the
+orjson-based ones (core.renderers, core.parsers) on representative payloads:
+
+    products       a ProductSerializer list page
+    orders         OrderSerializer orders with their items and products
+    raw values     Product.objects.values() rows (Decimal and datetime objects)
+
+Each payload is also checked to decode to the same data with both renderers.
+
+Usage:
+    python -m benchmarks.bench_renderers --products 500 --orders 100 --iterations 200
+"""
+
+import argparse
+import io
+import json
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=500, help='Products in the products payload.')
+    parser.add_argument('--orders', type=int, default=100, help='Orders in the orders payload.')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from benchmarks.seed import seed
+    from core.parsers import ORJSONParser
+    from core.renderers import ORJSONRenderer
+    from products.models import Order, Product
+    from products.serializers import OrderSerializer, ProductSerializer
+
+    seed(clients=args.orders, products=args.products, orders_per_client=1)
+    payloads = {
+        'products': ProductSerializer(Product.objects.order_by('pk'), many=True).data,
+        'orders': OrderSerializer(Order.objects.with_items().order_by('pk'), many=True).data,
+        'raw values': list(Product.objects.order_by('pk').values()),
+    }
+
+    renderers = {'drf': JSONRenderer(), 'orjson': ORJSONRenderer()}
+    parsers = {'drf': JSONParser(), 'orjson': ORJSONParser()}
+
+    for name, data in payloads.items():
+        rendered = {key: renderer.render(data) for key, renderer in renderers.items()}
+        if json.loads(rendered['drf']) != json.loads(rendered['orjson']):
+            raise SystemExit(f'{name}: the renderers disagree')
+
+        results = {}
+        for key, renderer in renderers.items():
+            results[f'render {key}'] = measure(lambda renderer=renderer: renderer.render(data), args.iterations)
+        for key, parser_ in parsers.items():
+            content = rendered['drf']
+            results[f'parse {key}'] = measure(lambda parser_=parser_: parser_.parse(io.BytesIO(content)), args.iterations)
+        report(f'{name} ({len(data)} rows, {len(rendered["drf"]) / 1024:.0f} KiB)', results)
+        print(f"  render speedup {results['render drf']['mean_us'] / results['render orjson']['mean_us']:.1f}x, "
+              f"parse speedup {results['parse drf']['mean_us'] / results['parse orjson']['mean_us']:.1f}x\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Token refresh throughput: per-refresh user lookup vs cached claims.
+
+Usage:
+    python -m benchmarks.bench_token_refresh --users 1000 --iterations 5000
+"""
+
+import argparse
+import random
+
+from benchmarks.utils import setup_django, measure, report
+
+
+def legacy_refresh(raw_refresh):
+    """
+    What CustomTokenRefreshSerializer.validate used to do: load the user and
+    re-mint every claim on every refresh.
+    """
+    from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+    from users.models import User
+
+    refresh = RefreshToken(raw_refresh)
+    refresh.set_jti()
+    refresh.set_exp()
+    refresh.set_iat()
+    data = {'refresh': str(refresh)}
+
+    user = User.objects.get(id=refresh.get('user_id'))
+    access_token = AccessToken.for_user(user)
+    access_token['phone'] = str(user.phone)
+    access_token['email'] = str(user.email)
+    access_token['business_name'] = str(user.business_name)
+    access_token['first_name'] = str(user.first_name)
+    access_token['middle_name'] = str(user.middle_name) if user.middle_name else ''
+    access_token['last_name'] = str(user.last_name)
+    access_token['username'] = str(user.username)
+    access_token['license_status'] = str(user.license_status)
+    access_token['role'] = user.role
+    access_token['is_verified'] = user.is_verified
+    data['access'] = str(access_token)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from users.models import User
+    from users.serializers import CustomTokenRefreshSerializer, MyTokenObtainPairSerializer
+
+    users = User.objects.bulk_create(
+        User(
+            email=f'user{i}@example.com',
+            phone=f'+2547{i:08d}',
+            first_name='Bench',
+            last_name=str(i),
+            username=f'user{i}',
+            passport_or_id=f'ID{i}',
+            role=User.Roles.CLIENT,
+        )
+        for i in range(args.users)
+    )
+    tokens = [str(MyTokenObtainPairSerializer.get_token(user)) for user in users]
+
+    rng = random.Random(0)
+
+    def legacy():
+        legacy_refresh(rng.choice(tokens))
+
+    def refresh(index):
+        # Rotation revokes the token used, so clients carry on with the new one
+        serializer = CustomTokenRefreshSerializer(data={'refresh': tokens[index]})
+        serializer.is_valid(raise_exception=True)
+        tokens[index] = serializer.validated_data['refresh']
+
+    def cached():
+        refresh(rng.randrange(len(tokens)))
+
+    # Warm the claims cache the way steady-state traffic would
+    for index in range(len(tokens)):
+        refresh(index)
+
+    report(
+        f'Token refresh ({args.users} users, {args.iterations} iterations)',
+        {
+            'user lookup per refresh': measure(legacy, args.iterations),
+            'cached claims': measure(cached, args.iterations),
+        },
+    )
+
+
+if __name__ == '__main__':
+    main()
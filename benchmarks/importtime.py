@@ -0,0 +1,107 @@
+"""
+Import-time report and budget check for worker cold start.
+
+Starts a fresh interpreter under `python -X importtime` that loads what a
+worker loads before serving its first request (settings, apps, middleware
+and every URLconf and view), then reports the total import time, the
+packages that cost the most, and whether modules that workers must not
+import (the schema generators, see core.openapi) were pulled in.
+
+Exits with status 1 when the total exceeds --budget-ms or a forbidden module
+was imported, so it can run in CI. The total is the best of --runs runs.
+
+Usage:
+    python -m benchmarks.importtime --budget-ms 1500
+    python -m benchmarks.importtime --top 30 --settings config.settings
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+WORKER_STARTUP = (
+    'import config.wsgi\n'
+    'from django.urls import get_resolver\n'
+    'get_resolver().url_patterns\n'
+    'import sys\n'
+    'print(*sys.modules)\n'
+)
+
+# rest_framework.compat imports coreapi whenever it's installed
+FORBIDDEN = ['drf_yasg', 'rest_framework_swagger', 'coreapi', 'swagger_spec_validator']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(settings_module):
+    """
+    Returns [(module, self µs, cumulative µs, depth)] for one cold start and
+    the names of the modules loaded. (importtime also lists failed imports.)
+    """
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', WORKER_STARTUP],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if process.returncode:
+        sys.exit(f'worker startup failed:\n{process.stderr[-2000:]}')
+
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports, set(process.stdout.split())
+
+
+def by_package(imports):
+    totals = defaultdict(int)
+    for name, self_us, _, _ in imports:
+        totals[name.split('.')[0]] += self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'))
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15, help='Packages and modules to list.')
+    parser.add_argument('--budget-ms', type=float, help='Fail when the total import time exceeds this.')
+    parser.add_argument('--forbid', nargs='*', default=FORBIDDEN, help='Packages workers must not import.')
+    args = parser.parse_args()
+
+    runs = [run(args.settings) for _ in range(args.runs)]
+    imports, loaded = min(runs, key=lambda run: sum(self_us for _, self_us, _, _ in run[0]))
+    total_ms = sum(self_us for _, self_us, _, _ in imports) / 1000
+
+    print(f'{len(imports)} modules imported in {total_ms:.0f} ms (best of {args.runs}, {args.settings})')
+    print(f"\n  {'package':<40}{'self ms':>10}")
+    for package, self_us in by_package(imports)[:args.top]:
+        print(f'  {package:<40}{self_us / 1000:>10.1f}')
+    print(f"\n  {'slowest top-level imports':<40}{'cumul. ms':>10}")
+    top_level = sorted((item for item in imports if item[3] == 0), key=lambda item: item[2], reverse=True)
+    for name, _, cumulative_us, _ in top_level[:args.top]:
+        print(f'  {name:<40}{cumulative_us / 1000:>10.1f}')
+
+    failures = []
+    loaded_packages = {name.split('.')[0] for name in loaded}
+    for package in args.forbid:
+        if package in loaded_packages:
+            failures.append(f'{package} is imported at startup')
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        failures.append(f'import time {total_ms:.0f} ms exceeds the budget of {args.budget_ms:.0f} ms')
+
+    print()
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if not failures:
+        print('OK' if args.budget_ms is None else f'OK: within the budget of {args.budget_ms:.0f} ms')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
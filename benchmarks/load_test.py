@@ -0,0 +1,257 @@
+"""
+End-to-end load test of the API with a mixed workload of concurrent clients.
+
+Seeds a fresh SQLite database (or BENCH_DB_PATH) at the requested scale, then
+runs --concurrency virtual users through the ASGI application for --seconds.
+Each virtual user logs in and then repeatedly picks a scenario:
+
+    browse     list the catalog, open a product
+    cart       add a product to the cart, view the cart
+    checkout   view the cart, order its contents, empty the cart
+    auth       log in again, refresh the token pair
+
+Reports throughput, p50/p95/p99 latency and queries per request for every
+endpoint, and saves them as JSON under benchmarks/results/ (or --output) so
+runs can be compared with --compare.
+
+Usage:
+    python -m benchmarks.load_test --clients 500 --products 2000 --concurrency 50 --seconds 30
+    python -m benchmarks.load_test --compare benchmarks/results/<earlier run>.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# scenario: weight
+SCENARIOS = {
+    'browse': 60,
+    'cart': 20,
+    'checkout': 10,
+    'auth': 10,
+}
+
+
+class VirtualUser:
+    """
+    A logged-in API client recording the latency of every request it makes.
+    """
+
+    def __init__(self, client, email, stats, rng):
+        self.client = client
+        self.email = email
+        self.stats = stats
+        self.rng = rng
+        self.access = None
+        self.refresh = None
+
+    async def request(self, method, path, data=None, auth=True):
+        headers = {'Authorization': f'Bearer {self.access}'} if auth and self.access else {}
+        start = time.perf_counter()
+        if data is None:
+            response = await getattr(self.client, method)(path, headers=headers)
+        else:
+            response = await getattr(self.client, method)(path, data, content_type='application/json', headers=headers)
+        elapsed = time.perf_counter() - start
+
+        match = response.resolver_match
+        name = f"{method.upper()} {match.view_name if match else path}"
+        self.stats[name]['latencies'].append(elapsed)
+        if response.status_code >= 400:
+            self.stats[name]['errors'] += 1
+        return response
+
+    async def login(self):
+        from benchmarks.seed import PASSWORD
+
+        response = await self.request('post', '/api/v1/login/', {'email': self.email, 'password': PASSWORD}, auth=False)
+        if response.status_code == 200:
+            self.access, self.refresh = response.json()['access'], response.json()['refresh']
+
+    async def browse(self, product_ids):
+        await self.request('get', '/api/v1/products/')
+        await self.request('get', f'/api/v1/products/{self.rng.choice(product_ids)}/')
+
+    async def cart(self, product_ids):
+        await self.request('post', '/api/v1/cart/', {'product_id': self.rng.choice(product_ids), 'quantity': self.rng.randint(1, 3)})
+        await self.request('get', '/api/v1/cart/')
+
+    async def checkout(self, product_ids):
+        response = await self.request('get', '/api/v1/cart/')
+        items = response.json().get('items', []) if response.status_code == 200 else []
+        if not items:
+            return
+        order = {'products': [{'product_id': item['product']['id'], 'quantity': item['quantity']} for item in items]}
+        await self.request('post', '/api/v1/orders/', order)
+        for item in items:
+            await self.request('delete', f"/api/v1/cart-item/delete/{item['id']}/")
+
+    async def auth(self, product_ids):
+        await self.login()
+        response = await self.request('post', '/api/v1/token/refresh/', {'refresh': self.refresh}, auth=False)
+        if response.status_code == 200:
+            self.access = response.json()['access']
+            self.refresh = response.json().get('refresh', self.refresh)
+
+
+async def run_workload(emails, product_ids, seconds, random_seed):
+    from django.test import AsyncClient
+
+    stats = defaultdict(lambda: {'latencies': [], 'errors': 0})
+    names, weights = list(SCENARIOS), list(SCENARIOS.values())
+
+    async def loop(index, email, deadline):
+        rng = random.Random(random_seed + index)
+        user = VirtualUser(AsyncClient(), email, stats, rng)
+        await user.login()
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(names, weights)[0]
+            await getattr(user, scenario)(product_ids)
+
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(loop(index, email, deadline) for index, email in enumerate(emails)))
+    return stats
+
+
+def percentile(values, pct):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def summarize(stats, elapsed):
+    """
+    Per-endpoint throughput, latency percentiles and queries per request.
+    """
+    from core.metrics import registry
+
+    queries = registry.values['http_request_db_queries']
+    endpoints = {}
+    for name, data in sorted(stats.items()):
+        method, view = name.split(' ', 1)
+        latencies = data['latencies']
+        histogram = queries.get((view, method))
+        endpoints[name] = {
+            'requests': len(latencies),
+            'errors': data['errors'],
+            'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'queries_per_request': histogram[-1] / sum(histogram[:-1]) if histogram else None,
+        }
+
+    every = [latency for data in stats.values() for latency in data['latencies']]
+    total = {
+        'requests': len(every),
+        'errors': sum(data['errors'] for data in stats.values()),
+        'rps': len(every) / elapsed,
+        'p50_ms': percentile(every, 50) * 1000,
+        'p95_ms': percentile(every, 95) * 1000,
+        'p99_ms': percentile(every, 99) * 1000,
+    }
+    return total, endpoints
+
+
+def print_table(total, endpoints, previous=None):
+    print(f"  {'endpoint':<36}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    rows = [*endpoints.items(), ('TOTAL', total)]
+    for name, result in rows:
+        queries = result.get('queries_per_request')
+        print(
+            f"  {name:<36}{result['requests']:>9}{result['errors']:>8}{result['rps']:>9.1f}"
+            f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+            f"{'' if queries is None else f'{queries:.1f}':>9}"
+        )
+        before = (previous or {}).get(name)
+        if before:
+            print(
+                f"  {'  vs previous':<36}{'':>17}{result['rps'] - before['rps']:>+9.1f}"
+                f"{result['p50_ms'] - before['p50_ms']:>+9.1f}{result['p95_ms'] - before['p95_ms']:>+9.1f}"
+                f"{result['p99_ms'] - before['p99_ms']:>+9.1f}"
+            )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=200, help='Seeded client accounts.')
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--orders-per-client', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=20, help='Virtual users (at most --clients).')
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the data and the workload.')
+    parser.add_argument('--output', help='Where to save the JSON results.')
+    parser.add_argument('--compare', help='Earlier JSON results to compare against.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault('BENCH_DB_PATH', os.path.join(tmp, 'load_test.sqlite3'))
+
+        from benchmarks.utils import setup_django
+        setup_django()
+
+        from benchmarks.seed import seed
+        from core.metrics import registry
+        from products.models import Product
+        from users.models import User
+
+        if not User.objects.exists():
+            started = time.perf_counter()
+            counts = seed(args.clients, args.products, args.orders_per_client, args.seed)
+            print(f'seeded {counts} in {time.perf_counter() - started:.1f}s')
+
+        emails = list(User.objects.filter(username__startswith='client').order_by('pk').values_list('email', flat=True)[:args.concurrency])
+        product_ids = list(Product.objects.values_list('pk', flat=True))
+
+        registry.clear()
+        started = time.perf_counter()
+        stats = asyncio.run(run_workload(emails, product_ids, args.seconds, args.seed))
+        elapsed = time.perf_counter() - started
+
+    total, endpoints = summarize(stats, elapsed)
+    result = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'config': vars(args),
+        'total': total,
+        'endpoints': endpoints,
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            earlier = json.load(file)
+        previous = {**earlier['endpoints'], 'TOTAL': earlier['total']}
+        print(f"compared with {earlier.get('commit')} ({earlier.get('timestamp')})")
+    print_table(total, endpoints, previous)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{result['timestamp'][:19].replace(':', '')}-{result['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(result, file, indent=2)
+    print(f'results saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
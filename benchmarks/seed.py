@@ -0,0 +1,66 @@
+"""
+Seeds the benchmark database with a seller, clients, products and orders.
+
+Everything is inserted with bulk_create and every user shares one password
+hash, so seeding a few thousand users takes seconds.
+"""
+
+import random
+from decimal import Decimal
+
+PASSWORD = 'Bench-Pass-1!'
+
+
+def seed(clients=100, products=500, orders_per_client=2, random_seed=0):
+    """
+    Creates the seller 'seller', the clients client0..client<N-1> (all with
+    PASSWORD), the products and some orders per client, and returns the number
+    of rows created per model.
+    """
+    from django.contrib.auth.hashers import make_password
+
+    from products.models import Order, OrderItem, Product
+    from users.models import User
+
+    rng = random.Random(random_seed)
+    password = make_password(PASSWORD)
+
+    def user(username, index, role):
+        return User(
+            email=f'{username}@example.com', username=username, phone=f'+2547{index:08d}',
+            passport_or_id=username, first_name='Bench', last_name=username.title(),
+            role=role, password=password,
+        )
+
+    seller = User.objects.bulk_create([user('seller', 0, User.Roles.ADMIN)])[0]
+    users = User.objects.bulk_create(
+        [user(f'client{i}', i + 1, User.Roles.CLIENT) for i in range(clients)],
+        batch_size=1000,
+    )
+    catalog = Product.objects.bulk_create(
+        [
+            Product(
+                seller=seller, name=f'Product {i}', description=f'Benchmark product {i}',
+                price=Decimal(rng.randint(100, 100_000)) / 100, stock_quantity=rng.randint(0, 500),
+            )
+            for i in range(products)
+        ],
+        batch_size=1000,
+    )
+
+    orders = []
+    items = []
+    for client in users:
+        for _ in range(orders_per_client):
+            picked = rng.sample(catalog, k=min(len(catalog), rng.randint(1, 4)))
+            order = Order(client=client, total_prices=0)
+            for product in picked:
+                quantity = rng.randint(1, 3)
+                items.append(OrderItem(order=order, product=product, quantity=quantity, price_at_time_of_order=product.price))
+                order.total_prices += product.price * quantity
+            orders.append(order)
+    # The items pick up their order ids, set by the first bulk_create, on save
+    Order.objects.bulk_create(orders, batch_size=1000)
+    OrderItem.objects.bulk_create(items, batch_size=1000)
+
+    return {'users': len(users) + 1, 'products': len(catalog), 'orders': len(orders), 'order items': len(items)}
@@ -0,0 +1,44 @@
+"""
+Settings used by the benchmark scripts.
+
+Runs the project against a local SQLite database so benchmarks don't need the
+RDS credentials. Set BENCH_DB_PATH to keep the database on disk between runs,
+or BENCH_DB=postgres to use the project's own DATABASES (RDS_* variables).
+"""
+
+from config.settings import *  # noqa: F401,F403
+
+if os.environ.get('BENCH_DB') != 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BENCH_DB_PATH', ':memory:'),
+        }
+    }
+    # BENCH_REPLICA_PATH adds a second SQLite file as a replica, to exercise
+    # core.routers.ReplicaRouter locally (nothing replicates into it).
+    DATABASE_REPLICAS = []
+    if os.environ.get('BENCH_REPLICA_PATH'):
+        DATABASES['replica1'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ['BENCH_REPLICA_PATH'],
+        }
+        DATABASE_REPLICAS.append('replica1')
+
+# Benchmarks measure request handling, not the cost of the hasher, unless asked to.
+if os.environ.get('BENCH_REAL_HASHER') != '1':
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Benchmarks drive the app through Django's test client
+ALLOWED_HOSTS = ['*']
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# Cache token claims as production does with REDIS_URL. Without it CACHES is
+# per-process locmem, which is enough here: a benchmark runs in one process, so
+# the invalidations reach every reader.
+USER_CLAIMS_CACHE_TIMEOUT = int(os.environ.get('USER_CLAIMS_CACHE_TIMEOUT', 300))
+
+# Load tests log in far more often than the login throttles allow
+if os.environ.get('BENCH_THROTTLING') != '1':
+    REST_FRAMEWORK = {**REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
@@ -0,0 +1,56 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+
+import os
+import time
+
+
+def setup_django():
+    """
+    Configures Django with benchmarks.settings and creates the schema.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+def measure(func, iterations):
+    """
+    Calls ``func`` ``iterations`` times and returns a dict with ops/sec,
+    mean latency (µs) and the number of queries issued per call.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    queries_per_call = len(queries)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'ops_per_sec': iterations / elapsed,
+        'mean_us': elapsed / iterations * 1e6,
+        'queries': queries_per_call,
+    }
+
+
+def report(title, results):
+    """
+    Prints a table of ``{name: measure(...)}`` results.
+    """
+    print(title)
+    print(f"  {'case':<28}{'ops/sec':>12}{'mean µs':>12}{'queries':>10}")
+    for name, result in results.items():
+        print(
+            f"  {name:<28}{result['ops_per_sec']:>12.0f}"
+            f"{result['mean_us']:>12.1f}{result['queries']:>10}"
+        )
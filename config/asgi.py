@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for ORDER_EVENTS_PATH (Server-Sent Events or WebSocket) go to
+products.events, everything else to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +15,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from products.events import order_events  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] in ('http', 'websocket') and scope['path'] == settings.ORDER_EVENTS_PATH:
+        return await order_events(scope, receive, send)
+    if scope['type'] == 'websocket':
+        await receive()
+        return await send({'type': 'websocket.close'})
+    return await django_application(scope, receive, send)
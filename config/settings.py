@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
+import copy
+import json
 import os
 
 load_dotenv() 
@@ -47,16 +49,22 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     
-    'rest_framework_swagger',
-    'drf_yasg',
-    
+    'core',
     'users',
     'products',
 ]
 
 AUTH_USER_MODEL = 'users.User'
 
+# Login accepts either an email address or a phone number
+AUTHENTICATION_BACKENDS = [
+    'users.backends.EmailOrPhoneBackend',
+]
+
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,6 +72,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -89,16 +98,78 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Database connections
+# With DB_POOL=1 each process keeps a psycopg 3 connection pool (requires
+# psycopg[pool]); otherwise connections are kept open for DB_CONN_MAX_AGE seconds.
+# Either way, connections are checked before reuse so a dropped one is replaced
+# instead of failing the request.
+DB_POOL = os.environ.get('DB_POOL', '0') == '1'
+
 DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql_psycopg2',
+            'ENGINE': 'django.db.backends.postgresql',
             'NAME': os.environ.get('RDS_DB_NAME'),
             'USER': os.environ.get('RDS_USERNAME'),
             'PASSWORD': os.environ.get('RDS_PASSWORD'),
             'HOST': os.environ.get('RDS_HOSTNAME'),
             'PORT': os.environ.get('RDS_PORT'),
+            # Pooled connections are returned to the pool instead of persisting
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        # Seconds a request waits for a free connection before failing
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
+# Read replicas
+# RDS_REPLICA_HOSTNAMES is a comma-separated list of replica hosts, added as the
+# databases replica1, replica2, ... with the primary's credentials.
+# core.routers.ReplicaRouter sends the reads of GET requests to replicas lagging
+# less than REPLICA_MAX_LAG_SECONDS (measured every REPLICA_LAG_CHECK_INTERVAL
+# seconds), except for REPLICA_PIN_SECONDS after the same user wrote something.
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, os.environ.get('RDS_REPLICA_HOSTNAMES', '').split(',')), start=1):
+    DATABASES[f'replica{_index}'] = {
+        **copy.deepcopy(DATABASES['default']),
+        'HOST': _host.strip(),
+        # Tests read through the primary instead of creating replica databases
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 2))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 5))
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# Cache
+# Throttle counters and cached token claims must be shared by all workers, so
+# production points REDIS_URL at a shared Redis; without it each process gets
+# its own local-memory cache.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
+
+THROTTLE_CACHE = 'default'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -110,13 +181,43 @@ AUTH_PASSWORD_VALIDATORS = [
         'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+        'NAME': 'users.password_policy.BreachedPasswordValidator',
     },
     {
         'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
     },
 ]
 
+# Password hashing
+# PASSWORD_HASHER picks the hasher for new hashes ('pbkdf2', 'scrypt' or 'argon2') and
+# PASSWORD_HASHER_PARAMS (JSON) its cost, e.g. {"work_factor": 32768} for scrypt or
+# {"time_cost": 3, "memory_cost": 65536} for argon2. Existing hashes keep working and
+# are re-hashed on the next successful login when the hasher or its cost changes.
+
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHER_PARAMS = json.loads(os.environ.get('PASSWORD_HASHER_PARAMS', '{}'))
+
+_TUNABLE_HASHERS = {
+    'pbkdf2': 'users.hashers.TunablePBKDF2PasswordHasher',
+    'scrypt': 'users.hashers.TunableScryptPasswordHasher',
+    'argon2': 'users.hashers.TunableArgon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_TUNABLE_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _TUNABLE_HASHERS.items() if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+# Async auth views hash passwords in this pool instead of on the event loop
+# (users.hashing). 'thread' or 'process'.
+PASSWORD_HASHING_EXECUTOR = os.environ.get('PASSWORD_HASHING_EXECUTOR', 'thread')
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1))
+
+# Bloom filter of breached passwords, built with
+# `manage.py build_breached_password_filter <wordlist>...`. Workers memory-map it.
+# Without it the password policy falls back to Django's common password list.
+BREACHED_PASSWORDS_FILTER = os.environ.get('BREACHED_PASSWORDS_FILTER')
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -135,6 +236,70 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (product images)
+# New uploads get content-hashed names (core.storage) and are served by
+# core.media with immutable cache headers. MEDIA_SERVE_MODE picks who sends the
+# bytes: 'django' (FileResponse, sendfile under gunicorn), 'x-accel-redirect'
+# (nginx, via an internal location at MEDIA_ACCEL_REDIRECT_PREFIX aliased to
+# MEDIA_ROOT) or 'x-sendfile' (Apache/lighttpd).
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/internal-media/')
+# Cache lifetime of files uploaded before names were hashed
+MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 3600))
+
+# Resumable image uploads (products.uploads). Chunks are assembled under
+# UPLOAD_TEMP_DIR, which should be on MEDIA_ROOT's filesystem so finished files
+# are moved rather than copied. Sessions older than UPLOAD_SESSION_TTL seconds
+# are removed by `manage.py sweep_image_uploads`.
+UPLOAD_TEMP_DIR = os.environ.get('UPLOAD_TEMP_DIR', os.path.join(BASE_DIR, 'uploads'))
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+UPLOAD_CHUNK_MAX_SIZE = int(os.environ.get('UPLOAD_CHUNK_MAX_SIZE', 4 * 1024 * 1024))
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 86400))
+
+# Catalog delta sync (products.changes). Deletions are remembered for
+# CATALOG_TOMBSTONE_RETENTION seconds (`manage.py sweep_product_tombstones`);
+# older cursors must resync. Responses stop CATALOG_CHANGES_SAFETY_LAG seconds
+# in the past so writes still being committed aren't skipped.
+CATALOG_TOMBSTONE_RETENTION = int(os.environ.get('CATALOG_TOMBSTONE_RETENTION', 30 * 86400))
+CATALOG_CHANGES_SAFETY_LAG = int(os.environ.get('CATALOG_CHANGES_SAFETY_LAG', 5))
+
+# Order status push (products.events), served by config/asgi.py under ASGI.
+# PUBSUB_BACKEND is core.pubsub.LocalBroker for a single process, or
+# core.pubsub.RedisBroker so changes made in any process reach the streams
+# held by every other one.
+ORDER_EVENTS_PATH = os.environ.get('ORDER_EVENTS_PATH', '/api/v1/orders/events/')
+ORDER_EVENTS_HEARTBEAT = int(os.environ.get('ORDER_EVENTS_HEARTBEAT', 25))
+ORDER_EVENTS_MAX_CONNECTIONS = int(os.environ.get('ORDER_EVENTS_MAX_CONNECTIONS', 20000))
+PUBSUB_REDIS_URL = os.environ.get('PUBSUB_REDIS_URL', os.environ.get('REDIS_URL', ''))
+PUBSUB_BACKEND = os.environ.get(
+    'PUBSUB_BACKEND', 'core.pubsub.RedisBroker' if PUBSUB_REDIS_URL else 'core.pubsub.LocalBroker'
+)
+PUBSUB_REDIS_PREFIX = os.environ.get('PUBSUB_REDIS_PREFIX', 'pubsub:')
+PUBSUB_QUEUE_SIZE = int(os.environ.get('PUBSUB_QUEUE_SIZE', 100))
+
+# "Frequently bought together" on ProductDetail (products.recommendations).
+# Co-purchase counts are updated as orders complete; workers reload the
+# precomputed top-K lists every SYNC_INTERVAL seconds and in full every
+# RELOAD_INTERVAL seconds. RECOMMENDATIONS_SCORE is 'cosine' or 'lift'.
+RECOMMENDATIONS_TOP_K = int(os.environ.get('RECOMMENDATIONS_TOP_K', 10))
+RECOMMENDATIONS_MIN_COUNT = int(os.environ.get('RECOMMENDATIONS_MIN_COUNT', 2))
+RECOMMENDATIONS_SCORE = os.environ.get('RECOMMENDATIONS_SCORE', 'cosine')
+RECOMMENDATIONS_MAX_ORDER_PRODUCTS = int(os.environ.get('RECOMMENDATIONS_MAX_ORDER_PRODUCTS', 50))
+RECOMMENDATIONS_BATCH_SIZE = int(os.environ.get('RECOMMENDATIONS_BATCH_SIZE', 500))
+RECOMMENDATIONS_SYNC_INTERVAL = int(os.environ.get('RECOMMENDATIONS_SYNC_INTERVAL', 60))
+RECOMMENDATIONS_RELOAD_INTERVAL = int(os.environ.get('RECOMMENDATIONS_RELOAD_INTERVAL', 3600))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.storage.ContentHashedFileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -146,8 +311,39 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.RevocableJWTAuthentication',
     ),
+    # Datetimes reach the renderers as datetime objects: JSON still gets
+    # ISO 8601 (UTC with 'Z'), MessagePack gets epoch milliseconds.
+    'DATETIME_FORMAT': None,
+    # orjson-based drop-in replacements for JSONRenderer and JSONParser, and
+    # MessagePack for clients sending `Accept: application/msgpack` (core.renderers)
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # Proxies in front of the app appending to X-Forwarded-For. With 0 the
+    # client IP used by the throttles is REMOTE_ADDR; the header is ignored
+    # because clients can set it to anything.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    # '<throttle_scope>.<ip|account|phone>', see users.throttling
+    'DEFAULT_THROTTLE_RATES': {
+        'login.ip': os.environ.get('THROTTLE_LOGIN_IP', '30/min'),
+        'login.account': os.environ.get('THROTTLE_LOGIN_ACCOUNT', '5/min'),
+        'login.phone': os.environ.get('THROTTLE_LOGIN_PHONE', '5/min'),
+        'register.ip': os.environ.get('THROTTLE_REGISTER_IP', '20/hour'),
+        'register.account': os.environ.get('THROTTLE_REGISTER_ACCOUNT', '5/hour'),
+        'register.phone': os.environ.get('THROTTLE_REGISTER_PHONE', '5/hour'),
+        'password_reset.ip': os.environ.get('THROTTLE_PASSWORD_RESET_IP', '10/hour'),
+        'password_reset.account': os.environ.get('THROTTLE_PASSWORD_RESET_ACCOUNT', '3/hour'),
+    },
 }
 
 SIMPLE_JWT = {
@@ -168,6 +364,77 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Seconds a worker trusts its cached copy of a user's claims version before
+# re-reading it; this bounds how long a revoked token keeps working.
+CLAIMS_VERSION_CACHE_TTL = int(os.environ.get('CLAIMS_VERSION_CACHE_TTL', 30))
+
+# Seconds the token claims of a user are cached for refreshes. Entries are
+# dropped when the user is saved or updated, which only reaches every worker
+# through a shared cache, so without REDIS_URL the claims aren't cached.
+USER_CLAIMS_CACHE_TIMEOUT = int(os.environ.get(
+    'USER_CLAIMS_CACHE_TIMEOUT', 300 if os.environ.get('REDIS_URL') else 0
+))
+
+# Revoked token store (users.utils.revocation). Each worker keeps a Bloom filter
+# of revoked jti's, topped up from the database every SYNC_INTERVAL seconds and
+# rebuilt every REBUILD_INTERVAL seconds to drop expired tokens.
+TOKEN_REVOCATION_SYNC_INTERVAL = int(os.environ.get('TOKEN_REVOCATION_SYNC_INTERVAL', 2))
+TOKEN_REVOCATION_REBUILD_INTERVAL = int(os.environ.get('TOKEN_REVOCATION_REBUILD_INTERVAL', 3600))
+TOKEN_REVOCATION_CAPACITY = int(os.environ.get('TOKEN_REVOCATION_CAPACITY', 100_000))
+TOKEN_REVOCATION_ERROR_RATE = 0.001
+
+# Request metrics (core.metrics), served on /metrics
+# Set METRICS_DIR to a directory shared by the worker processes of a host so
+# /metrics reports all of them; METRICS_TOKEN lets Prometheus scrape without
+# an admin session.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Request profiling (core.profiling)
+# A request is profiled when it carries a signed X-Profile header (from
+# `manage.py profile_header` or the admin's profiles page) or is picked at
+# random with probability PROFILING_SAMPLE_RATE. Profiles are kept under
+# PROFILING_DIR, newest PROFILING_MAX_PROFILES only.
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'cprofile')  # or 'sample'
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_HEADER_MAX_AGE = 3600
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILING_MAX_PROFILES = int(os.environ.get('PROFILING_MAX_PROFILES', 50))
+
+# Compression of API responses (core.compression): brotli when installed and
+# accepted by the client, gzip otherwise, for bodies of COMPRESSION_MIN_SIZE
+# bytes or more.
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 4
+
+# Idempotency-Key support for order and cart writes (core.idempotency).
+# Responses are replayed for IDEMPOTENCY_KEY_TTL seconds; duplicates of a running
+# request wait up to IDEMPOTENCY_WAIT_TIMEOUT seconds for it, and a request that
+# has held its key for IDEMPOTENCY_LOCK_TIMEOUT seconds is presumed dead.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 10))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+# OpenAPI schema served on /api/v1/schema/, generated at build time with
+# `manage.py build_openapi_schema` so workers don't import drf_yasg (core.openapi).
+OPENAPI_SCHEMA_PATH = os.environ.get('OPENAPI_SCHEMA_PATH', os.path.join(BASE_DIR, 'openapi.json'))
+
+# Serve the async product, order and cart views (products.async_views) instead
+# of the sync ones. Only worth it under an ASGI server (config.asgi).
+PRODUCTS_ASYNC_VIEWS = os.environ.get('PRODUCTS_ASYNC_VIEWS', '0') == '1'
+
+# Deleted users are purged in chunks of this many rows per statement (users.purge).
+# Purges run in a background thread of the web worker unless USER_PURGE_IN_THREAD
+# is off, in which case `manage.py purge_users` picks them up.
+USER_PURGE_CHUNK_SIZE = int(os.environ.get('USER_PURGE_CHUNK_SIZE', 1000))
+USER_PURGE_IN_THREAD = os.environ.get('USER_PURGE_IN_THREAD', '1') == '1'
+# A running purge that saved no progress for this many seconds is taken to have
+# died with its worker, and is run again by the next `manage.py purge_users`.
+USER_PURGE_STALE_TIMEOUT = int(os.environ.get('USER_PURGE_STALE_TIMEOUT', 15 * 60))
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
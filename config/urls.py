@@ -14,11 +14,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import media_view, metrics_view, profile_download, profile_list
+
 urlpatterns = [
+    path('admin/profiles/', profile_list, name='profile-list'),
+    path('admin/profiles/<str:profile_id>/<str:name>', profile_download, name='profile-download'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", media_view, name='media'),
     path("api/v1/",include("users.urls")),
     path("api/v1/",include("products.urls")),
+    path("api/v1/",include("core.urls")),
 ]
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import metrics, profiling
+
+        connection_created.connect(metrics.install_query_wrapper)
+        connection_created.connect(profiling.install_query_wrapper)
+        metrics.instrument_serializers()
@@ -0,0 +1,91 @@
+"""
+Response compression for API payloads (see CompressionMiddleware).
+
+Responses of the types in COMPRESSIBLE_TYPES that are at least
+COMPRESSION_MIN_SIZE bytes are compressed with brotli when the client accepts
+it and the brotli package is installed, and with gzip otherwise. HTML isn't
+compressed: admin pages carry CSRF tokens, which compression would expose to
+BREACH-style attacks.
+"""
+
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/msgpack',
+    'application/javascript',
+    'application/xml',
+    'text/plain',
+    'text/css',
+    'text/csv',
+)
+
+
+def accepted_encodings(request):
+    """
+    Returns the content codings the client accepts, per Accept-Encoding.
+    """
+    encodings = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        try:
+            quality = float(params.strip()[2:]) if params.strip().startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if coding and quality > 0:
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+def choose_encoding(request):
+    encodings = accepted_encodings(request)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def compress_response(request, response):
+    """
+    Compresses the response in place when its type, size and the request's
+    Accept-Encoding allow it.
+    """
+    if response.streaming or response.has_header('Content-Encoding'):
+        return response
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type not in COMPRESSIBLE_TYPES:
+        return response
+    # The response depends on Accept-Encoding even when it is sent uncompressed
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+        return response
+    encoding = choose_encoding(request)
+    if encoding is None:
+        return response
+
+    compressed = compress(response.content, encoding)
+    if len(compressed) >= len(response.content):
+        return response
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = encoding
+    # The compressed body is a different representation of the same resource
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    return response
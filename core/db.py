@@ -0,0 +1,54 @@
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .routers import replica_monitor
+
+
+def pool_stats(alias=DEFAULT_DB_ALIAS):
+    """
+    Returns the counters of this process's connection pool for `alias`, or None
+    if the database isn't pooled (see DB_POOL in settings).
+
+    in_use and waiting are current values; requests, timeouts, wait_ms and
+    connections_lost count up from the start of the process.
+    """
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return None
+
+    stats = pool.get_stats()
+    # The pool opens on first use, but reports its minimum size before that
+    size = 0 if pool.closed else stats.get('pool_size', 0)
+    return {
+        'min_size': stats.get('pool_min', 0),
+        'max_size': stats.get('pool_max', 0),
+        'size': size,
+        'in_use': size - stats.get('pool_available', 0) if size else 0,
+        'waiting': stats.get('requests_waiting', 0),
+        'requests': stats.get('requests_num', 0),
+        # Requests that gave up after the pool timeout (or found the queue full)
+        'timeouts': stats.get('requests_errors', 0),
+        'wait_ms': stats.get('requests_wait_ms', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+    }
+
+
+def database_status(alias=DEFAULT_DB_ALIAS):
+    """
+    Returns how `alias` is connected and the round trip time of a trivial query.
+    """
+    connection = connections[alias]
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return {
+        'alias': alias,
+        'vendor': connection.vendor,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+        'conn_health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+        'ping_ms': (time.perf_counter() - start) * 1000,
+        # Replication lag as of the last check by the replica router
+        'replica_lag': replica_monitor.lag.get(alias),
+        'pool': pool_stats(alias),
+    }
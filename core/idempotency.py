@@ -0,0 +1,237 @@
+"""
+Idempotency-Key support for views that create things (see idempotent()).
+
+The first request with a given key runs normally and its rendered response is
+stored, in the cache for fast lookups and in an IdempotencyRecord that also
+serves as the lock while the request runs. Retries with the same key and
+payload get the stored response back byte for byte, with an
+Idempotent-Replayed header, without running the view again. Retries that
+arrive while the first request is still running wait for it, up to
+IDEMPOTENCY_WAIT_TIMEOUT seconds. Reusing a key for a different request is
+rejected with 422.
+
+Keys are scoped to the authenticated user and expire after
+IDEMPOTENCY_KEY_TTL seconds; `manage.py sweep_idempotency_keys` deletes the
+expired records. Responses with a 5xx status or an exception aren't stored,
+so the request can be retried.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+# try_begin() outcomes
+RUN, REPLAY, WAIT, MISMATCH = 'run', 'replay', 'wait', 'mismatch'
+
+
+def cache_key(user_id, key):
+    return f"idempotency:{user_id}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def request_fingerprint(request):
+    """
+    Hash of the method, path and parsed payload, to tell a retry from a
+    different request reusing the key.
+    """
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{payload}'.encode()).hexdigest()
+
+
+def stored(record):
+    return {
+        'fingerprint': record.fingerprint,
+        'status_code': record.status_code,
+        'content_type': record.content_type,
+        'content': bytes(record.content),
+    }
+
+
+def replay(entry):
+    response = HttpResponse(entry['content'], status=entry['status_code'], content_type=entry['content_type'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def error(detail, status):
+    return Response({'detail': detail}, status=status)
+
+
+def try_begin(user_id, key, fingerprint):
+    """
+    Returns (outcome, value): (RUN, record) when this request now holds the
+    key, (REPLAY, stored response) when it has already been answered, WAIT
+    while another request holds it, and (MISMATCH, None) when the key was
+    used for a different request.
+    """
+    entry = cache.get(cache_key(user_id, key))
+    if entry is not None:
+        return (REPLAY, entry) if entry['fingerprint'] == fingerprint else (MISMATCH, None)
+
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    try:
+        with transaction.atomic():
+            record = IdempotencyRecord.objects.create(
+                user_id=user_id, key=key, fingerprint=fingerprint, locked_at=now, expires_at=expires_at,
+            )
+        return RUN, record
+    except IntegrityError:
+        pass
+
+    record = IdempotencyRecord.objects.filter(user_id=user_id, key=key).first()
+    if record is None:
+        return WAIT, None
+    abandoned = record.status_code is None and record.locked_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+    if record.expires_at <= now or abandoned:
+        # Take over keys that expired or whose request died without answering
+        taken = IdempotencyRecord.objects.filter(pk=record.pk, locked_at=record.locked_at).update(
+            fingerprint=fingerprint, status_code=None, content_type='', content=b'', locked_at=now, expires_at=expires_at,
+        )
+        if taken:
+            record.refresh_from_db()
+            return RUN, record
+        return WAIT, None
+    if record.fingerprint != fingerprint:
+        return MISMATCH, None
+    if record.status_code is None:
+        return WAIT, None
+
+    entry = stored(record)
+    cache.set(cache_key(user_id, key), entry, max(1, int((record.expires_at - now).total_seconds())))
+    return REPLAY, entry
+
+
+def complete(record, response):
+    """
+    Stores the rendered response, or releases the key if it shouldn't be
+    replayed. Nothing is stored if another request took the key over meanwhile
+    (this one ran past IDEMPOTENCY_LOCK_TIMEOUT).
+    """
+    if response.status_code >= 500:
+        release(record)
+        return
+    record.status_code = response.status_code
+    record.content_type = response.get('Content-Type', '')
+    record.content = response.content
+    held = IdempotencyRecord.objects.filter(pk=record.pk, locked_at=record.locked_at).update(
+        status_code=record.status_code, content_type=record.content_type, content=record.content,
+    )
+    if not held:
+        return
+    cache.set(cache_key(record.user_id, record.key), stored(record), settings.IDEMPOTENCY_KEY_TTL)
+
+
+def release(record):
+    IdempotencyRecord.objects.filter(pk=record.pk, locked_at=record.locked_at).delete()
+
+
+def check_key(request):
+    """
+    Returns the request's key, or an error response for an unusable one.
+    """
+    key = request.headers.get(HEADER)
+    if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+        return None, error(f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters long.', 400)
+    return key, None
+
+
+def rendered(view, request, response, args, kwargs):
+    """
+    Renders the handler's response the way dispatch() would, so the exact
+    bytes can be stored.
+    """
+    response = view.finalize_response(request, response, *args, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def outcome_response(outcome, value):
+    if outcome == REPLAY:
+        return replay(value)
+    if outcome == MISMATCH:
+        return error(f'This {HEADER} was already used for a different request.', 422)
+    return error(f'A request with this {HEADER} is still in progress.', 409)
+
+
+def idempotent(handler):
+    """
+    Decorator for the handlers (e.g. post) of APIViews and adrf APIViews
+    requiring authentication. Requests without an Idempotency-Key header run
+    as before.
+    """
+    if iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(view, request, *args, **kwargs):
+            key, response = check_key(request)
+            if response is not None:
+                return response
+            if key is None:
+                return await handler(view, request, *args, **kwargs)
+
+            fingerprint = request_fingerprint(request)
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+            while True:
+                outcome, value = await sync_to_async(try_begin)(request.user.pk, key, fingerprint)
+                if outcome != WAIT or time.monotonic() >= deadline:
+                    break
+                await asyncio.sleep(POLL_INTERVAL)
+            if outcome != RUN:
+                return outcome_response(outcome, value)
+
+            try:
+                response = await handler(view, request, *args, **kwargs)
+                response = rendered(view, request, response, args, kwargs)
+            except BaseException:
+                await sync_to_async(release)(value)
+                raise
+            await sync_to_async(complete)(value, response)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key, response = check_key(request)
+        if response is not None:
+            return response
+        if key is None:
+            return handler(view, request, *args, **kwargs)
+
+        fingerprint = request_fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        while True:
+            outcome, value = try_begin(request.user.pk, key, fingerprint)
+            if outcome != WAIT or time.monotonic() >= deadline:
+                break
+            time.sleep(POLL_INTERVAL)
+        if outcome != RUN:
+            return outcome_response(outcome, value)
+
+        try:
+            response = rendered(view, request, handler(view, request, *args, **kwargs), args, kwargs)
+        except BaseException:
+            release(value)
+            raise
+        complete(value, response)
+        return response
+
+    return wrapper
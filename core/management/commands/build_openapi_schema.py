@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.openapi import build_schema
+
+
+class Command(BaseCommand):
+    help = 'Generates the OpenAPI schema of the API into OPENAPI_SCHEMA_PATH (run at build time).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Where to write the schema (default: OPENAPI_SCHEMA_PATH).')
+        parser.add_argument('--url', help='Base URL of the API, e.g. https://api.example.com.')
+        parser.add_argument('--check', action='store_true', help='Fail if the file differs from a fresh schema instead of writing it.')
+
+    def handle(self, *args, **options):
+        path = options['output'] or settings.OPENAPI_SCHEMA_PATH
+        schema = build_schema(url=options['url'])
+
+        if options['check']:
+            try:
+                with open(path) as file:
+                    current = file.read()
+            except FileNotFoundError:
+                current = None
+            if current != schema:
+                raise CommandError(f'{path} is out of date, run build_openapi_schema.')
+            self.stdout.write(f'{path} is up to date.')
+            return
+
+        with open(path, 'w') as file:
+            file.write(schema)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
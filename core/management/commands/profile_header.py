@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.profiling import make_profile_header
+
+
+class Command(BaseCommand):
+    help = 'Prints a signed X-Profile header that makes ProfilingMiddleware profile a request.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'X-Profile: {make_profile_header()}')
+        self.stderr.write(f'Valid for {settings.PROFILING_HEADER_MAX_AGE} seconds.')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import IdempotencyRecord
+
+
+class Command(BaseCommand):
+    help = 'Deletes stored Idempotency-Key responses that have expired.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=10_000,
+            help='Number of rows deleted per statement.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        deleted = 0
+        while True:
+            ids = list(
+                IdempotencyRecord.objects.filter(expires_at__lte=now)
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted += IdempotencyRecord.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys.'))
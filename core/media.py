@@ -0,0 +1,162 @@
+"""
+Serving of uploaded media (product images) from MEDIA_ROOT.
+
+Files with a content hash in their name (see core.storage) are sent with
+far-future immutable cache headers; older, unhashed files are cached for
+MEDIA_MAX_AGE seconds. How the bytes are sent depends on MEDIA_SERVE_MODE:
+
+    'django'            FileResponse, which WSGI servers with wsgi.file_wrapper
+                        (gunicorn) send with sendfile(). Single byte ranges
+                        are answered with 206 Partial Content.
+    'x-accel-redirect'  an empty response with X-Accel-Redirect pointing nginx
+                        at MEDIA_ACCEL_REDIRECT_PREFIX + path (an internal
+                        location aliased to MEDIA_ROOT); nginx handles ranges.
+    'x-sendfile'        an empty response with the file's path in X-Sendfile,
+                        for Apache's mod_xsendfile or lighttpd.
+"""
+
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from .storage import is_hashed_name
+
+IMMUTABLE_MAX_AGE = 365 * 86400
+
+
+class FileRange:
+    """
+    File-like view of `length` bytes of an open file from `start`. fileno() is
+    the file's, positioned at `start`, so servers can still use sendfile()
+    (bounded by Content-Length).
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Returns (start, end) of a single 'bytes=' range, inclusive, or None when
+    the header should be ignored (missing, malformed or several ranges).
+    Raises ValueError when the range can't be satisfied.
+    """
+    unit, _, ranges = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, dash, last = (part.strip() for part in ranges.partition('-'))
+    if not dash or not (first or last) or any(part and not part.isdigit() for part in (first, last)):
+        return None
+    if not first:
+        # The last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('Unsatisfiable range')
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+def media_path(path):
+    """
+    Returns the absolute path of a file in MEDIA_ROOT, or raises Http404.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+    return full_path
+
+
+def cache_headers(response, path, etag, mtime):
+    if is_hashed_name(path):
+        response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={settings.MEDIA_MAX_AGE}'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return etag in tags or '*' in tags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def range_applies(request, etag, mtime):
+    """
+    If-Range: only send the range if the file is still the one the client has.
+    """
+    if_range = request.headers.get('If-Range')
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def serve(request, path):
+    full_path = media_path(path)
+    stat = os.stat(full_path)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    if not_modified(request, etag, stat.st_mtime):
+        return cache_headers(HttpResponseNotModified(), path, etag, stat.st_mtime)
+
+    if settings.MEDIA_SERVE_MODE in ('x-accel-redirect', 'x-sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_SERVE_MODE == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + path
+        else:
+            response['X-Sendfile'] = full_path
+        return cache_headers(response, path, etag, stat.st_mtime)
+
+    byte_range = None
+    if 'Range' in request.headers and range_applies(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(request.headers['Range'], stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return cache_headers(response, path, etag, stat.st_mtime)
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1), content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(end - start + 1)
+    return cache_headers(response, path, etag, stat.st_mtime)
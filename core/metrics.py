@@ -0,0 +1,355 @@
+"""
+Per-endpoint request metrics in the Prometheus text format.
+
+MetricsMiddleware records, for every request, its latency, status, response
+size, the number and duration of its database queries and the time spent in
+DRF serializers, labelled with the URL name and method.
+
+Each process keeps its own registry. When METRICS_DIR is set (required with
+several gunicorn workers), every process also writes a snapshot of it to
+METRICS_DIR/metrics-<pid>.json at most every METRICS_FLUSH_INTERVAL seconds
+(and once more at exit), and /metrics adds up the snapshots of all processes.
+The snapshots of processes that have exited are folded into
+METRICS_DIR/retired.json without their gauges, and deleted, so counters keep
+growing across worker restarts while gauges only cover live processes.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# name: (type, help, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by view, method and status code.', None),
+    'http_request_duration_seconds': ('histogram', 'Request latency.', LATENCY_BUCKETS),
+    'http_request_db_queries': ('histogram', 'Database queries per request.', QUERY_BUCKETS),
+    'http_request_db_seconds_total': ('counter', 'Time spent in database queries.', None),
+    'http_request_serializer_seconds_total': ('counter', 'Time spent validating and serializing with DRF serializers.', None),
+    'http_response_size_bytes': ('histogram', 'Response body size.', SIZE_BUCKETS),
+    'db_pool_connections': ('gauge', 'Pooled database connections open.', None),
+    'db_pool_connections_in_use': ('gauge', 'Pooled database connections in use.', None),
+    'db_pool_requests_waiting': ('gauge', 'Requests waiting for a pooled connection.', None),
+    'db_pool_timeouts_total': ('counter', 'Requests that timed out waiting for a pooled connection.', None),
+    'order_event_connections': ('gauge', 'Open order event streams, by transport.', None),
+}
+
+REQUEST_LABELS = ('view', 'method')
+
+
+class RequestMetrics:
+    """
+    What one request has spent so far; shared with the threads sync_to_async
+    runs the ORM in through the context variable.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+
+
+request_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class Registry:
+    """
+    Counters, gauges and histograms keyed by metric name and label values.
+    Histograms are stored as [bucket counts..., +Inf count, sum].
+    """
+
+    def __init__(self):
+        self.values = {name: {} for name in METRICS}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self.values[name][labels] = self.values[name].get(labels, 0) + amount
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self.values[name][labels] = value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self._lock:
+            histogram = self.values[name].get(labels)
+            if histogram is None:
+                histogram = self.values[name][labels] = [0] * (len(buckets) + 2)
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self.values = {name: {} for name in METRICS}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: [[list(labels), value] for labels, value in values.items()]
+                for name, values in self.values.items()
+            }
+
+
+registry = Registry()
+_flushed_at = 0.0
+_flush_at_exit = False
+
+
+def record_request(view, method, status_code, duration, size, metrics):
+    labels = (view, method)
+    registry.inc('http_requests_total', (view, method, str(status_code)))
+    registry.observe('http_request_duration_seconds', labels, duration)
+    registry.observe('http_request_db_queries', labels, metrics.queries)
+    registry.inc('http_request_db_seconds_total', labels, metrics.db_seconds)
+    registry.inc('http_request_serializer_seconds_total', labels, metrics.serializer_seconds)
+    if size is not None:
+        registry.observe('http_response_size_bytes', labels, size)
+    flush_if_due()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting and timing the queries of the current request.
+    """
+    metrics = request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - start
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """
+    connection_created receiver adding record_query to every new connection,
+    whichever thread (e.g. sync_to_async's) it belongs to.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextlib.contextmanager
+def serializer_timer():
+    metrics = request_metrics.get()
+    # Nested serializers are already covered by the outermost one
+    if metrics is None or metrics.serializer_depth:
+        yield
+        return
+    metrics.serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_depth -= 1
+        metrics.serializer_seconds += time.perf_counter() - start
+
+
+def instrument_serializers():
+    """
+    Times BaseSerializer.is_valid() and .data, which every DRF serializer goes through.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    if getattr(BaseSerializer, '_metrics_instrumented', False):
+        return
+    is_valid = BaseSerializer.is_valid
+    data = BaseSerializer.data.fget
+
+    def timed_is_valid(self, *args, **kwargs):
+        with serializer_timer():
+            return is_valid(self, *args, **kwargs)
+
+    def timed_data(self):
+        with serializer_timer():
+            return data(self)
+
+    BaseSerializer.is_valid = timed_is_valid
+    BaseSerializer.data = property(timed_data)
+    BaseSerializer._metrics_instrumented = True
+
+
+def record_pool_stats():
+    from .db import pool_stats
+
+    for alias in connections:
+        stats = pool_stats(alias)
+        if stats is None:
+            continue
+        registry.set('db_pool_connections', (alias,), stats['size'])
+        registry.set('db_pool_connections_in_use', (alias,), stats['in_use'])
+        registry.set('db_pool_requests_waiting', (alias,), stats['waiting'])
+        registry.set('db_pool_timeouts_total', (alias,), stats['timeouts'])
+
+
+def flush_if_due():
+    if settings.METRICS_DIR and time.monotonic() - _flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def flush():
+    """
+    Writes this process's snapshot to METRICS_DIR, atomically.
+    """
+    global _flushed_at, _flush_at_exit
+    _flushed_at = time.monotonic()
+    if not _flush_at_exit:
+        _flush_at_exit = True
+        atexit.register(flush)
+    record_pool_stats()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _write(os.path.join(settings.METRICS_DIR, f'metrics-{os.getpid()}.json'), registry.snapshot())
+
+
+def _write(path, snapshot):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(tmp_path, path)
+
+
+def _read(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def retire_snapshots():
+    """
+    Folds the counters and histograms of processes that have exited into
+    retired.json and deletes their snapshots. Returns the live snapshots' paths.
+    """
+    live, dead = [], []
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json')):
+        pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+        if not pid.isdigit() or _alive(int(pid)):
+            live.append(path)
+        else:
+            dead.append(path)
+    if not dead:
+        return live
+
+    retired_path = os.path.join(settings.METRICS_DIR, 'retired.json')
+    with open(os.path.join(settings.METRICS_DIR, 'retired.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another collector may have retired them while we waited
+        dead = [path for path in dead if os.path.exists(path)]
+        snapshots = [_read(retired_path) or {}]
+        snapshots += [snapshot for snapshot in map(_read, dead) if snapshot is not None]
+        retired = {
+            name: [[list(labels), value] for labels, value in values.items()]
+            for name, values in merge(snapshots).items()
+            if METRICS[name][0] != 'gauge'
+        }
+        _write(retired_path, retired)
+        for path in dead:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+    return live
+
+
+def collect():
+    """
+    Returns the metrics of all processes (or just this one without METRICS_DIR),
+    as {name: {labels: value}}.
+    """
+    if not settings.METRICS_DIR:
+        record_pool_stats()
+        return merge([registry.snapshot()])
+
+    flush()
+    paths = retire_snapshots() + [os.path.join(settings.METRICS_DIR, 'retired.json')]
+    return merge([snapshot for snapshot in map(_read, paths) if snapshot is not None])
+
+
+def merge(snapshots):
+    """
+    Adds up registry snapshots into {name: {labels: value}}.
+    """
+    merged = {name: {} for name in METRICS}
+    for snapshot in snapshots:
+        for name, values in snapshot.items():
+            if name not in merged:
+                continue
+            for labels, value in values:
+                labels = tuple(labels)
+                current = merged[name].get(labels)
+                if current is None:
+                    merged[name][labels] = value
+                elif isinstance(value, list):
+                    merged[name][labels] = [a + b for a, b in zip(current, value)]
+                else:
+                    merged[name][labels] = current + value
+    return merged
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(metrics):
+    """
+    Formats collect()'s result in the Prometheus text exposition format.
+    """
+    label_names = {
+        'http_requests_total': ('view', 'method', 'status'),
+        'db_pool_connections': ('alias',),
+        'db_pool_connections_in_use': ('alias',),
+        'db_pool_requests_waiting': ('alias',),
+        'db_pool_timeouts_total': ('alias',),
+        'order_event_connections': ('transport',),
+    }
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        names = label_names.get(name, REQUEST_LABELS)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(metrics[name].items()):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(names, labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), value[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{name}_bucket{_format_labels(names, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(names, labels)} {value[-1]}')
+            lines.append(f'{name}_count{_format_labels(names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,202 @@
+import time
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+
+from .compression import compress_response
+from .metrics import RequestMetrics, record_request, request_metrics
+from .profiling import ProfilingSession, profiling_session, should_profile
+from .routers import RoutingState, routing_state
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def token_user_id(request):
+    """
+    Returns the user id claim of the request's bearer token without verifying
+    it. It only decides which database serves the reads; authentication still
+    verifies the token, and a forged id can do no more than pin reads to the primary.
+    """
+    header = request.headers.get('Authorization', '').split()
+    if len(header) != 2 or header[0] not in api_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        claims = jwt.decode(header[1], options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return None
+    return claims.get(api_settings.USER_ID_CLAIM)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets the reads of safe requests go to replicas (see core.routers), except
+    for REPLICA_PIN_SECONDS after the same user wrote something, so users
+    always read their own writes (e.g. an order they just placed).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        user_id = token_user_id(request)
+        pinned = request.method not in SAFE_METHODS or bool(user_id and cache.get(pin_key(user_id)))
+        state = RoutingState(use_primary=pinned)
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        if state.wrote and user_id:
+            cache.set(pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        user_id = token_user_id(request)
+        pinned = request.method not in SAFE_METHODS or bool(user_id and await cache.aget(pin_key(user_id)))
+        state = RoutingState(use_primary=pinned)
+        token = routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        if state.wrote and user_id:
+            await cache.aset(pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status, size, database queries and serializer time of
+    every request, labelled with its URL name and method (see core.metrics).
+    Goes first in MIDDLEWARE so the latency covers the other middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_metrics.reset(token)
+        self.record(request, response, time.perf_counter() - start, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_metrics.reset(token)
+        self.record(request, response, time.perf_counter() - start, metrics)
+        return response
+
+    @staticmethod
+    def record(request, response, duration, metrics):
+        match = request.resolver_match
+        view = match.view_name if match else '<unmatched>'
+        size = None if response.streaming else len(response.content)
+        record_request(view, request.method, response.status_code, duration, size, metrics)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that carry a valid signed X-Profile header (see
+    `manage.py profile_header`) or are picked by PROFILING_SAMPLE_RATE, and
+    returns the id of the stored profile in the X-Profile-Id response header.
+
+    Under ASGI requests are always sampled rather than run under cProfile, and
+    the samples cover the event loop thread while the request runs, so they
+    also include whatever other requests did on that thread meanwhile.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode = should_profile(request)
+        if mode is None:
+            return self.get_response(request)
+
+        session = ProfilingSession(mode)
+        token = profiling_session.set(session)
+        session.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            session.stop()
+            profiling_session.reset(token)
+        response['X-Profile-Id'] = session.save(request, response)
+        return response
+
+    async def __acall__(self, request):
+        if should_profile(request) is None:
+            return await self.get_response(request)
+
+        # cProfile would profile every coroutine the event loop runs meanwhile
+        session = ProfilingSession('sample')
+        token = profiling_session.set(session)
+        session.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            session.stop()
+            profiling_session.reset(token)
+        response['X-Profile-Id'] = await sync_to_async(session.save)(request, response)
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compresses API responses with brotli or gzip (see core.compression). Goes
+    above the middleware that produce or inspect response bodies.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return compress_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return compress_response(request, await self.get_response(request))
@@ -0,0 +1,25 @@
+from django.db import models
+
+
+class IdempotencyRecord(models.Model):
+    """
+    The stored response of a request sent with an Idempotency-Key header
+    (see core.idempotency). status_code is null while the first request with
+    the key is still running.
+    """
+    user_id = models.BigIntegerField()
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    content = models.BinaryField(default=b'', blank=True)
+    locked_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.key} of user {self.user_id}'
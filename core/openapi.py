@@ -0,0 +1,61 @@
+"""
+The API's OpenAPI schema, generated at build time and served as a static file.
+
+`manage.py build_openapi_schema` runs drf_yasg's generator once and writes the
+schema to OPENAPI_SCHEMA_PATH; the schema view serves that file. Web workers
+never import drf_yasg: views describe themselves with schema_overrides(),
+which records the same overrides as drf_yasg's swagger_auto_schema without
+depending on it.
+"""
+
+import hashlib
+import os
+
+from django.conf import settings
+
+API_TITLE = 'Delivery API'
+API_VERSION = 'v1'
+
+_cache = {}
+
+
+def schema_overrides(**overrides):
+    """
+    Decorator for APIView methods taking swagger_auto_schema's keyword
+    arguments (operation_summary, operation_description, responses, tags...).
+    Only plain values are accepted, so drf_yasg isn't needed to apply it.
+    """
+    def decorator(view_method):
+        view_method._swagger_auto_schema = {key: value for key, value in overrides.items() if value is not None}
+        return view_method
+    return decorator
+
+
+def build_schema(url=None):
+    """
+    Generates the schema of every route with drf_yasg and returns it as JSON.
+    """
+    from drf_yasg import openapi
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    info = openapi.Info(title=API_TITLE, default_version=API_VERSION)
+    schema = OpenAPISchemaGenerator(info=info, url=url).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(schema).decode() + '\n'
+
+
+def load_schema():
+    """
+    Returns (content, etag) of the schema file, or None if it hasn't been built.
+    The file is read again only when it changes.
+    """
+    path = settings.OPENAPI_SCHEMA_PATH
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _cache.get('key') != (path, mtime):
+        with open(path, 'rb') as file:
+            content = file.read()
+        _cache.update(key=(path, mtime), content=content, etag=f'"{hashlib.sha256(content).hexdigest()[:32]}"')
+    return _cache['content'], _cache['etag']
@@ -0,0 +1,239 @@
+"""
+On-demand profiling of single requests (see ProfilingMiddleware).
+
+A profiled request runs under cProfile or under a stack sampler, and every SQL
+query it makes is logged with its duration. The results are written to a
+directory per request under PROFILING_DIR, which keeps the newest
+PROFILING_MAX_PROFILES profiles:
+
+    meta.json       method, path, view, status, duration, mode
+    profile.pstats  cProfile statistics (mode 'cprofile'), for pstats/snakeviz
+    stacks.txt      collapsed stacks (mode 'sample'), for flamegraph.pl/speedscope
+    sql.log         the queries with their durations, as sent with placeholders;
+                    only the types (and lengths) of the parameters are kept,
+                    never their values
+
+cProfile hooks the whole thread it runs on, so requests served on the event
+loop under ASGI are always sampled instead, and only one cProfile session
+runs in a process at a time; others fall back to sampling.
+"""
+
+import contextvars
+import cProfile
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+HEADER_SALT = 'core.profiling'
+MODES = ('cprofile', 'sample')
+
+profiling_session = contextvars.ContextVar('profiling_session', default=None)
+_cprofile_lock = threading.Lock()
+
+
+def make_profile_header():
+    """
+    Returns a value for the X-Profile header, valid for PROFILING_HEADER_MAX_AGE seconds.
+    """
+    return signing.TimestampSigner(salt=HEADER_SALT).sign('profile')
+
+
+def should_profile(request):
+    """
+    Returns the profiling mode for the request, or None to run it normally.
+    """
+    header = request.headers.get('X-Profile')
+    if header:
+        try:
+            signing.TimestampSigner(salt=HEADER_SALT).unsign(header, max_age=settings.PROFILING_HEADER_MAX_AGE)
+        except signing.BadSignature:
+            return None
+        mode = request.headers.get('X-Profile-Mode', settings.PROFILING_MODE)
+        return mode if mode in MODES else settings.PROFILING_MODE
+    if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return settings.PROFILING_MODE
+    return None
+
+
+class StackSampler:
+    """
+    Records the call stack of one thread every `interval` seconds from a
+    background thread, as collapsed stacks ('outer;inner;leaf count').
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='stack-sampler')
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfilingSession:
+    """
+    Profiles the code run between start() and stop() on the current thread and
+    collects the SQL of the request.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.queries = []
+        self.profiler = None
+        self.sampler = None
+        self.started = None
+        self.duration = None
+
+    def start(self):
+        if self.mode == 'cprofile' and _cprofile_lock.acquire(blocking=False):
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.mode = 'sample'
+            self.sampler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL)
+            self.sampler.start()
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        if self.profiler is not None:
+            self.profiler.disable()
+            _cprofile_lock.release()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def save(self, request, response):
+        """
+        Writes the artifacts to a new directory in the ring and returns its id.
+        """
+        match = request.resolver_match
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(settings.PROFILING_DIR, profile_id)
+        os.makedirs(path)
+
+        meta = {
+            'id': profile_id,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': self.duration * 1000,
+            'mode': self.mode,
+            'queries': len(self.queries),
+            'sql_ms': sum(duration for duration, _ in self.queries) * 1000,
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=2)
+        with open(os.path.join(path, 'sql.log'), 'w') as file:
+            for duration, sql in self.queries:
+                file.write(f'{duration * 1000:9.2f} ms  {sql}\n')
+        if self.profiler is not None:
+            self.profiler.dump_stats(os.path.join(path, 'profile.pstats'))
+        if self.sampler is not None:
+            with open(os.path.join(path, 'stacks.txt'), 'w') as file:
+                file.write(self.sampler.collapsed())
+
+        trim_profiles()
+        return profile_id
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper logging the queries of profiled requests.
+    """
+    session = profiling_session.get()
+    if session is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        statement = ' '.join(str(sql).split())
+        if params:
+            statement += f'  -- {len(params)} parameter sets' if many else f'  -- params: {describe_params(params)}'
+        session.queries.append((time.perf_counter() - start, statement))
+
+
+def describe_params(params):
+    """
+    Describes query parameters by type, and length for strings and bytes, so
+    that profiles hold no user data.
+    """
+    def describe(value):
+        if isinstance(value, (str, bytes)):
+            return f'{type(value).__name__}({len(value)})'
+        return type(value).__name__
+
+    if isinstance(params, dict):
+        return ', '.join(f'{name}={describe(value)}' for name, value in params.items())
+    return ', '.join(map(describe, params))
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def list_profiles():
+    """
+    Returns the metadata of the stored profiles, newest first.
+    """
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    profiles = []
+    for profile_id in sorted(os.listdir(settings.PROFILING_DIR), reverse=True):
+        try:
+            with open(os.path.join(settings.PROFILING_DIR, profile_id, 'meta.json')) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            continue
+        meta['files'] = sorted(os.listdir(os.path.join(settings.PROFILING_DIR, profile_id)))
+        profiles.append(meta)
+    return profiles
+
+
+def profile_file_path(profile_id, name):
+    """
+    Returns the path of one artifact, or None if it doesn't exist. Ids and
+    names must be plain directory and file names, so nothing outside
+    PROFILING_DIR can be reached.
+    """
+    if any(os.path.basename(part) != part or part.startswith('.') for part in (profile_id, name)):
+        return None
+    path = os.path.join(settings.PROFILING_DIR, profile_id, name)
+    return path if os.path.isfile(path) else None
+
+
+def trim_profiles():
+    profile_ids = sorted(os.listdir(settings.PROFILING_DIR))
+    for profile_id in profile_ids[:max(0, len(profile_ids) - settings.PROFILING_MAX_PROFILES)]:
+        shutil.rmtree(os.path.join(settings.PROFILING_DIR, profile_id), ignore_errors=True)
@@ -0,0 +1,209 @@
+"""
+Publish/subscribe between the code that changes things and the long-lived
+connections pushing those changes to clients (see products.events).
+
+publish() can be called from any thread; subscribers are asyncio tasks of the
+ASGI server. The broker is chosen by PUBSUB_BACKEND:
+
+    core.pubsub.LocalBroker  delivers within the process only; enough when one
+                             process both writes and serves the connections.
+    core.pubsub.RedisBroker  publishes through Redis (PUBSUB_REDIS_URL), so
+                             every process receives the messages of all the
+                             others. Each process holds one Redis connection
+                             for all its subscribers.
+
+A subscription keeps at most PUBSUB_QUEUE_SIZE undelivered messages. Messages
+published with the same `key` replace each other while undelivered, so a slow
+client gets the latest state instead of every step; when the queue still
+overflows the oldest messages are dropped and the subscription is marked as
+having overflowed, so the client can be told to refetch.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """
+    Messages of one topic for one consumer, read with `await get()`. Kept
+    small: idle connections each hold one.
+    """
+
+    __slots__ = ('broker', 'topic', 'loop', 'pending', 'overflowed', 'closed', '_waiter')
+
+    def __init__(self, broker, topic, loop):
+        self.broker = broker
+        self.topic = topic
+        self.loop = loop
+        self.pending = {}
+        self.overflowed = False
+        self.closed = False
+        self._waiter = None
+
+    def deliver(self, key, message):
+        """
+        Queues a message; runs on the subscription's event loop.
+        """
+        if self.closed:
+            return
+        if key is None:
+            key = object()
+        self.pending.pop(key, None)
+        self.pending[key] = message
+        if len(self.pending) > settings.PUBSUB_QUEUE_SIZE:
+            del self.pending[next(iter(self.pending))]
+            self.overflowed = True
+        self.wake()
+
+    def wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self, timeout=None):
+        """
+        Waits up to `timeout` seconds for messages and returns them (an empty
+        list on timeout or once closed).
+        """
+        if not self.pending and not self.closed:
+            self._waiter = self.loop.create_future()
+            timer = self.loop.call_later(timeout, self.wake) if timeout is not None else None
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+                if timer is not None:
+                    timer.cancel()
+        messages = list(self.pending.values())
+        self.pending.clear()
+        return messages
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+            self.wake()
+
+
+class LocalBroker:
+    """
+    Delivers messages to the subscribers of this process.
+    """
+
+    def __init__(self):
+        self.topics = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic):
+        subscription = Subscription(self, topic, asyncio.get_running_loop())
+        with self._lock:
+            self.topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self.topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.topics[subscription.topic]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(map(len, self.topics.values()))
+
+    def publish(self, topic, message, key=None):
+        self.dispatch(topic, message, key)
+
+    def dispatch(self, topic, message, key=None):
+        with self._lock:
+            subscribers = list(self.topics.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is subscription.loop:
+                subscription.deliver(key, message)
+            else:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, key, message)
+                except RuntimeError:
+                    # The loop has been closed
+                    subscription.close()
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes through Redis channels prefixed with PUBSUB_REDIS_PREFIX. A
+    daemon thread started with the first subscription listens to all of them
+    and dispatches to the local subscribers.
+    """
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self.prefix = settings.PUBSUB_REDIS_PREFIX
+        self.client = redis.Redis.from_url(settings.PUBSUB_REDIS_URL)
+        self._listener = None
+
+    def subscribe(self, topic):
+        subscription = super().subscribe(topic)
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self.listen, daemon=True, name='pubsub-redis-listener')
+                self._listener.start()
+        return subscription
+
+    def publish(self, topic, message, key=None):
+        self.client.publish(self.prefix + topic, json.dumps([message, key]))
+
+    def listen(self):
+        import redis
+
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                for item in pubsub.listen():
+                    topic = item['channel'].decode()[len(self.prefix):]
+                    message, key = json.loads(item['data'])
+                    self.dispatch(topic, message, key)
+            except redis.RedisError:
+                logger.exception('Lost the pub/sub connection to Redis; reconnecting')
+                threading.Event().wait(1)
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.PUBSUB_BACKEND)()
+    return _broker
+
+
+def publish(topic, message, key=None):
+    """
+    Sends a JSON-serializable message to the subscribers of `topic`. Pending
+    messages with the same `key` are replaced by this one.
+    """
+    get_broker().publish(topic, message, key)
+
+
+def subscribe(topic):
+    """
+    Returns a Subscription to `topic`; call from a coroutine, and close() it
+    when done.
+    """
+    return get_broker().subscribe(topic)
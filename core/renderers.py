@@ -0,0 +1,88 @@
+"""
+DRF renderers built on orjson and MessagePack.
+
+ORJSONRenderer produces the same JSON as DRF's JSONRenderer with the default
+UNICODE_JSON and COMPACT_JSON settings, several times faster: orjson encodes
+dicts, lists, strings, numbers, datetimes, dates, times and UUIDs natively,
+and Decimal and PhoneNumber values (which serializers normally turn into
+strings already) are converted here, as is anything else DRF's encoder knows.
+
+MessagePackRenderer answers `Accept: application/msgpack` (or ?format=msgpack)
+with the same data in MessagePack, which keeps the types JSON loses:
+decimals stay exact strings and datetimes become integer milliseconds since
+the Unix epoch (UTC).
+"""
+
+import datetime
+import decimal
+
+import msgpack
+import orjson
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+_drf_encoder = JSONEncoder()
+
+
+def default(obj):
+    """
+    Converts the values orjson doesn't know, like DRF's JSONEncoder does.
+    """
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, PhoneNumber):
+        return str(obj)
+    return _drf_encoder.default(obj)
+
+
+def dumps(data, indent=False):
+    options = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+    content = orjson.dumps(data, default=default, option=options)
+    # Like DRF, escape U+2028 and U+2029 so the output is also valid JavaScript
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for JSONRenderer. Any requested indent (the
+    'indent' media type parameter, or the browsable API's) gives two spaces,
+    the only indent orjson supports.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps(data, indent=bool(indent))
+
+
+def msgpack_default(obj):
+    """
+    Converts the values msgpack doesn't know. Naive datetimes are taken as UTC.
+    """
+    if isinstance(obj, datetime.datetime):
+        if obj.tzinfo is None:
+            obj = obj.replace(tzinfo=datetime.timezone.utc)
+        return int(obj.timestamp() * 1000)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, PhoneNumber)):
+        return str(obj)
+    return _drf_encoder.default(obj)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=msgpack_default, use_bin_type=True)
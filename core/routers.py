@@ -0,0 +1,115 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL replica lag in seconds; 0 when everything received has been replayed,
+# so an idle primary doesn't look like lag.
+POSTGRES_LAG_QUERY = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class RoutingState:
+    """
+    Per-request routing decisions, shared with the threads sync_to_async runs
+    the ORM in (they see the same object through the context variable).
+    """
+
+    def __init__(self, use_primary):
+        self.use_primary = use_primary
+        self.wrote = False
+
+
+# Unset outside ReplicaRoutingMiddleware: management commands, background
+# threads and scripts always read from the primary.
+routing_state = contextvars.ContextVar('routing_state', default=None)
+
+
+class ReplicaMonitor:
+    """
+    Measures the replication lag of each replica at most every
+    REPLICA_LAG_CHECK_INTERVAL seconds and keeps the list of replicas within
+    REPLICA_MAX_LAG_SECONDS. A replica that can't be queried counts as lagging.
+    """
+
+    def __init__(self):
+        self.lag = {}
+        self.healthy = []
+        self.checked_at = None
+        self._lock = threading.Lock()
+
+    def healthy_replicas(self):
+        now = time.monotonic()
+        if self.checked_at is None or now - self.checked_at >= settings.REPLICA_LAG_CHECK_INTERVAL:
+            # One thread probes; the others keep using the previous result
+            if self._lock.acquire(blocking=self.checked_at is None):
+                try:
+                    self.check()
+                finally:
+                    self._lock.release()
+        return self.healthy
+
+    def check(self):
+        lag = {alias: self.measure_lag(alias) for alias in settings.DATABASE_REPLICAS}
+        healthy = [alias for alias, seconds in lag.items() if seconds <= settings.REPLICA_MAX_LAG_SECONDS]
+        for alias in set(self.healthy) - set(healthy):
+            logger.warning('Replica %s dropped, lag %.1fs', alias, lag[alias])
+        self.lag, self.healthy = lag, healthy
+        self.checked_at = time.monotonic()
+        return lag
+
+    def measure_lag(self, alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            # Local setups (e.g. two SQLite files) have no replication to lag behind
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(POSTGRES_LAG_QUERY)
+                return float(cursor.fetchone()[0])
+        except Exception:
+            logger.exception('Could not measure the lag of replica %s', alias)
+            return float('inf')
+
+
+replica_monitor = ReplicaMonitor()
+
+
+class ReplicaRouter:
+    """
+    Sends writes to the primary and, for requests that opted in through
+    ReplicaRoutingMiddleware, reads to a random replica whose lag is within
+    REPLICA_MAX_LAG_SECONDS. Reads go to the primary when there is no routing
+    state, the request is pinned, or a transaction is open on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or state.use_primary or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = replica_monitor.healthy_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            # Later reads in this request, and the user's next requests, see the write
+            state.wrote = True
+            state.use_primary = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
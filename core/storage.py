@@ -0,0 +1,48 @@
+"""
+Local file storage with content-hashed file names.
+
+Every saved file gets the first HASH_LENGTH hex digits of its SHA-256 in its
+name (product_images/shoe.jpg -> product_images/shoe.3f2a9c1e0b7d4e65.jpg), so
+a URL always refers to the same bytes and can be cached forever (see
+core.media). Saving identical content again reuses the existing file.
+"""
+
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 16
+HASHED_NAME = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}(\.[^./]+)?$')
+
+
+def is_hashed_name(name):
+    return HASHED_NAME.search(name) is not None
+
+
+def content_hash(content):
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    content.seek(0)
+    return sha256.hexdigest()[:HASH_LENGTH]
+
+
+class ContentHashedFileSystemStorage(FileSystemStorage):
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        root, ext = os.path.splitext(name)
+        suffix = f'.{content_hash(content)}{ext}'
+        if max_length is not None:
+            # Shorten the original name rather than let Django cut the hash off
+            root = root[:max(0, max_length - len(suffix))]
+        name = root + suffix
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
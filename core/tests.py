@@ -0,0 +1,173 @@
+import gzip
+import os
+import tempfile
+
+import msgpack
+import orjson
+from django.test import TestCase, override_settings
+
+from core import compression
+from core.media import IMMUTABLE_MAX_AGE
+
+from products.models import Product
+from users.serializers import MyTokenObtainPairSerializer
+from users.tests import make_user
+
+
+def auth_headers(user, **headers):
+    return {'Authorization': f'Bearer {MyTokenObtainPairSerializer.get_token(user).access_token}', **headers}
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        self.seller = make_user('seller', 1)
+        self.product = Product.objects.create(
+            seller=self.seller, name='Tea\u2028Leaves', description='Tea', price='2.50', stock_quantity=5,
+        )
+
+
+class JSONTests(APITestCase):
+    def test_responses_are_rendered_with_orjson(self):
+        response = self.client.get(f'/api/v1/products/{self.product.pk}/', headers=auth_headers(self.seller))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        # Compact, with U+2028 escaped as DRF does
+        self.assertIn(b'"name":"Tea\\u2028Leaves"', response.content)
+        data = orjson.loads(response.content)
+        self.assertEqual(data['price'], '2.50')
+        self.assertTrue(data['created_at'].endswith('Z'))
+
+    def test_requests_are_parsed_with_orjson(self):
+        response = self.client.post(
+            '/api/v1/products/', '{"name": "Sugar", "description": "Sugar", "price": "1.20", "stock_quantity": 3}',
+            content_type='application/json', headers=auth_headers(self.seller),
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['name'], 'Sugar')
+
+    def test_invalid_json_is_rejected(self):
+        for body in ('{"price": NaN}', '{"name": '):
+            with self.subTest(body=body):
+                response = self.client.post(
+                    '/api/v1/products/', body, content_type='application/json', headers=auth_headers(self.seller),
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('JSON parse error', response.json()['detail'])
+
+
+class MessagePackTests(APITestCase):
+    def test_responses_are_negotiated(self):
+        path = f'/api/v1/products/{self.product.pk}/'
+        for query, headers in (('', {'Accept': 'application/msgpack'}), ('?format=msgpack', {})):
+            with self.subTest(query=query, headers=headers):
+                response = self.client.get(path + query, headers=auth_headers(self.seller, **headers))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/msgpack')
+                data = msgpack.unpackb(response.content)
+                self.assertEqual(data['name'], 'Tea\u2028Leaves')
+                self.assertEqual(data['price'], '2.50')
+                self.assertEqual(data['created_at'], int(self.product.created_at.timestamp() * 1000))
+
+    def test_requests_are_parsed(self):
+        body = msgpack.packb({'name': 'Sugar', 'description': 'Sugar', 'price': '1.20', 'stock_quantity': 3})
+        response = self.client.post(
+            '/api/v1/products/', body, content_type='application/msgpack', headers=auth_headers(self.seller),
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Product.objects.get(name='Sugar').stock_quantity, 3)
+
+
+class CompressionTests(APITestCase):
+    def get(self, **headers):
+        return self.client.get(f'/api/v1/products/{self.product.pk}/', headers=auth_headers(self.seller, **headers))
+
+    @override_settings(COMPRESSION_MIN_SIZE=64)
+    def test_large_responses_are_compressed(self):
+        plain = self.get().content
+        decoders = {'gzip': gzip.decompress}
+        if compression.brotli is not None:
+            decoders['br'] = compression.brotli.decompress
+        for encoding, decompress in decoders.items():
+            with self.subTest(encoding=encoding):
+                response = self.get(**{'Accept-Encoding': encoding})
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(int(response['Content-Length']), len(response.content))
+                self.assertEqual(decompress(response.content), plain)
+
+    def test_small_responses_are_sent_as_is(self):
+        response = self.get(**{'Accept-Encoding': 'gzip, br'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(orjson.loads(response.content)['price'], '2.50')
+
+
+class MediaTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.enterContext(override_settings(MEDIA_ROOT=self.root, MEDIA_SERVE_MODE='django'))
+        os.makedirs(os.path.join(self.root, 'product_images'))
+        for name in ('shoe.jpg', 'shoe.3f2a9c1e0b7d4e65.jpg'):
+            with open(os.path.join(self.root, 'product_images', name), 'wb') as file:
+                file.write(b'0123456789')
+
+    def get(self, name='shoe.jpg', **headers):
+        return self.client.get(f'/media/product_images/{name}', headers=headers)
+
+    def test_file_is_served_with_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+        not_modified = self.get(**{'If-None-Match': response['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(self.get(**{'If-Modified-Since': response['Last-Modified']}).status_code, 304)
+        self.assertEqual(self.get(**{'If-None-Match': '"stale"'}).status_code, 200)
+
+    def test_hashed_names_are_immutable(self):
+        response = self.get('shoe.3f2a9c1e0b7d4e65.jpg')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={IMMUTABLE_MAX_AGE}, immutable')
+
+    def test_ranges(self):
+        for header, content_range, body in (
+            ('bytes=0-3', 'bytes 0-3/10', b'0123'),
+            ('bytes=8-', 'bytes 8-9/10', b'89'),
+            ('bytes=-3', 'bytes 7-9/10', b'789'),
+            ('bytes=5-100', 'bytes 5-9/10', b'56789'),
+        ):
+            with self.subTest(header=header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+                self.assertEqual(b''.join(response.streaming_content), body)
+
+        response = self.get(Range='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        # Several ranges, or a range for an older version of the file, get the whole file
+        self.assertEqual(self.get(Range='bytes=0-1,4-5').status_code, 200)
+        self.assertEqual(self.get(Range='bytes=0-3', **{'If-Range': '"stale"'}).status_code, 200)
+
+    def test_server_offload(self):
+        with self.settings(MEDIA_SERVE_MODE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/internal-media/'):
+            response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/internal-media/product_images/shoe.jpg')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.content, b'')
+        self.assertTrue(response.has_header('ETag'))
+
+        with self.settings(MEDIA_SERVE_MODE='x-sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.root, 'product_images', 'shoe.jpg'))
+
+    def test_missing_and_outside_files_are_not_found(self):
+        self.assertEqual(self.get('missing.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/media/product_images/../../etc/passwd').status_code, 404)
+        self.assertEqual(self.client.get('/media/product_images/..%2F..%2Fsecret').status_code, 404)
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('schema/', views.openapi_schema, name='openapi-schema'),
+    path('status/database/', views.DatabaseStatus.as_view(), name='database-status'),
+]
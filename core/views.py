@@ -0,0 +1,89 @@
+import hmac
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified
+from django.template.response import TemplateResponse
+from django.views.decorators.http import require_safe
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+
+from . import media, metrics, openapi, profiling
+from .db import database_status
+
+
+class DatabaseStatus(APIView):
+    """
+    Connection settings, latency and pool usage of every configured database,
+    as seen by the worker process that serves the request.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response([database_status(alias) for alias in connections])
+
+
+def openapi_schema(request):
+    """
+    The OpenAPI schema written by `manage.py build_openapi_schema`.
+    """
+    loaded = openapi.load_schema()
+    if loaded is None:
+        raise Http404('The OpenAPI schema has not been built (manage.py build_openapi_schema).')
+    content, etag = loaded
+    # Compressed responses carry the weak form of the ETag (core.compression)
+    if request.headers.get('If-None-Match', '').removeprefix('W/') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=300'
+    return response
+
+
+@require_safe
+def media_view(request, path):
+    """
+    Uploaded files from MEDIA_ROOT (see core.media).
+    """
+    return media.serve(request, path)
+
+
+def metrics_view(request):
+    """
+    Request metrics of all worker processes in the Prometheus text format.
+
+    Open to staff users logged in through the admin, and to scrapers sending
+    `Authorization: Bearer <METRICS_TOKEN>` when METRICS_TOKEN is set.
+    """
+    header = request.headers.get('Authorization', '')
+    token_ok = bool(settings.METRICS_TOKEN) and hmac.compare_digest(header, f'Bearer {settings.METRICS_TOKEN}')
+    if not (token_ok or request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def profile_list(request):
+    """
+    Admin page listing the stored request profiles (see core.profiling).
+    """
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiling.list_profiles(),
+        'profile_header': profiling.make_profile_header(),
+        'max_profiles': settings.PROFILING_MAX_PROFILES,
+    }
+    return TemplateResponse(request, 'admin/profiles.html', context)
+
+
+@staff_member_required
+def profile_download(request, profile_id, name):
+    path = profiling.profile_file_path(profile_id, name)
+    if path is None:
+        raise Http404('Profile not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}-{name}')
@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (
     Cart, CartItem,
     Product, Order,
-    OrderItem, Address
+    OrderItem, Address,
+    ImageUpload
     )
 
 admin.site.register(Cart)
@@ -12,3 +13,11 @@ admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(Address)
 
+
+
+
+@admin.register(ImageUpload)
+class ImageUploadAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'product', 'owner', 'status', 'received', 'size', 'created_at']
+    list_filter = ['status']
+    readonly_fields = [field.name for field in ImageUpload._meta.fields]
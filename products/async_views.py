@@ -0,0 +1,319 @@
+"""
+Async versions of the views in products.views, for running under ASGI.
+
+They use Django's async ORM, so a request waiting on the database doesn't hold
+a worker thread. Serializer validation that queries the database runs through
+sync_to_async. Querysets are fully loaded (with_items()) before they are
+serialized, so rendering a response makes no queries.
+
+products.urls serves these instead of the sync views when
+PRODUCTS_ASYNC_VIEWS is on.
+"""
+
+from adrf.views import APIView
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+
+from core.idempotency import idempotent
+from users.authentication import ClaimsJWTAuthentication
+from .models import (
+    Order, Cart,
+    CartItem, Product
+    )
+from .serializers import (
+    OrderSerializer,
+    ProductSerializer,
+    CartSerializer,
+    CartItemSerializer
+    )
+from .changes import StaleCursor, astream_changes, parse_cursor, sync_until
+from .recommendations import arecommended_products
+from .views import parse_quantity
+# Chunked image uploads are blocking file I/O, so the sync views serve them
+from .views import ImageUploadDetail, ImageUploadFinalize, ImageUploadList  # noqa: F401
+
+# Rows fetched per round trip when streaming querysets with aiterator()
+ITERATOR_CHUNK_SIZE = 500
+
+
+async def aget_cart(user):
+    """
+    Returns the user's cart with its items loaded, creating the cart if needed.
+    """
+    try:
+        return await Cart.objects.with_items().aget(client=user)
+    except Cart.DoesNotExist:
+        cart, created = await Cart.objects.aget_or_create(client=user)
+        return await Cart.objects.with_items().aget(pk=cart.pk)
+
+
+class ProductList(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        """
+        Returns a list of products with their details.
+
+        HTTP Method: Get
+        """
+        products = [product async for product in Product.objects.all().aiterator(chunk_size=ITERATOR_CHUNK_SIZE)]
+        serializer = ProductSerializer(products, many=True)
+        return Response(serializer.data)
+
+    async def post(self, request):
+        """
+        Create a new product.
+
+        The seller will be automatically associated with the product.
+
+        HTTP Method: POST
+        """
+        serializer = ProductSerializer(data=request.data)
+        if serializer.is_valid():
+            product = await serializer.acreate({**serializer.validated_data, 'seller': request.user})
+            return Response(ProductSerializer(product).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ProductChanges(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        """
+        Returns the catalog changes since the `since` cursor (see
+        products.changes), streamed from the async ORM.
+
+        HTTP Method: GET
+        """
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = parse_cursor(since)
+            except StaleCursor as exc:
+                return Response({"detail": str(exc)}, status=status.HTTP_410_GONE)
+            except ValueError as exc:
+                return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return StreamingHttpResponse(astream_changes(since, sync_until()), content_type='application/json')
+
+
+class ProductDetail(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, pk):
+        """
+        Retrieve the details of a specific product.
+
+        HTTP Method: GET
+        """
+        try:
+            product = await Product.objects.aget(pk=pk)
+        except Product.DoesNotExist:
+            return Response({"detail": "Not Found"}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = ProductSerializer(product)
+        return Response({**serializer.data, "frequently_bought_together": await arecommended_products(product.pk)})
+
+    async def put(self, request, pk):
+        """
+        Update the details of a specific product.
+
+        HTTP Method: PUT
+        """
+        try:
+            product = await Product.objects.aget(pk=pk)
+        except Product.DoesNotExist:
+            return Response({"detail": "Not Found"}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = ProductSerializer(product, data=request.data, partial=True)
+        if serializer.is_valid():
+            product = await serializer.aupdate(product, serializer.validated_data)
+            return Response(ProductSerializer(product).data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    async def delete(self, request, pk):
+        """
+        Delete a specific product.
+
+        HTTP Method: DELETE
+        """
+        try:
+            product = await Product.objects.aget(pk=pk)
+        except Product.DoesNotExist:
+            return Response({"detail": "Not Found"}, status=status.HTTP_400_BAD_REQUEST)
+
+        await product.adelete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class OrderList(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        """
+        Retrieve the orders placed by the authenticated user.
+
+        HTTP Method: GET
+        """
+        orders = Order.objects.filter(client=request.user).with_items()
+        orders = [order async for order in orders.aiterator(chunk_size=ITERATOR_CHUNK_SIZE)]
+        serializer = OrderSerializer(orders, many=True)
+        return Response(serializer.data)
+
+    @idempotent
+    async def post(self, request):
+        """
+        Create a new order; the items are inserted with one bulk insert.
+
+        HTTP Method: POST
+        """
+        serializer = OrderSerializer(data=request.data)
+        # Validation looks the products up, which the sync ORM does
+        if await sync_to_async(serializer.is_valid)():
+            order = await serializer.acreate({**serializer.validated_data, 'client': request.user})
+            order = await Order.objects.with_items().aget(pk=order.pk)
+            return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class OrderDetail(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, pk):
+        """
+        Retrieve the details of a specific order of the authenticated user.
+
+        HTTP Method: GET
+        """
+        try:
+            order = await Order.objects.with_items().aget(pk=pk, client=request.user)
+        except Order.DoesNotExist:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = OrderSerializer(order)
+        return Response(serializer.data)
+
+    async def put(self, request, pk):
+        """
+        Update the details of a specific order of the authenticated user.
+
+        HTTP Method: PUT
+        """
+        try:
+            order = await Order.objects.with_items().aget(pk=pk, client=request.user)
+        except Order.DoesNotExist:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = OrderSerializer(order, data=request.data, partial=True)
+        if await sync_to_async(serializer.is_valid)():
+            await sync_to_async(serializer.save)()
+            return Response(serializer.data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    async def delete(self, request, pk):
+        """
+        Delete a specific order of the authenticated user.
+
+        HTTP Method: DELETE
+        """
+        try:
+            order = await Order.objects.aget(pk=pk, client=request.user)
+        except Order.DoesNotExist:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        await order.adelete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartDetail(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        """
+        Retrieve the cart of the user(client).
+
+        HTTP Method: GET
+        """
+        cart = await aget_cart(request.user)
+        serializer = CartSerializer(cart)
+        return Response(serializer.data)
+
+    @idempotent
+    async def post(self, request):
+        """
+        Add a product to the cart with a specified quantity.
+        If the product already exists in the cart, its quantity is increased.
+
+        HTTP Method: POST
+        """
+        product_id = request.data.get('product_id')
+        quantity = parse_quantity(request.data.get('quantity', 1))
+
+        if not product_id or not quantity:
+            return Response({"detail": "Product ID and quantity are required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not await Product.objects.filter(id=product_id).aexists():
+            return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        cart, created = await Cart.objects.aget_or_create(client=request.user)
+        cart_item, created = await CartItem.objects.aget_or_create(
+            cart=cart, product_id=product_id, defaults={'quantity': 0}
+        )
+        await CartItem.objects.filter(pk=cart_item.pk).aupdate(quantity=F('quantity') + quantity)
+
+        cart = await Cart.objects.with_items().aget(pk=cart.pk)
+        serializer = CartSerializer(cart)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class CartItemUpdate(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def put(self, request, cart_item_id):
+        """
+        Update the quantity of a cart item.
+
+        HTTP Method: PUT
+        """
+        try:
+            cart_item = await CartItem.objects.select_related('product').aget(
+                id=cart_item_id, cart__client=request.user
+            )
+        except CartItem.DoesNotExist:
+            return Response({"detail": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        quantity = parse_quantity(request.data.get('quantity'))
+        if quantity is None:
+            return Response({"detail": "Quantity must be greater than 0."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cart_item.quantity = quantity
+        await cart_item.asave(update_fields=['quantity'])
+
+        serializer = CartItemSerializer(cart_item)
+        return Response(serializer.data)
+
+
+class CartItemDelete(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def delete(self, request, cart_item_id):
+        """
+        Delete a specific product from the cart.
+
+        HTTP Method: DELETE
+        """
+        deleted, _ = await CartItem.objects.filter(id=cart_item_id, cart__client=request.user).adelete()
+        if not deleted:
+            return Response({"detail": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,163 @@
+"""
+Incremental sync of the product catalog (GET /products/changes/).
+
+A client keeps the catalog offline and asks for what changed since its
+cursor: the products created or updated since then (by their indexed
+updated_at) and the ids of those deleted since then (from ProductTombstone,
+written when products are deleted). Without a cursor it gets every product,
+which is also how it resyncs. The response is streamed:
+
+    {"cursor": "<next cursor>", "full": false,
+     "products": [<ProductSerializer data>...], "deleted": [<id>...]}
+
+A response covers changes up to CATALOG_CHANGES_SAFETY_LAG seconds ago only,
+so rows written by transactions still open when it was produced (whose
+updated_at is already in the past) are picked up by the next sync instead
+of being skipped. Tombstones are kept CATALOG_TOMBSTONE_RETENTION seconds;
+older cursors get 410 Gone and the client must resync from scratch.
+"""
+
+import datetime
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.renderers import dumps
+from .models import Product, ProductTombstone
+from .serializers import ProductSerializer
+
+CHUNK_SIZE = 500
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class StaleCursor(Exception):
+    pass
+
+
+def make_cursor(moment):
+    """
+    Cursors are opaque to clients; they are microseconds since the epoch.
+    """
+    return str((moment - EPOCH) // timedelta(microseconds=1))
+
+
+def parse_cursor(value):
+    """
+    Returns the moment a cursor stands for. Raises ValueError for a malformed
+    cursor and StaleCursor for one older than the tombstones.
+    """
+    if not value.isdigit():
+        raise ValueError('Invalid cursor.')
+    since = EPOCH + timedelta(microseconds=int(value))
+    now = timezone.now()
+    if since > now:
+        raise ValueError('Invalid cursor.')
+    if since < now - timedelta(seconds=settings.CATALOG_TOMBSTONE_RETENTION):
+        raise StaleCursor('The cursor is too old; sync the catalog again without one.')
+    return since
+
+
+def sync_until():
+    return timezone.now() - timedelta(seconds=settings.CATALOG_CHANGES_SAFETY_LAG)
+
+
+def changed_products(since, until):
+    products = Product.objects.filter(updated_at__lte=until)
+    if since is not None:
+        products = products.filter(updated_at__gt=since)
+    return products.order_by('updated_at', 'pk')
+
+
+def deleted_ids(since, until):
+    if since is None:
+        return ProductTombstone.objects.none()
+    return (
+        ProductTombstone.objects.filter(deleted_at__gt=since, deleted_at__lte=until)
+        .order_by('deleted_at', 'pk').values_list('product_id', flat=True)
+    )
+
+
+def _header(since, until):
+    return b'{"cursor":' + dumps(make_cursor(until)) + b',"full":' + dumps(since is None) + b',"products":['
+
+
+def _products_chunk(products, first):
+    items = b','.join(map(dumps, ProductSerializer(products, many=True).data))
+    return items if first else b',' + items
+
+
+def _ids_chunk(ids, first):
+    items = b','.join(str(product_id).encode() for product_id in ids)
+    return items if first else b',' + items
+
+
+def stream_changes(since, until):
+    """
+    Yields the response body in chunks of CHUNK_SIZE rows.
+    """
+    yield _header(since, until)
+    batch, first = [], True
+    for product in changed_products(since, until).iterator(chunk_size=CHUNK_SIZE):
+        batch.append(product)
+        if len(batch) == CHUNK_SIZE:
+            yield _products_chunk(batch, first)
+            batch, first = [], False
+    if batch:
+        yield _products_chunk(batch, first)
+
+    yield b'],"deleted":['
+    batch, first = [], True
+    for product_id in deleted_ids(since, until).iterator(chunk_size=CHUNK_SIZE):
+        batch.append(product_id)
+        if len(batch) == CHUNK_SIZE:
+            yield _ids_chunk(batch, first)
+            batch, first = [], False
+    if batch:
+        yield _ids_chunk(batch, first)
+    yield b']}'
+
+
+async def astream_changes(since, until):
+    """
+    stream_changes() for the async views.
+    """
+    yield _header(since, until)
+    batch, first = [], True
+    async for product in changed_products(since, until).aiterator(chunk_size=CHUNK_SIZE):
+        batch.append(product)
+        if len(batch) == CHUNK_SIZE:
+            yield _products_chunk(batch, first)
+            batch, first = [], False
+    if batch:
+        yield _products_chunk(batch, first)
+
+    yield b'],"deleted":['
+    batch, first = [], True
+    async for product_id in deleted_ids(since, until).aiterator(chunk_size=CHUNK_SIZE):
+        batch.append(product_id)
+        if len(batch) == CHUNK_SIZE:
+            yield _ids_chunk(batch, first)
+            batch, first = [], False
+    if batch:
+        yield _ids_chunk(batch, first)
+    yield b']}'
+
+
+def record_deletions(product_ids, using=None):
+    """
+    Writes tombstones for products deleted without Product.delete(), e.g. with
+    raw deletes (the post_delete signal covers the others).
+    """
+    now = timezone.now()
+    ProductTombstone.objects.using(using).bulk_create(
+        [ProductTombstone(product_id=product_id, deleted_at=now) for product_id in product_ids]
+    )
+
+
+def sweep_tombstones():
+    """
+    Deletes the tombstones older than any cursor still accepted.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CATALOG_TOMBSTONE_RETENTION)
+    return ProductTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
@@ -0,0 +1,249 @@
+"""
+Push of order status changes to clients, instead of polling OrderDetail.
+
+config/asgi.py routes ORDER_EVENTS_PATH here, outside of Django's request
+handling, so an idle connection costs a suspended coroutine and a
+core.pubsub.Subscription rather than a request with its middleware. Clients
+authenticate with an access token in the Authorization header, and get:
+
+    HTTP GET       Server-Sent Events:
+                       event: order
+                       data: {"id": 12, "status": "completed"}
+                   with a comment every ORDER_EVENTS_HEARTBEAT seconds to keep
+                   proxies from closing the connection.
+    WebSocket      {"event": "order", "data": {"id": 12, "status": "completed"}}
+                   messages. Browsers can't set headers on WebSockets, so the
+                   token may instead be sent as the first message.
+
+On connect the status of each of the user's pending orders is sent, so a
+client that reconnects catches up: a watched order missing from that list is
+no longer pending. A `resync` event means updates were dropped because the
+client read too slowly, and the orders should be fetched again. Orders that
+are deleted are reported with the status "deleted".
+
+Each process accepts up to ORDER_EVENTS_MAX_CONNECTIONS connections and
+answers 503 beyond that.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from core import pubsub
+from core.metrics import registry
+from core.renderers import dumps
+from users.authentication import ClaimsJWTAuthentication
+from .models import Order
+
+# Seconds a WebSocket client has to send its token when it had no header
+TOKEN_MESSAGE_TIMEOUT = 10
+
+_connections = {'sse': 0, 'websocket': 0}
+
+
+def topic(client_id):
+    return f'orders:{client_id}'
+
+
+def publish_order_status(client_id, order_id, status):
+    pubsub.publish(topic(client_id), {'id': order_id, 'status': status}, key=order_id)
+
+
+def database(func):
+    """
+    Runs `func` in a worker thread, releasing the connection as Django does at
+    the end of a request.
+    """
+    def call(*args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+@database
+def authenticate(raw_token):
+    """
+    Returns the id of the user of a valid access token, or None.
+    """
+    authentication = ClaimsJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token)).pk
+    except (InvalidToken, AuthenticationFailed, TokenError):
+        return None
+
+
+@database
+def pending_orders(client_id):
+    return list(Order.objects.filter(client_id=client_id, status='pending').order_by('pk').values('id', 'status'))
+
+
+def header_token(scope):
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            return ClaimsJWTAuthentication().get_raw_token(value)
+    return None
+
+
+def connected(transport, change):
+    _connections[transport] += change
+    registry.set('order_event_connections', (transport,), _connections[transport])
+
+
+def at_capacity():
+    return sum(_connections.values()) >= settings.ORDER_EVENTS_MAX_CONNECTIONS
+
+
+async def close_on_disconnect(receive, subscription, disconnect_type):
+    while True:
+        message = await receive()
+        if message['type'] == disconnect_type:
+            subscription.close()
+            return
+
+
+async def relay(subscription, send_events, heartbeat=None):
+    """
+    Hands the subscription's messages to `send_events(messages, resync)`
+    until it is closed; messages is empty for a heartbeat.
+    """
+    while True:
+        messages = await subscription.get(timeout=heartbeat)
+        if subscription.closed:
+            return
+        resync, subscription.overflowed = subscription.overflowed, False
+        if messages or resync or heartbeat is not None:
+            await send_events(messages, resync)
+
+
+async def respond(send, status, detail, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': dumps({'detail': detail})})
+
+
+def sse_event(event, data):
+    return b'event: ' + event + b'\ndata: ' + dumps(data) + b'\n\n'
+
+
+async def sse(scope, receive, send):
+    if scope['method'] != 'GET':
+        return await respond(send, 405, f'Method "{scope["method"]}" not allowed.', [(b'allow', b'GET')])
+    raw_token = header_token(scope)
+    client_id = await authenticate(raw_token) if raw_token else None
+    del raw_token
+    if client_id is None:
+        return await respond(send, 401, 'Valid access token required.', [(b'www-authenticate', b'Bearer realm="api"')])
+    if at_capacity():
+        return await respond(send, 503, 'Too many open event streams; try again later.', [(b'retry-after', b'30')])
+
+    connected('sse', 1)
+    subscription = pubsub.subscribe(topic(client_id))
+    watcher = None
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Stop nginx from buffering the stream
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        orders = await pending_orders(client_id)
+        body = b'retry: 5000\n\n' + b''.join(sse_event(b'order', order) for order in orders)
+        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        # Idle connections should hold as little as possible
+        del orders, body
+        watcher = asyncio.ensure_future(close_on_disconnect(receive, subscription, 'http.disconnect'))
+
+        async def send_events(messages, resync):
+            body = b''.join(sse_event(b'order', message) for message in messages)
+            if resync:
+                body += sse_event(b'resync', {})
+            await send({'type': 'http.response.body', 'body': body or b': ping\n\n', 'more_body': True})
+
+        await relay(subscription, send_events, settings.ORDER_EVENTS_HEARTBEAT)
+    except OSError:
+        # The client went away mid-send
+        pass
+    finally:
+        subscription.close()
+        if watcher is not None:
+            watcher.cancel()
+        connected('sse', -1)
+
+
+async def websocket_token(receive):
+    """
+    Returns the token sent as the first message, or None.
+    """
+    try:
+        message = await asyncio.wait_for(receive(), TOKEN_MESSAGE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if message['type'] != 'websocket.receive':
+        return None
+    token = message.get('text') or message.get('bytes')
+    return token.strip() if token else None
+
+
+async def websocket(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if at_capacity():
+        return await send({'type': 'websocket.close', 'code': 1013})
+
+    raw_token = header_token(scope)
+    client_id = await authenticate(raw_token) if raw_token else None
+    if raw_token and client_id is None:
+        return await send({'type': 'websocket.close', 'code': 1008})
+    await send({'type': 'websocket.accept'})
+    if client_id is None:
+        raw_token = await websocket_token(receive)
+        client_id = await authenticate(raw_token) if raw_token else None
+        if client_id is None:
+            return await send({'type': 'websocket.close', 'code': 1008})
+
+    connected('websocket', 1)
+    subscription = pubsub.subscribe(topic(client_id))
+    watcher = None
+    try:
+        for order in await pending_orders(client_id):
+            await send({'type': 'websocket.send', 'text': dumps({'event': 'order', 'data': order}).decode()})
+        watcher = asyncio.ensure_future(close_on_disconnect(receive, subscription, 'websocket.disconnect'))
+
+        async def send_events(messages, resync):
+            for message in messages:
+                await send({'type': 'websocket.send', 'text': dumps({'event': 'order', 'data': message}).decode()})
+            if resync:
+                await send({'type': 'websocket.send', 'text': '{"event":"resync"}'})
+
+        await relay(subscription, send_events)
+    except OSError:
+        pass
+    finally:
+        subscription.close()
+        if watcher is not None:
+            watcher.cancel()
+        connected('websocket', -1)
+
+
+async def order_events(scope, receive, send):
+    """
+    ASGI application serving ORDER_EVENTS_PATH.
+    """
+    if scope['type'] == 'websocket':
+        await websocket(scope, receive, send)
+    else:
+        await sse(scope, receive, send)
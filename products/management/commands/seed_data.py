@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.seeding import ROWS_PER_SCALE, seed_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates reproducible synthetic users, products, orders, carts and addresses. '
+        f'Each unit of --scale adds {ROWS_PER_SCALE["users"]} users, {ROWS_PER_SCALE["products"]} products, '
+        f'{ROWS_PER_SCALE["orders"]} orders (about 2.5 items each) and {ROWS_PER_SCALE["carts"]} carts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--password', default='password', help='Password of every generated user.')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per COPY or bulk_create.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = seed_data(
+            scale=options['scale'],
+            random_seed=options['seed'],
+            password=options['password'],
+            batch_size=options['batch_size'],
+            log=lambda message: self.stdout.write(f'{time.perf_counter() - start:8.1f}s  {message}'),
+        )
+        total = sum(counts.values())
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Inserted {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s).'
+        ))
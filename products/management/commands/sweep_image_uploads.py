@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.uploads import sweep_uploads
+
+
+class Command(BaseCommand):
+    help = 'Deletes image upload sessions and temporary files older than UPLOAD_SESSION_TTL.'
+
+    def handle(self, *args, **options):
+        deleted = sweep_uploads()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} image uploads older than {settings.UPLOAD_SESSION_TTL} seconds.'
+        ))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.changes import sweep_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Deletes product tombstones older than CATALOG_TOMBSTONE_RETENTION.'
+
+    def handle(self, *args, **options):
+        deleted = sweep_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} product tombstones older than {settings.CATALOG_TOMBSTONE_RETENTION} seconds.'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.recommendations import rebuild_recommendations, update_co_purchases
+
+
+class Command(BaseCommand):
+    help = 'Counts orders completed since the last update towards the co-purchase recommendations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Also recompute the recommendations of every product.',
+        )
+
+    def handle(self, *args, **options):
+        processed = update_co_purchases()
+        self.stdout.write(self.style.SUCCESS(f'Counted {processed} orders.'))
+        if options['rebuild']:
+            products = rebuild_recommendations()
+            self.stdout.write(self.style.SUCCESS(f'Recomputed the recommendations of {products} products.'))
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_changes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField()),
+                ('other_id', models.BigIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('product_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('neighbors', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='co_purchases_counted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'co_purchases_counted'], name='products_or_status_36435f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='copurchase',
+            index=models.Index(fields=['other_id'], name='products_co_other_i_ff4019_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='copurchase',
+            constraint=models.UniqueConstraint(fields=('product_id', 'other_id'), name='unique_co_purchase'),
+        ),
+    ]
@@ -1,7 +1,30 @@
 from django.db import models
+from django.utils import timezone
 
 from users.models import User
 
+
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        """
+        Loads the items of each order and their products up front, so that
+        serializing the orders issues no further queries.
+        """
+        return self.prefetch_related(
+            models.Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('product'))
+        )
+
+
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        """
+        Loads the items of each cart and their products up front.
+        """
+        return self.prefetch_related(
+            models.Prefetch('cartitem_set', queryset=CartItem.objects.select_related('product'))
+        )
+
+
 class Product(models.Model):
     """
     Represent product the seller(admin) uploads
@@ -13,10 +36,23 @@ class Product(models.Model):
     stock_quantity = models.PositiveIntegerField()
     image = models.ImageField(upload_to='product_images/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Indexed for the catalog delta sync (products.changes)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.name
+
+
+class ProductTombstone(models.Model):
+    """
+    Records a deleted product, so clients syncing the catalog (products.changes)
+    learn about the deletion.
+    """
+    product_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f'Product {self.product_id} deleted at {self.deleted_at}'
     
     
 class Order(models.Model):
@@ -32,6 +68,20 @@ class Order(models.Model):
         ('completed', 'Completed'),
         ('canceled', 'Canceled'),
     ], default='pending')
+    # Whether the order's products are counted in CoPurchase (products.recommendations)
+    co_purchases_counted = models.BooleanField(default=False)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'co_purchases_counted'])]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        order = super().from_db(db, field_names, values)
+        # Lets products.signals tell when a save changes the status
+        order._loaded_status = order.__dict__.get('status')
+        return order
     
     def __str__(self):
         return f"Order #{self.id} by {self.client.username}"
@@ -69,6 +119,8 @@ class Cart(models.Model):
     """
     client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart')
     products = models.ManyToManyField(Product, through= 'CartItem')
+
+    objects = CartQuerySet.as_manager()
     
     def __str__(self):
         return f"Cart for {self.client.username}"
@@ -84,3 +136,60 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
     
+
+
+class ImageUpload(models.Model):
+    """
+    A resumable, chunked upload of a product's image (see products.uploads).
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        COMPLETE = 'complete', 'Complete'
+        FAILED = 'failed', 'Failed'
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='image_uploads')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='image_uploads')
+    filename = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Upload of {self.filename} for product {self.product_id} ({self.status})'
+
+
+class CoPurchase(models.Model):
+    """
+    How many completed orders contained both products: one cell of the upper
+    triangle of the product co-occurrence matrix (product_id <= other_id). The
+    diagonal (product_id == other_id) counts the orders containing the product.
+    """
+    product_id = models.BigIntegerField()
+    other_id = models.BigIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product_id', 'other_id'], name='unique_co_purchase'),
+        ]
+        indexes = [models.Index(fields=['other_id'])]
+
+    def __str__(self):
+        return f'Products {self.product_id} and {self.other_id}: {self.count} orders'
+
+
+class ProductRecommendation(models.Model):
+    """
+    The products most often bought with a product, best first; precomputed
+    from CoPurchase and loaded by every worker (products.recommendations).
+    """
+    product_id = models.BigIntegerField(primary_key=True)
+    neighbors = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f'Recommendations for product {self.product_id}'
@@ -0,0 +1,292 @@
+"""
+"Frequently bought together" recommendations, from the co-occurrence of
+products in completed orders.
+
+CoPurchase holds the upper triangle of the product x product co-occurrence
+matrix: for each pair, the number of completed orders containing both, and
+on the diagonal the number of orders containing the product. It is kept up
+to date incrementally: update_co_purchases() adds the orders that completed
+since it last ran (Order.co_purchases_counted is False) and subtracts those
+that stopped being completed. It runs when an order's status changes, and
+`manage.py update_recommendations` catches up on anything left over.
+
+For each product whose counts changed, its RECOMMENDATIONS_TOP_K best
+neighbors are precomputed into ProductRecommendation. Pairs seen in fewer
+than RECOMMENDATIONS_MIN_COUNT orders are ignored. Neighbors are ranked by
+RECOMMENDATIONS_SCORE:
+
+    'cosine'  count(a, b) / sqrt(count(a) * count(b))
+    'lift'    count(a, b) * orders / (count(a) * count(b))
+
+Within one product's row count(a) and the number of orders are constant, so
+the ranking only needs the pair counts and the neighbors' diagonal. A
+neighbor's diagonal also changes when its orders don't involve the product,
+so rows drift slightly until `manage.py update_recommendations --rebuild`
+recomputes them all.
+
+Every worker keeps the precomputed lists in memory (RecommendationStore),
+topped up every RECOMMENDATIONS_SYNC_INTERVAL seconds, so serving them is a
+dictionary lookup.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from heapq import nlargest
+from itertools import combinations
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CoPurchase, Order, OrderItem, Product, ProductRecommendation
+
+logger = logging.getLogger(__name__)
+
+# Rows updated this close to the previous sync are read again, so updates
+# committed out of order are not missed.
+SYNC_OVERLAP = timedelta(seconds=5)
+CHUNK_SIZE = 500
+ATTEMPTS = 3
+
+
+def order_deltas(order_ids, sign, deltas):
+    """
+    Adds `sign` to the cells of `deltas` covering the products of each order.
+    Returns the products involved.
+    """
+    products = defaultdict(set)
+    for order_id, product_id in OrderItem.objects.filter(order_id__in=order_ids).values_list('order_id', 'product_id'):
+        products[order_id].add(product_id)
+
+    touched = set()
+    for product_ids in products.values():
+        product_ids = sorted(product_ids)
+        touched.update(product_ids)
+        for product_id in product_ids:
+            deltas[product_id, product_id] += sign
+        # Huge orders (restocking, bulk buys) say little about what goes together
+        if len(product_ids) <= settings.RECOMMENDATIONS_MAX_ORDER_PRODUCTS:
+            for pair in combinations(product_ids, 2):
+                deltas[pair] += sign
+    return touched
+
+
+def apply_deltas(deltas):
+    """
+    Adds `deltas` to the CoPurchase counts; call in a transaction.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = CoPurchase.objects.select_for_update().filter(
+        product_id__in={key[0] for key in deltas}, other_id__in={key[1] for key in deltas},
+    )
+    existing = {(row.product_id, row.other_id): row for row in rows}
+
+    changed, created = [], []
+    for (product_id, other_id), delta in deltas.items():
+        row = existing.get((product_id, other_id))
+        if row is None:
+            created.append(CoPurchase(product_id=product_id, other_id=other_id, count=delta))
+        else:
+            row.count += delta
+            changed.append(row)
+    CoPurchase.objects.bulk_update(changed, ['count'], batch_size=1000)
+    CoPurchase.objects.bulk_create(created, batch_size=1000)
+
+
+def count_batch(batch_size):
+    """
+    Counts up to `batch_size` newly completed orders and uncounts as many
+    orders that are no longer completed. Returns (orders, products touched).
+    """
+    for attempt in range(ATTEMPTS):
+        try:
+            with transaction.atomic():
+                pending = Order.objects.select_for_update(skip_locked=True)
+                added = list(
+                    pending.filter(status='completed', co_purchases_counted=False).values_list('pk', flat=True)[:batch_size]
+                )
+                removed = list(
+                    pending.filter(co_purchases_counted=True).exclude(status='completed').values_list('pk', flat=True)[:batch_size]
+                )
+                deltas = Counter()
+                touched = order_deltas(added, 1, deltas) | order_deltas(removed, -1, deltas)
+                apply_deltas(deltas)
+                Order.objects.filter(pk__in=added).update(co_purchases_counted=True)
+                Order.objects.filter(pk__in=removed).update(co_purchases_counted=False)
+            return len(added) + len(removed), touched
+        except IntegrityError:
+            # Another worker created some of the same cells; count again
+            if attempt == ATTEMPTS - 1:
+                raise
+
+
+def update_co_purchases(max_batches=None):
+    """
+    Brings the counts up to date with the orders' statuses and recomputes the
+    recommendations of the products involved. Returns the number of orders
+    counted or uncounted.
+    """
+    processed = batches = 0
+    while max_batches is None or batches < max_batches:
+        count, touched = count_batch(settings.RECOMMENDATIONS_BATCH_SIZE)
+        if not count:
+            break
+        processed += count
+        batches += 1
+        recompute(touched)
+    return processed
+
+
+def update_co_purchases_on_commit(using=None):
+    def update():
+        try:
+            update_co_purchases(max_batches=1)
+        except Exception:
+            # manage.py update_recommendations picks the orders up later
+            logger.exception('Updating co-purchase counts failed')
+
+    transaction.on_commit(update, using=using)
+
+
+def rank(pair_counts, product_counts):
+    """
+    Returns the best neighbors of a product given its pair counts and the
+    neighbors' order counts.
+    """
+    if settings.RECOMMENDATIONS_SCORE == 'lift':
+        def score(other_id):
+            return pair_counts[other_id] / product_counts[other_id]
+    else:
+        def score(other_id):
+            return pair_counts[other_id] / math.sqrt(product_counts[other_id])
+
+    candidates = [other_id for other_id in pair_counts if product_counts.get(other_id)]
+    return nlargest(settings.RECOMMENDATIONS_TOP_K, candidates, key=lambda other_id: (score(other_id), -other_id))
+
+
+def recompute(product_ids):
+    """
+    Recomputes and stores the recommendations of the given products.
+    """
+    product_ids = sorted(product_ids)
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        pairs = {product_id: {} for product_id in chunk}
+        rows = CoPurchase.objects.filter(
+            Q(product_id__in=chunk) | Q(other_id__in=chunk),
+            count__gte=settings.RECOMMENDATIONS_MIN_COUNT,
+        ).exclude(product_id=F('other_id'))
+        for product_id, other_id, count in rows.values_list('product_id', 'other_id', 'count'):
+            if product_id in pairs:
+                pairs[product_id][other_id] = count
+            if other_id in pairs:
+                pairs[other_id][product_id] = count
+
+        neighbor_ids = set().union(*pairs.values())
+        # Leave out products that have been deleted since
+        live = set(Product.objects.filter(pk__in=neighbor_ids).values_list('pk', flat=True))
+        product_counts = dict(
+            CoPurchase.objects.filter(product_id__in=live, other_id=F('product_id')).values_list('product_id', 'count')
+        )
+        ProductRecommendation.objects.bulk_create(
+            [
+                ProductRecommendation(
+                    product_id=product_id,
+                    neighbors=rank({other_id: count for other_id, count in pairs[product_id].items() if other_id in live}, product_counts),
+                    updated_at=timezone.now(),
+                )
+                for product_id in chunk
+            ],
+            update_conflicts=True,
+            unique_fields=['product_id'],
+            update_fields=['neighbors', 'updated_at'],
+        )
+
+
+def rebuild_recommendations():
+    """
+    Drops the counts of deleted products and recomputes the recommendations
+    of every product. Returns the number of products.
+    """
+    CoPurchase.objects.exclude(product_id__in=Product.objects.values('pk')).delete()
+    CoPurchase.objects.exclude(other_id__in=Product.objects.values('pk')).delete()
+    # Emptied rather than deleted, so the workers' incremental sync sees it
+    ProductRecommendation.objects.exclude(product_id__in=Product.objects.values('pk')).exclude(neighbors=[]).update(
+        neighbors=[], updated_at=timezone.now(),
+    )
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    recompute(product_ids)
+    return len(product_ids)
+
+
+class RecommendationStore:
+    """
+    Per-process copy of ProductRecommendation: product id -> tuple of product
+    ids. Topped up from the table every RECOMMENDATIONS_SYNC_INTERVAL seconds
+    and reloaded every RECOMMENDATIONS_RELOAD_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = {}
+        self._synced_at = None
+        self._next_sync = 0.0
+        self._next_reload = 0.0
+
+    def sync_due(self):
+        return time.monotonic() >= self._next_sync
+
+    def neighbors(self, product_id):
+        if self.sync_due():
+            self.sync()
+        return self._index.get(product_id, ())
+
+    async def aneighbors(self, product_id):
+        if self.sync_due():
+            await sync_to_async(self.sync)()
+        return self._index.get(product_id, ())
+
+    def sync(self, force_reload=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force_reload and now < self._next_sync:
+                return
+
+            started_at = timezone.now()
+            if force_reload or self._synced_at is None or now >= self._next_reload:
+                index = {}
+                rows = ProductRecommendation.objects.exclude(neighbors=[])
+                self._next_reload = now + settings.RECOMMENDATIONS_RELOAD_INTERVAL
+            else:
+                index = self._index
+                rows = ProductRecommendation.objects.filter(updated_at__gte=self._synced_at - SYNC_OVERLAP)
+            for product_id, neighbors in rows.values_list('product_id', 'neighbors').iterator(chunk_size=10_000):
+                if neighbors:
+                    index[product_id] = tuple(neighbors)
+                else:
+                    index.pop(product_id, None)
+            self._index = index
+            self._synced_at = started_at
+            self._next_sync = now + settings.RECOMMENDATIONS_SYNC_INTERVAL
+
+
+recommendation_store = RecommendationStore()
+
+
+def recommended_products(product_id):
+    """
+    Returns the ids of the products most often bought with the product.
+    """
+    return list(recommendation_store.neighbors(product_id))
+
+
+async def arecommended_products(product_id):
+    return list(await recommendation_store.aneighbors(product_id))
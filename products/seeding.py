@@ -0,0 +1,302 @@
+"""
+Fast generation of synthetic users, products, orders, carts and addresses.
+
+Rows are generated in batches from a seeded random generator, so the same
+scale and seed always produce the same data, and loaded with COPY from an
+in-memory buffer on PostgreSQL (bulk_create elsewhere). Primary keys are
+assigned up front so related rows can reference them without reading anything
+back, every user shares one password hash, and the secondary indexes of the
+tables are dropped for the load and rebuilt once at the end.
+"""
+
+import contextlib
+import io
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from users.models import User
+from .models import Address, Cart, CartItem, Order, OrderItem, Product
+
+# Rows per unit of scale; orders have 1-4 items (2.5 on average), so scale 1
+# makes about 5,000 order items and scale 2000 about 10 million.
+ROWS_PER_SCALE = {
+    'users': 1000,
+    'products': 500,
+    'orders': 2000,
+    'carts': 500,
+}
+SELLER_SHARE = 0.05
+
+FIRST_NAMES = ['Amani', 'Baraka', 'Chebet', 'Daudi', 'Esther', 'Faith', 'Grace', 'Hassan', 'Imani', 'Juma',
+               'Kamau', 'Lydia', 'Mercy', 'Njeri', 'Otieno', 'Pendo', 'Rehema', 'Salim', 'Wanjiru', 'Zawadi']
+LAST_NAMES = ['Achieng', 'Barasa', 'Chege', 'Kariuki', 'Kiprop', 'Maina', 'Mutua', 'Mwangi', 'Njoroge', 'Ochieng',
+              'Odhiambo', 'Omondi', 'Onyango', 'Too', 'Wafula', 'Wambui']
+ADJECTIVES = ['Classic', 'Compact', 'Deluxe', 'Durable', 'Eco', 'Essential', 'Fresh', 'Handmade', 'Organic', 'Premium']
+NOUNS = ['Backpack', 'Blender', 'Coffee', 'Headphones', 'Kettle', 'Lamp', 'Maize Flour', 'Phone Case', 'Sandals',
+         'Shirt', 'Solar Panel', 'Tea', 'Towel', 'Water Bottle']
+CITIES = [('Nairobi', 'Nairobi'), ('Mombasa', 'Mombasa'), ('Kisumu', 'Kisumu'), ('Nakuru', 'Nakuru'),
+          ('Eldoret', 'Uasin Gishu'), ('Thika', 'Kiambu'), ('Nyeri', 'Nyeri'), ('Machakos', 'Machakos')]
+ORDER_STATUSES = ['pending', 'completed', 'canceled']
+ORDER_STATUS_WEIGHTS = [15, 80, 5]
+
+# Seconds of history the generated timestamps are spread over
+HISTORY = 2 * 365 * 86400
+
+# The columns each table is loaded with. COPY leaves out nothing but these, and
+# model defaults aren't database defaults, so every non-null column must be here.
+COLUMNS = {
+    User: [
+        'id', 'password', 'last_login', 'phone', 'first_name', 'middle_name', 'last_name', 'passport_or_id',
+        'username', 'email', 'role', 'license_status', 'business_name', 'is_admin', 'is_active',
+        'updated_at', 'created_at', 'is_verified', 'claims_version',
+    ],
+    Product: ['id', 'seller_id', 'name', 'description', 'price', 'stock_quantity', 'image', 'created_at', 'updated_at'],
+    Order: ['id', 'client_id', 'total_prices', 'order_date', 'status', 'co_purchases_counted'],
+    OrderItem: ['id', 'order_id', 'product_id', 'quantity', 'price_at_time_of_order'],
+    Address: ['id', 'client_id', 'street', 'city', 'county', 'country'],
+    Cart: ['id', 'client_id'],
+    CartItem: ['id', 'cart_id', 'product_id', 'quantity'],
+}
+
+
+class TableLoader:
+    """
+    Buffers rows (tuples in the order of the model's COLUMNS) for one model
+    and inserts them `batch_size` at a time.
+    """
+
+    def __init__(self, model, batch_size):
+        self.model = model
+        self.attnames = attnames = COLUMNS[model]
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+        fields = {field.attname: field for field in model._meta.concrete_fields}
+        columns = ', '.join(connection.ops.quote_name(fields[attname].column) for attname in attnames)
+        self.copy_sql = f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN'
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if connection.vendor == 'postgresql':
+            self.copy()
+        else:
+            self.model.objects.bulk_create(
+                [self.model(**dict(zip(self.attnames, row))) for row in self.rows],
+                batch_size=self.batch_size,
+            )
+        self.count += len(self.rows)
+        self.rows = []
+
+    def copy(self):
+        buffer = io.StringIO()
+        for row in self.rows:
+            buffer.write('\t'.join(map(copy_value, row)))
+            buffer.write('\n')
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, 'copy'):
+                # psycopg 3
+                with raw.copy(self.copy_sql) as copy:
+                    copy.write(buffer.getvalue())
+            else:
+                buffer.seek(0)
+                raw.copy_expert(self.copy_sql, buffer)
+
+
+def copy_value(value):
+    """
+    Formats a value for COPY's text format. Generated text never contains
+    tabs, newlines or backslashes, so nothing needs escaping.
+    """
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def money(cents):
+    return f'{cents // 100}.{cents % 100:02d}'
+
+
+def next_id(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+def secondary_indexes(table):
+    """
+    Returns (name, definition) of the table's indexes that back neither the
+    primary key nor a unique constraint.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                """
+                SELECT i.relname, pg_get_indexdef(ix.indexrelid)
+                FROM pg_index ix
+                JOIN pg_class i ON i.oid = ix.indexrelid
+                JOIN pg_class t ON t.oid = ix.indrelid
+                WHERE t.relname = %s AND NOT ix.indisprimary AND NOT ix.indisunique
+                """,
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s "
+                "AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%%'",
+                [table],
+            )
+        else:
+            return []
+        return cursor.fetchall()
+
+
+@contextlib.contextmanager
+def deferred_indexes(models):
+    """
+    Drops the secondary indexes of the models' tables and rebuilds them on exit.
+    Must run inside a transaction: if loading fails, the rollback restores them.
+    """
+    indexes = [index for model in models for index in secondary_indexes(model._meta.db_table)]
+    with connection.cursor() as cursor:
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    yield
+    with connection.cursor() as cursor:
+        for _, definition in indexes:
+            cursor.execute(definition)
+
+
+def reset_sequences(models):
+    """
+    Moves the primary key sequences past the explicitly assigned ids.
+    """
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def seed_data(scale=1, random_seed=0, password='password', batch_size=10_000, log=None):
+    """
+    Generates and inserts scale * ROWS_PER_SCALE rows (plus their items and one
+    address per user) and returns the number of rows inserted per model.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    encoded_password = make_password(password)
+
+    def timestamp():
+        return now - timedelta(seconds=rng.randrange(HISTORY))
+
+    models = [User, Product, Order, OrderItem, Address, Cart, CartItem]
+    counts = {}
+
+    with transaction.atomic(), deferred_indexes(models):
+        # Users; the first SELLER_SHARE of them sell the products
+        first_user = next_id(User)
+        user_count = scale * ROWS_PER_SCALE['users']
+        sellers = max(1, int(user_count * SELLER_SHARE))
+        users = TableLoader(User, batch_size)
+        for user_id in range(first_user, first_user + user_count):
+            seller = user_id < first_user + sellers
+            created = timestamp()
+            users.add((
+                user_id, encoded_password, None, f'+2547{user_id:08d}', rng.choice(FIRST_NAMES), '',
+                rng.choice(LAST_NAMES), f'SEED{user_id:010d}', f'seed{user_id}', f'seed{user_id}@example.com',
+                User.Roles.ADMIN if seller else User.Roles.CLIENT, User.License.YES if seller else None,
+                f'Seed Store {user_id}' if seller else None, False, True, created, created, rng.random() < 0.7, 0,
+            ))
+        users.flush()
+        counts['users'] = users.count
+        log(f'users: {users.count}')
+
+        # Products
+        first_product = next_id(Product)
+        product_count = scale * ROWS_PER_SCALE['products']
+        prices = []
+        products = TableLoader(Product, batch_size)
+        seller_ids = range(first_user, first_user + sellers)
+        for product_id in range(first_product, first_product + product_count):
+            cents = rng.randrange(100, 2_000_000)
+            prices.append(cents)
+            created = timestamp()
+            name = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}'
+            products.add((
+                product_id, rng.choice(seller_ids), f'{name} {product_id}', f'{name}, synthetic product {product_id}.',
+                money(cents), rng.randrange(0, 1000), '', created, created,
+            ))
+        products.flush()
+        counts['products'] = products.count
+        log(f'products: {products.count}')
+
+        # Orders and their items, priced from the generated products. Items may be
+        # flushed before their order: foreign keys are only checked at commit.
+        first_order = next_id(Order)
+        order_item_id = next_id(OrderItem)
+        orders = TableLoader(Order, batch_size)
+        items = TableLoader(OrderItem, batch_size)
+        client_ids = range(first_user, first_user + user_count)
+        order_count = scale * ROWS_PER_SCALE['orders']
+        statuses = rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS, k=order_count)
+        for offset, order_id in enumerate(range(first_order, first_order + order_count)):
+            total = 0
+            for index in rng.sample(range(product_count), rng.randint(1, 4)):
+                quantity = rng.randint(1, 3)
+                total += prices[index] * quantity
+                items.add((order_item_id, order_id, first_product + index, quantity, money(prices[index])))
+                order_item_id += 1
+            orders.add((order_id, rng.choice(client_ids), money(total), timestamp(), statuses[offset], False))
+        orders.flush()
+        items.flush()
+        counts['orders'] = orders.count
+        counts['order items'] = items.count
+        log(f'orders: {orders.count}, order items: {items.count}')
+
+        # One address per user
+        addresses = TableLoader(Address, batch_size)
+        first_address = next_id(Address)
+        for offset, user_id in enumerate(client_ids):
+            city, county = rng.choice(CITIES)
+            addresses.add((first_address + offset, user_id, f'{rng.randint(1, 999)} {rng.choice(LAST_NAMES)} Road', city, county, 'Kenya'))
+        addresses.flush()
+        counts['addresses'] = addresses.count
+
+        # Open carts for some of the users
+        first_cart = next_id(Cart)
+        cart_item_id = next_id(CartItem)
+        carts = TableLoader(Cart, batch_size)
+        cart_items = TableLoader(CartItem, batch_size)
+        cart_count = min(user_count, scale * ROWS_PER_SCALE['carts'])
+        for cart_id, user_id in zip(range(first_cart, first_cart + cart_count), rng.sample(client_ids, cart_count)):
+            carts.add((cart_id, user_id))
+            for index in rng.sample(range(product_count), rng.randint(1, 3)):
+                cart_items.add((cart_item_id, cart_id, first_product + index, rng.randint(1, 3)))
+                cart_item_id += 1
+        carts.flush()
+        cart_items.flush()
+        counts['carts'] = carts.count
+        counts['cart items'] = cart_items.count
+        log(f'addresses: {addresses.count}, carts: {carts.count}, cart items: {cart_items.count}')
+
+        log('rebuilding indexes')
+
+    reset_sequences(models)
+    return counts
@@ -1,39 +1,77 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
 from rest_framework import serializers
 from .models import(
     Product, Order,
     OrderItem,CartItem,
-    Cart,
+    Cart, ImageUpload,
     )
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'seller', 'name', 'description', 'price', 'stock_quantity', 'image', 'created_at', 'updated_at']
+        read_only_fields = ['seller']
+
+    async def acreate(self, validated_data):
+        return await Product.objects.acreate(**validated_data)
+
+    async def aupdate(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        await instance.asave()
+        return instance
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer()
+    product = ProductSerializer(read_only=True)
+    product_id = serializers.PrimaryKeyRelatedField(source='product', queryset=Product.objects.all(), write_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'quantity', 'price_at_time_of_order']
+        fields = ['id', 'product', 'product_id', 'quantity', 'price_at_time_of_order']
+        read_only_fields = ['price_at_time_of_order']
 
 class OrderSerializer(serializers.ModelSerializer):
-    products = OrderItemSerializer(many=True)
-    
+    products = OrderItemSerializer(source='orderitem_set', many=True)
+    total_price = serializers.DecimalField(source='total_prices', max_digits=10, decimal_places=2, read_only=True)
+
     class Meta:
         model = Order
         fields = ['id', 'client', 'products', 'total_price', 'order_date', 'status']
-        
+        read_only_fields = ['client']
+
+    def build_order(self, validated_data):
+        """
+        Returns the unsaved order and its items, priced at the current product prices.
+        """
+        items = [
+            OrderItem(product=item['product'], quantity=item['quantity'], price_at_time_of_order=item['product'].price)
+            for item in validated_data.pop('orderitem_set')
+        ]
+        total = sum(item.price_at_time_of_order * item.quantity for item in items)
+        return Order(total_prices=total, **validated_data), items
+
     def create(self, validated_data):
-        products_data = validated_data.pop('products')
-        order = Order.objects.create(**validated_data)
-        
-        for item_data in products_data:
-            OrderItem.objects.create(order=order, **item_data)
-        
+        order, items = self.build_order(validated_data)
+        # One transaction, so the on_commit hooks of the order (co-purchase
+        # counts, events) only run once its items exist
+        with transaction.atomic():
+            order.save()
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
         return order
 
+    async def acreate(self, validated_data):
+        # Transactions need the sync ORM
+        return await sync_to_async(self.create)(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'orderitem_set' in validated_data:
+            raise serializers.ValidationError({'products': ['The products of an order cannot be changed.']})
+        return super().update(instance, validated_data)
+
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer()
@@ -41,10 +79,17 @@ class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['id', 'product', 'quantity']
-        
+
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(source='cartitem_set', many=True)
 
     class Meta:
         model = Cart
-        fields = ['id', 'client', 'items', 'created_at', 'updated_at']
+        fields = ['id', 'client', 'items']
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImageUpload
+        fields = ['id', 'product', 'filename', 'size', 'sha256', 'received', 'status', 'error', 'created_at', 'completed_at']
+        read_only_fields = ['product', 'received', 'status', 'error', 'created_at', 'completed_at']
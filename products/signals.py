@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .events import publish_order_status
+from .models import Order, Product, ProductTombstone
+from .recommendations import update_co_purchases_on_commit
+
+
+@receiver(post_delete, sender=Product)
+def record_product_deletion(sender, instance, using, **kwargs):
+    """
+    Remember deleted products so the catalog delta sync can report them.
+    """
+    ProductTombstone.objects.using(using).create(product_id=instance.pk)
+
+
+@receiver(post_save, sender=Order)
+def order_status_changed(sender, instance, created, using, **kwargs):
+    """
+    Once the transaction commits, push new orders and status changes to the
+    client's open event streams, and count orders that complete (or stop
+    being completed) towards the recommendations.
+    """
+    previous = getattr(instance, '_loaded_status', None)
+    if created or instance.status != previous:
+        client_id, order_id, order_status = instance.client_id, instance.pk, instance.status
+        transaction.on_commit(lambda: publish_order_status(client_id, order_id, order_status), using=using)
+        if 'completed' in (previous, instance.status):
+            update_co_purchases_on_commit(using=using)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Order)
+def push_order_deletion(sender, instance, using, **kwargs):
+    client_id, order_id = instance.client_id, instance.pk
+    transaction.on_commit(lambda: publish_order_status(client_id, order_id, 'deleted'), using=using)
@@ -1,3 +1,425 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import NOT_PROVIDED
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import include, path
+from django.utils import timezone
+from PIL import Image
+
+from config.asgi import application
+from core.metrics import collect, render
+from users.purge import run_purge, schedule_user_purge
+from users.serializers import MyTokenObtainPairSerializer
+from users.tests import PASSWORD, make_user
+from . import async_views
+from .changes import make_cursor
+from .models import CoPurchase, ImageUpload, Order, OrderItem, Product
+from .seeding import COLUMNS, seed_data
+from .serializers import OrderSerializer
+from .urls import view_urlpatterns
+
+# URLconf of AsyncViewTests: the async views, whatever PRODUCTS_ASYNC_VIEWS says
+urlpatterns = [path('api/v1/', include(view_urlpatterns(async_views)))]
+
+
+def auth_headers(user):
+    return {'Authorization': f'Bearer {MyTokenObtainPairSerializer.get_token(user).access_token}'}
+
+
+class CoPurchaseTests(TransactionTestCase):
+    """
+    Not a TestCase: its transaction would hold back the on_commit hooks that
+    production runs as soon as the order's transaction commits.
+    """
+
+    def setUp(self):
+        seller = make_user('seller', 1)
+        self.client_user = make_user('client', 2)
+        self.products = [
+            Product.objects.create(seller=seller, name=name, description=name, price=10, stock_quantity=5)
+            for name in ('tea', 'sugar')
+        ]
+        self.order_data = {
+            'products': [{'product_id': product.pk, 'quantity': 1} for product in self.products],
+            'status': 'completed',
+        }
+
+    def assert_counted(self):
+        order = Order.objects.get()
+        self.assertTrue(order.co_purchases_counted)
+        tea, sugar = self.products
+        self.assertEqual(CoPurchase.objects.get(product_id=tea.pk, other_id=sugar.pk).count, 1)
+
+    def test_completed_order_is_counted_with_its_items(self):
+        access = self.client.post(
+            '/api/v1/login/', {'email': self.client_user.email, 'password': PASSWORD}, content_type='application/json',
+        ).json()['access']
+        response = self.client.post(
+            '/api/v1/orders/', self.order_data, content_type='application/json',
+            headers={'Authorization': f'Bearer {access}'},
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assert_counted()
+
+    def test_completed_order_created_async_is_counted_with_its_items(self):
+        serializer = OrderSerializer(data=self.order_data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        async_to_sync(serializer.acreate)({**serializer.validated_data, 'client': self.client_user})
+        self.assert_counted()
+
+
+class SeedingTests(TestCase):
+    def test_copy_columns_cover_the_required_fields(self):
+        for model, attnames in COLUMNS.items():
+            with self.subTest(model=model.__name__):
+                fields = {field.attname: field for field in model._meta.concrete_fields}
+                self.assertLessEqual(set(attnames), set(fields))
+                required = {
+                    attname for attname, field in fields.items()
+                    if not field.null and field.db_default is NOT_PROVIDED
+                }
+                self.assertLessEqual(required, set(attnames))
+
+    def test_seed_data(self):
+        counts = seed_data(scale=1, batch_size=1000)
+        self.assertEqual(counts['orders'], Order.objects.count())
+        self.assertFalse(Order.objects.filter(co_purchases_counted=True).exists())
+
+
+class EventStream:
+    """
+    An SSE request to the ASGI application, read one body message at a time.
+    """
+
+    def __init__(self, user):
+        access = MyTokenObtainPairSerializer.get_token(user).access_token
+        self.scope = {
+            'type': 'http', 'method': 'GET', 'path': settings.ORDER_EVENTS_PATH, 'query_string': b'',
+            'headers': [(b'authorization', f'Bearer {access}'.encode())],
+        }
+        self.received = asyncio.Queue()
+        self.sent = asyncio.Queue()
+        self.task = asyncio.ensure_future(application(self.scope, self.received.get, self.sent.put))
+
+    async def read(self, timeout=5):
+        message = await asyncio.wait_for(self.sent.get(), timeout)
+        return message.get('body', b'')
+
+    async def close(self):
+        await self.received.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, 5)
+
+
+class OrderEventTests(TransactionTestCase):
+    """
+    Not a TestCase: the stream reads the database from other threads, and
+    events are published once the status change commits.
+    """
+
+    def setUp(self):
+        self.owner = make_user('owner', 1)
+        self.other = make_user('other', 2)
+        self.order = Order.objects.create(client=self.owner, total_prices=10)
+
+    async def test_status_change_reaches_the_owner_only(self):
+        owner_stream, other_stream = EventStream(self.owner), EventStream(self.other)
+        try:
+            for stream in (owner_stream, other_stream):
+                start = await asyncio.wait_for(stream.sent.get(), 5)
+                self.assertEqual(start['status'], 200)
+            # On connect each client gets its pending orders
+            self.assertIn(f'"id":{self.order.pk},"status":"pending"'.encode(), await owner_stream.read())
+            self.assertNotIn(b'event: order', await other_stream.read())
+
+            self.order.status = 'completed'
+            await sync_to_async(self.order.save)()
+            self.assertEqual(
+                await owner_stream.read(),
+                f'event: order\ndata: {{"id":{self.order.pk},"status":"completed"}}\n\n'.encode(),
+            )
+            with self.assertRaises(asyncio.TimeoutError):
+                await other_stream.read(timeout=0.2)
+
+            self.assertIn('order_event_connections{transport="sse"} 2', render(collect()))
+        finally:
+            await owner_stream.close()
+            await other_stream.close()
+
+
+class ViewFlows:
+    """
+    The product, order and cart flows, run against the sync and the async views.
+    """
+
+    def setUp(self):
+        self.seller = make_user('seller', 1)
+        self.buyer = make_user('buyer', 2)
+        self.product = Product.objects.create(seller=self.seller, name='Tea', description='Tea', price='2.50', stock_quantity=5)
+
+    async def call(self, method, path, user, data=None, **headers):
+        return await getattr(self.async_client, method)(
+            f'/api/v1/{path}', data, content_type='application/json', headers={**auth_headers(user), **headers},
+        )
+
+    async def test_product_flow(self):
+        response = await self.call('post', 'products/', self.seller, {
+            'name': 'Sugar', 'description': 'White sugar', 'price': '1.20', 'stock_quantity': 3,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        product = response.json()
+        self.assertEqual(product['seller'], self.seller.pk)
+
+        response = await self.call('get', 'products/', self.buyer)
+        self.assertEqual({item['name'] for item in response.json()}, {'Tea', 'Sugar'})
+        response = await self.call('get', f'products/{product["id"]}/', self.buyer)
+        self.assertEqual(response.json()['frequently_bought_together'], [])
+
+        response = await self.call('put', f'products/{product["id"]}/', self.seller, {'price': '1.50'})
+        self.assertEqual(response.json()['price'], '1.50')
+        response = await self.call('put', f'products/{product["id"]}/', self.seller, {'price': 'free'})
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual((await self.call('delete', f'products/{product["id"]}/', self.seller)).status_code, 204)
+        self.assertEqual((await self.call('get', f'products/{product["id"]}/', self.buyer)).status_code, 404)
+
+    async def test_order_flow(self):
+        response = await self.call('post', 'orders/', self.buyer, {
+            'products': [{'product_id': self.product.pk, 'quantity': 2}],
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        order = response.json()
+        self.assertEqual((order['client'], order['total_price'], order['status']), (self.buyer.pk, '5.00', 'pending'))
+        self.assertEqual([item['product']['name'] for item in order['products']], ['Tea'])
+
+        response = await self.call('post', 'orders/', self.buyer, {'products': [{'product_id': 0, 'quantity': 1}]})
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.call('get', 'orders/', self.buyer)
+        self.assertEqual([item['id'] for item in response.json()], [order['id']])
+        self.assertEqual((await self.call('get', 'orders/', self.seller)).json(), [])
+        self.assertEqual((await self.call('get', f'orders/{order["id"]}/', self.seller)).status_code, 404)
+
+        response = await self.call('put', f'orders/{order["id"]}/', self.buyer, {'status': 'canceled'})
+        self.assertEqual(response.json()['status'], 'canceled')
+        self.assertEqual((await self.call('get', f'orders/{order["id"]}/', self.buyer)).json()['status'], 'canceled')
+
+        self.assertEqual((await self.call('delete', f'orders/{order["id"]}/', self.seller)).status_code, 404)
+        self.assertEqual((await self.call('delete', f'orders/{order["id"]}/', self.buyer)).status_code, 204)
+
+    async def test_cart_flow(self):
+        self.assertEqual((await self.call('get', 'cart/', self.buyer)).json()['items'], [])
+        for _ in range(2):
+            response = await self.call('post', 'cart/', self.buyer, {'product_id': self.product.pk, 'quantity': 2})
+            self.assertEqual(response.status_code, 201, response.content)
+        [item] = response.json()['items']
+        self.assertEqual(item['quantity'], 4)
+        self.assertEqual((await self.call('post', 'cart/', self.buyer, {'product_id': self.product.pk + 1})).status_code, 404)
+        self.assertEqual((await self.call('post', 'cart/', self.buyer, {'quantity': 1})).status_code, 400)
+
+        response = await self.call('put', f'cart-item/update/{item["id"]}/', self.buyer, {'quantity': 1})
+        self.assertEqual(response.json()['quantity'], 1)
+        response = await self.call('put', f'cart-item/update/{item["id"]}/', self.buyer, {'quantity': 0})
+        self.assertEqual(response.status_code, 400)
+        response = await self.call('put', f'cart-item/update/{item["id"]}/', self.seller, {'quantity': 3})
+        self.assertEqual(response.status_code, 404)
+
+        self.assertEqual((await self.call('delete', f'cart-item/delete/{item["id"]}/', self.buyer)).status_code, 204)
+        self.assertEqual((await self.call('delete', f'cart-item/delete/{item["id"]}/', self.buyer)).status_code, 404)
+        self.assertEqual((await self.call('get', 'cart/', self.buyer)).json()['items'], [])
+
+    async def changes(self, since=None):
+        response = await self.call('get', 'products/changes/' + (f'?since={since}' if since else ''), self.buyer)
+        if not response.streaming:
+            return response.status_code, response.json()
+        if hasattr(response.streaming_content, '__aiter__'):
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        else:
+            # The sync views stream from the sync ORM
+            body = await sync_to_async(b''.join)(response.streaming_content)
+        return response.status_code, json.loads(body)
+
+    @override_settings(CATALOG_CHANGES_SAFETY_LAG=0, USER_PURGE_IN_THREAD=False)
+    async def test_product_changes_flow(self):
+        status, data = await self.changes()
+        self.assertEqual(status, 200)
+        self.assertTrue(data['full'])
+        self.assertEqual([product['name'] for product in data['products']], ['Tea'])
+        self.assertEqual(data['deleted'], [])
+
+        @sync_to_async
+        def change_catalog():
+            gone = Product.objects.create(seller=self.seller, name='Salt', description='Salt', price=1, stock_quantity=1)
+            gone_id = gone.pk
+            gone.delete()
+            leaving = make_user('leaving', 3)
+            purged = Product.objects.create(seller=leaving, name='Rice', description='Rice', price=3, stock_quantity=1)
+            run_purge(schedule_user_purge(leaving).pk)
+            self.product.price = '3.00'
+            self.product.save()
+            added = Product.objects.create(seller=self.seller, name='Milk', description='Milk', price=1, stock_quantity=1)
+            return [gone_id, purged.pk], added.pk
+
+        deleted, added = await change_catalog()
+        status, changes = await self.changes(data['cursor'])
+        self.assertEqual(status, 200)
+        self.assertFalse(changes['full'])
+        self.assertEqual([(p['id'], p['price']) for p in changes['products']], [(self.product.pk, '3.00'), (added, '1.00')])
+        # Tombstones from Product.delete() and from the purge's raw deletes
+        self.assertEqual(changes['deleted'], deleted)
+
+        status, data = await self.changes(changes['cursor'])
+        self.assertEqual((data['products'], data['deleted']), ([], []))
+
+    @override_settings(CATALOG_TOMBSTONE_RETENTION=3600)
+    async def test_product_changes_rejects_bad_cursors(self):
+        now = timezone.now()
+        for cursor in ('abc', '-5', make_cursor(now + timedelta(hours=1))):
+            with self.subTest(cursor=cursor):
+                self.assertEqual((await self.changes(cursor))[0], 400)
+        status, data = await self.changes(make_cursor(now - timedelta(hours=2)))
+        self.assertEqual(status, 410)
+        self.assertIn('sync the catalog again', data['detail'])
+
+
+    async def test_idempotent_retries(self):
+        # Stored responses are keyed by user id, which the next test may reuse
+        self.addCleanup(cache.clear)
+        data = {'products': [{'product_id': self.product.pk, 'quantity': 2}]}
+        first = await self.call('post', 'orders/', self.buyer, data, **{'Idempotency-Key': 'order-1'})
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+
+        retry = await self.call('post', 'orders/', self.buyer, data, **{'Idempotency-Key': 'order-1'})
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(retry.content, first.content)
+        # The database record answers once the cached copy is gone
+        await sync_to_async(cache.clear)()
+        retry = await self.call('post', 'orders/', self.buyer, data, **{'Idempotency-Key': 'order-1'})
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(await Order.objects.filter(client=self.buyer).acount(), 1)
+        self.assertEqual(await OrderItem.objects.filter(order__client=self.buyer).acount(), 1)
+
+        # The same key for another payload, or from another user, is another request
+        other = {'products': [{'product_id': self.product.pk, 'quantity': 1}]}
+        response = await self.call('post', 'orders/', self.buyer, other, **{'Idempotency-Key': 'order-1'})
+        self.assertEqual(response.status_code, 422)
+        response = await self.call('post', 'orders/', self.seller, data, **{'Idempotency-Key': 'order-1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.json()['id'], first.json()['id'])
+
+        response = await self.call('post', 'orders/', self.buyer, data, **{'Idempotency-Key': 'k' * 256})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(await Order.objects.acount(), 2)
+
+        for _ in range(2):
+            response = await self.call(
+                'post', 'cart/', self.buyer, {'product_id': self.product.pk, 'quantity': 1}, **{'Idempotency-Key': 'cart-1'},
+            )
+            self.assertEqual(response.status_code, 201, response.content)
+        response = await self.call('get', 'cart/', self.buyer)
+        self.assertEqual([item['quantity'] for item in response.json()['items']], [1])
+
+
+class SyncViewTests(ViewFlows, TestCase):
+    pass
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewTests(ViewFlows, TestCase):
+    pass
+
+
+class ImageUploadTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=os.path.join(tmp.name, 'media'), UPLOAD_TEMP_DIR=os.path.join(tmp.name, 'uploads'),
+        ))
+        self.seller = make_user('seller', 1)
+        self.product = Product.objects.create(
+            seller=self.seller, name='Tea', description='Tea', price='2.50', stock_quantity=5,
+        )
+        buffer = io.BytesIO()
+        Image.new('RGB', (32, 32), 'red').save(buffer, 'PNG')
+        self.image = buffer.getvalue()
+
+    def start(self, sha256=None):
+        response = self.client.post(
+            f'/api/v1/products/{self.product.pk}/image-uploads/',
+            {'filename': 'tea.png', 'size': len(self.image), 'sha256': sha256 or hashlib.sha256(self.image).hexdigest()},
+            content_type='application/json', headers=auth_headers(self.seller),
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['received'], 0)
+        return f'/api/v1/image-uploads/{response.json()["id"]}/'
+
+    def put(self, url, start, end):
+        return self.client.put(
+            url, self.image[start:end], content_type='application/octet-stream',
+            headers={'Content-Range': f'bytes {start}-{end - 1}/{len(self.image)}', **auth_headers(self.seller)},
+        )
+
+    def test_interrupted_upload_resumes(self):
+        url = self.start()
+        middle = len(self.image) // 2
+
+        response = self.put(url, 0, 10)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['received'], 10)
+        # A chunk that doesn't start at the offset is refused, with the offset
+        response = self.put(url, middle, len(self.image))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], 10)
+        # Finalizing early is refused too
+        self.assertEqual(self.client.post(url + 'finalize/', headers=auth_headers(self.seller)).status_code, 409)
+
+        response = self.client.get(url, headers=auth_headers(self.seller))
+        self.assertEqual(response.json()['received'], 10)
+        self.assertEqual(self.put(url, 10, middle).json()['received'], middle)
+        self.assertEqual(self.put(url, middle, len(self.image)).json()['received'], len(self.image))
+
+        response = self.client.post(url + 'finalize/', headers=auth_headers(self.seller))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.product.refresh_from_db()
+        self.assertRegex(self.product.image.name, r'^product_images/tea\.[0-9a-f]{16}\.png$')
+        with self.product.image.open('rb') as file:
+            self.assertEqual(file.read(), self.image)
+        self.assertEqual(ImageUpload.objects.get().status, ImageUpload.Status.COMPLETE)
+        self.assertEqual(os.listdir(settings.UPLOAD_TEMP_DIR), [])
+        self.assertEqual(self.put(url, 0, 10).status_code, 409)
+
+    def test_checksum_mismatch_fails_the_upload(self):
+        url = self.start(sha256='0' * 64)
+        self.assertEqual(self.put(url, 0, len(self.image)).status_code, 200)
+
+        response = self.client.post(url + 'finalize/', headers=auth_headers(self.seller))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sha256', response.json()['detail'])
+        upload = ImageUpload.objects.get()
+        self.assertEqual(upload.status, ImageUpload.Status.FAILED)
+        self.assertEqual(upload.error, response.json()['detail'])
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.image)
+        self.assertEqual(os.listdir(settings.UPLOAD_TEMP_DIR), [])
+
+    def test_uploads_are_private(self):
+        url = self.start()
+        other = make_user('other', 2)
+        headers = auth_headers(other)
+        self.assertEqual(self.client.get(url, headers=headers).status_code, 404)
+        self.assertEqual(self.client.post(url + 'finalize/', headers=headers).status_code, 404)
+        response = self.client.post(
+            f'/api/v1/products/{self.product.pk}/image-uploads/',
+            {'filename': 'tea.png', 'size': 1, 'sha256': '0' * 64}, content_type='application/json', headers=headers,
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,216 @@
+"""
+Resumable, chunked uploads of product images.
+
+A client opens an ImageUpload with the file's name, size and SHA-256, PUTs the
+bytes in chunks with a Content-Range header, and finalizes it. Chunks are
+streamed from the request straight into a temporary file under
+UPLOAD_TEMP_DIR at their offset, so nothing is buffered whole in memory and an
+interrupted upload resumes from ImageUpload.received. Finalizing checks the
+size and checksum, checks that the file is an image and moves it into storage
+as the product's image.
+"""
+
+import fcntl
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import ImageUpload
+
+COPY_BUFFER_SIZE = 64 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    """
+    A request that can't be applied to the upload; `status` is the HTTP
+    status to answer with.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadedFile(File):
+    """
+    The assembled temporary file. FileSystemStorage moves files that have a
+    temporary_file_path() into place instead of copying them.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def temp_path(upload):
+    return os.path.join(settings.UPLOAD_TEMP_DIR, f'image-upload-{upload.pk}.part')
+
+
+def create_upload(product, owner, filename, size, sha256):
+    if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f'Size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes.')
+    if not re.fullmatch(r'[0-9a-f]{64}', sha256):
+        raise UploadError('sha256 must be 64 lowercase hex digits.')
+    filename = os.path.basename(filename).strip()
+    if not filename:
+        raise UploadError('A filename is required.')
+
+    upload = ImageUpload.objects.create(product=product, owner=owner, filename=filename[-100:], size=size, sha256=sha256)
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    # Sparse file of the final size; chunks are written in place
+    with open(temp_path(upload), 'wb') as file:
+        file.truncate(size)
+    return upload
+
+
+def parse_content_range(header, upload):
+    """
+    Returns (start, length) of a 'bytes <first>-<last>/<size>' header.
+    """
+    match = CONTENT_RANGE.match(header or '')
+    if match is None:
+        raise UploadError('A "Content-Range: bytes <first>-<last>/<size>" header is required.')
+    first, last, size = map(int, match.groups())
+    if size != upload.size or last < first or last >= size:
+        raise UploadError(f'Invalid range for a {upload.size} byte upload.', status=416)
+    return first, last - first + 1
+
+
+def write_chunk(upload, stream, content_range):
+    """
+    Streams one chunk from `stream` into the temporary file and returns the
+    upload with its new offset. Chunks must start where the previous one ended
+    (409 with the current offset otherwise), so a client that lost a response
+    can ask for the offset and carry on from there.
+    """
+    if upload.status != ImageUpload.Status.PENDING:
+        raise UploadError(f'The upload is {upload.status}.', status=409)
+    start, length = parse_content_range(content_range, upload)
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadError(f'Chunks are limited to {settings.UPLOAD_CHUNK_MAX_SIZE} bytes.', status=413)
+
+    try:
+        file = open(temp_path(upload), 'r+b')
+    except FileNotFoundError:
+        upload.refresh_from_db(fields=['received', 'status'])
+        raise UploadError(f'The upload is {upload.status}.', status=409)
+
+    with file:
+        try:
+            # One writer at a time, without holding a database transaction
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Another chunk of this upload is being written.', status=409)
+        upload.refresh_from_db(fields=['received', 'status'])
+        if upload.status != ImageUpload.Status.PENDING:
+            raise UploadError(f'The upload is {upload.status}.', status=409)
+        if start != upload.received:
+            raise UploadError(f'Expected a chunk starting at byte {upload.received}.', status=409)
+
+        file.seek(start)
+        remaining = length
+        while remaining:
+            data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            file.write(data)
+            remaining -= len(data)
+        file.flush()
+        received = start + length - remaining
+        ImageUpload.objects.filter(pk=upload.pk, received=start).update(received=received)
+        upload.received = received
+
+    if remaining:
+        raise UploadError(f'The chunk ended after {length - remaining} of {length} bytes.')
+    return upload
+
+
+def file_sha256(file):
+    sha256 = hashlib.sha256()
+    file.seek(0)
+    while data := file.read(COPY_BUFFER_SIZE):
+        sha256.update(data)
+    return sha256.hexdigest()
+
+
+def fail(upload, message, status=400):
+    upload.status = ImageUpload.Status.FAILED
+    upload.error = message
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['status', 'error', 'completed_at'])
+    discard_temp_file(upload)
+    raise UploadError(message, status=status)
+
+
+def finalize_upload(upload):
+    """
+    Verifies the assembled file and makes it the product's image. Holds the
+    same lock as write_chunk(), so no chunk lands while the file is checked.
+    """
+    try:
+        file = open(temp_path(upload), 'rb')
+    except FileNotFoundError:
+        # Finalized or failed meanwhile
+        upload.refresh_from_db(fields=['received', 'status'])
+        raise UploadError(f'The upload is {upload.status}.', status=409)
+
+    with file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('A chunk of this upload is being written.', status=409)
+        upload.refresh_from_db(fields=['received', 'status'])
+        if upload.status != ImageUpload.Status.PENDING:
+            raise UploadError(f'The upload is {upload.status}.', status=409)
+        if upload.received != upload.size:
+            raise UploadError(f'Only {upload.received} of {upload.size} bytes have been received.', status=409)
+
+        if file_sha256(file) != upload.sha256:
+            fail(upload, 'The file does not match its sha256 checksum.')
+        try:
+            file.seek(0)
+            with Image.open(file) as image:
+                image.verify()
+        except Exception:
+            fail(upload, 'The file is not a valid image.')
+
+        file.seek(0)
+        product = upload.product
+        with transaction.atomic():
+            product.image.save(upload.filename, UploadedFile(file), save=False)
+            product.save(update_fields=['image', 'updated_at'])
+            upload.status = ImageUpload.Status.COMPLETE
+            upload.completed_at = timezone.now()
+            upload.save(update_fields=['status', 'completed_at'])
+    discard_temp_file(upload)
+    return upload
+
+
+def discard_temp_file(upload):
+    try:
+        os.remove(temp_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def sweep_uploads(now=None):
+    """
+    Deletes the uploads created more than UPLOAD_SESSION_TTL seconds ago, and
+    temporary files untouched for as long (including those of uploads deleted
+    along with their product). Returns the number of uploads deleted.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    deleted, _ = ImageUpload.objects.filter(created_at__lt=cutoff).delete()
+    if os.path.isdir(settings.UPLOAD_TEMP_DIR):
+        for entry in os.scandir(settings.UPLOAD_TEMP_DIR):
+            if entry.name.startswith('image-upload-') and entry.stat().st_mtime < cutoff.timestamp():
+                os.remove(entry.path)
+    return deleted
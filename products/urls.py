@@ -1,14 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-
-urlpatterns = [
-    path('products/', views.ProductList.as_view(), name='product-list'),
-    path('products/<int:pk>/', views.ProductDetail.as_view(), name='product-detail'),
-    
-    path('orders/', views.OrderList.as_view(), name='order-list'),
-    path('orders/<int:pk>/', views.OrderDetail.as_view(), name='order-detail'),
-    
-    path('cart/', views.Cart.as_view(), name='cart-view'),
-    path('cart-item/update/<int:cart_item_id>/', views.CartItemUpdate.as_view(), name='cart-item-update'),
-    path('cart-item/delete/<int:cart_item_id>/', views.CartItemDelete.as_view(), name='cart-item-delete'),
-]
+from . import async_views, views
+
+
+def view_urlpatterns(views):
+    """
+    The routes of the product, order and cart views in `views`, which is
+    products.views or products.async_views.
+    """
+    return [
+        path('products/', views.ProductList.as_view(), name='product-list'),
+        path('products/changes/', views.ProductChanges.as_view(), name='product-changes'),
+        path('products/<int:pk>/', views.ProductDetail.as_view(), name='product-detail'),
+
+        path('orders/', views.OrderList.as_view(), name='order-list'),
+        path('orders/<int:pk>/', views.OrderDetail.as_view(), name='order-detail'),
+
+        path('cart/', views.CartDetail.as_view(), name='cart-view'),
+        path('cart-item/update/<int:cart_item_id>/', views.CartItemUpdate.as_view(), name='cart-item-update'),
+        path('cart-item/delete/<int:cart_item_id>/', views.CartItemDelete.as_view(), name='cart-item-delete'),
+
+        path('products/<int:pk>/image-uploads/', views.ImageUploadList.as_view(), name='image-upload-list'),
+        path('image-uploads/<int:upload_id>/', views.ImageUploadDetail.as_view(), name='image-upload-detail'),
+        path('image-uploads/<int:upload_id>/finalize/', views.ImageUploadFinalize.as_view(), name='image-upload-finalize'),
+    ]
+
+
+urlpatterns = view_urlpatterns(async_views if settings.PRODUCTS_ASYNC_VIEWS else views)
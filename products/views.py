@@ -1,19 +1,30 @@
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
+
+from core.idempotency import idempotent
+from users.authentication import ClaimsJWTAuthentication
 from .models import (
     Order, Cart, 
-    CartItem, Product
+    CartItem, Product,
+    ImageUpload
     )
 from .serializers import (
     OrderSerializer,
     ProductSerializer,
     CartSerializer, 
-    CartItemSerializer
+    CartItemSerializer,
+    ImageUploadSerializer
     )
+from .changes import StaleCursor, parse_cursor, stream_changes, sync_until
+from .recommendations import recommended_products
+from .uploads import UploadError, create_upload, finalize_upload, write_chunk
 
 class ProductList(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
@@ -42,7 +53,35 @@ class ProductList(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
+class ProductChanges(APIView):
+    """
+    Catalog delta sync (see products.changes).
+    """
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Returns the products created or updated and the ids of the products
+        deleted since the `since` cursor, with the cursor to pass next time.
+        Without `since`, returns every product (`"full": true`). A cursor too
+        old to sync from is answered with 410; start again without one.
+
+        HTTP Method: GET
+        """
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = parse_cursor(since)
+            except StaleCursor as exc:
+                return Response({"detail": str(exc)}, status=status.HTTP_410_GONE)
+            except ValueError as exc:
+                return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return StreamingHttpResponse(stream_changes(since, sync_until()), content_type='application/json')
+
+
 class ProductDetail(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get(Self, request, pk):
@@ -61,7 +100,7 @@ class ProductDetail(APIView):
             return Response({"detail": "Not Found"}, status=status.HTTP_404_NOT_FOUND)
         
         serializer = ProductSerializer(product)
-        return Response(serializer.data)
+        return Response({**serializer.data, "frequently_bought_together": recommended_products(product.pk)})
     
     def put(self, request, pk):
         """
@@ -104,6 +143,7 @@ class ProductDetail(APIView):
     
 
 class OrderList(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
@@ -115,10 +155,11 @@ class OrderList(APIView):
 
         HTTP Method: GET
         """   
-        orders = Order.objects.filter(client = request.user)
+        orders = Order.objects.filter(client = request.user).with_items()
         serializer = OrderSerializer(orders, many = True)
         return Response(serializer.data)
     
+    @idempotent
     def post(self, request):
         """
         Create a new order.
@@ -130,11 +171,13 @@ class OrderList(APIView):
         """
         serializer = OrderSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(client = request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            order = serializer.save(client = request.user)
+            order = Order.objects.with_items().get(pk=order.pk)
+            return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 class OrderDetail(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]  # JWT protection
 
     def get(self, request, pk):
@@ -147,7 +190,7 @@ class OrderDetail(APIView):
         HTTP Method: GET
         """
         try:
-            order = Order.objects.get(pk=pk, client=request.user)
+            order = Order.objects.with_items().get(pk=pk, client=request.user)
         except Order.DoesNotExist:
             return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -164,7 +207,7 @@ class OrderDetail(APIView):
         HTTP Method: PUT
         """
         try:
-            order = Order.objects.get(pk=pk, client=request.user)
+            order = Order.objects.with_items().get(pk=pk, client=request.user)
         except Order.DoesNotExist:
             return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -191,7 +234,19 @@ class OrderDetail(APIView):
         order.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class Cart(APIView):
+def parse_quantity(value):
+    """
+    Returns the quantity as a positive int, or None if it isn't one.
+    """
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None
+    return quantity if quantity > 0 else None
+
+
+class CartDetail(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -203,9 +258,11 @@ class Cart(APIView):
         HTTP Method: GET
         """
         cart, created = Cart.objects.get_or_create(client=request.user)
+        cart = Cart.objects.with_items().get(pk=cart.pk)
         serializer = CartSerializer(cart)
         return Response(serializer.data)
 
+    @idempotent
     def post(self, request):
         """
         Add a product to the cart
@@ -215,7 +272,7 @@ class Cart(APIView):
         HTTP Method: POST
         """
         product_id = request.data.get('product_id')
-        quantity = request.data.get('quantity', 1)
+        quantity = parse_quantity(request.data.get('quantity', 1))
         
         if not product_id or not quantity:
             return Response({"detail": "Product ID and quantity are required."}, status=status.HTTP_400_BAD_REQUEST)
@@ -227,15 +284,15 @@ class Cart(APIView):
         
         cart, created = Cart.objects.get_or_create(client=request.user)
         
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-
-        cart_item.quantity += quantity
-        cart_item.save()
+        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product, defaults={'quantity': 0})
+        CartItem.objects.filter(pk=cart_item.pk).update(quantity=F('quantity') + quantity)
 
+        cart = Cart.objects.with_items().get(pk=cart.pk)
         serializer = CartSerializer(cart)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class CartItemUpdate(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def put(self, request, cart_item_id):
@@ -248,21 +305,22 @@ class CartItemUpdate(APIView):
         HTTP Method: PUT
         """
         try:
-            cart_item = CartItem.objects.get(id=cart_item_id, cart__client=request.user)
+            cart_item = CartItem.objects.select_related('product').get(id=cart_item_id, cart__client=request.user)
         except CartItem.DoesNotExist:
             return Response({"detail": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        quantity = request.data.get('quantity')
-        if quantity is None or quantity <= 0:
+        quantity = parse_quantity(request.data.get('quantity'))
+        if quantity is None:
             return Response({"detail": "Quantity must be greater than 0."}, status=status.HTTP_400_BAD_REQUEST)
         
         cart_item.quantity = quantity
-        cart_item.save()
+        cart_item.save(update_fields=['quantity'])
 
         serializer = CartItemSerializer(cart_item)
         return Response(serializer.data)
 
 class CartItemDelete(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, cart_item_id):
@@ -280,4 +338,95 @@ class CartItemDelete(APIView):
             return Response({"detail": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
 
         cart_item.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ImageUploadList(APIView):
+    """
+    Starts a resumable upload of a product's image (see products.uploads).
+    """
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        """
+        Opens an upload session for the image of one of the seller's products.
+
+        Expects the file's `filename`, `size` in bytes and hex `sha256`, and
+        returns the session, whose `received` offset the chunks start from.
+
+        HTTP Method: POST
+        """
+        try:
+            product = Product.objects.get(pk=pk, seller=request.user)
+        except Product.DoesNotExist:
+            return Response({"detail": "Not Found"}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = ImageUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = create_upload(product, request.user, **serializer.validated_data)
+        except UploadError as exc:
+            return Response({"detail": str(exc)}, status=exc.status)
+        return Response(ImageUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+
+class ImageUploadDetail(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id):
+        """
+        Returns the upload, with the offset to resume from in `received`.
+
+        HTTP Method: GET
+        """
+        try:
+            upload = ImageUpload.objects.get(pk=upload_id, owner=request.user)
+        except ImageUpload.DoesNotExist:
+            return Response({"detail": "Not Found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ImageUploadSerializer(upload).data)
+
+    def put(self, request, upload_id):
+        """
+        Writes one chunk. The raw body holds the bytes given by the
+        `Content-Range: bytes <first>-<last>/<size>` header, and must start
+        at the upload's `received` offset.
+
+        HTTP Method: PUT
+        """
+        try:
+            upload = ImageUpload.objects.get(pk=upload_id, owner=request.user)
+        except ImageUpload.DoesNotExist:
+            return Response({"detail": "Not Found"}, status=status.HTTP_404_NOT_FOUND)
+        if request.stream is None:
+            return Response({"detail": "The chunk is empty."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            upload = write_chunk(upload, request.stream, request.headers.get('Content-Range'))
+        except UploadError as exc:
+            return Response({"detail": str(exc), "received": upload.received}, status=exc.status)
+        return Response(ImageUploadSerializer(upload).data)
+
+
+class ImageUploadFinalize(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        """
+        Checks the size and checksum of the uploaded file and sets it as the
+        product's image. Returns the updated product.
+
+        HTTP Method: POST
+        """
+        try:
+            upload = ImageUpload.objects.select_related('product').get(pk=upload_id, owner=request.user)
+        except ImageUpload.DoesNotExist:
+            return Response({"detail": "Not Found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            upload = finalize_upload(upload)
+        except UploadError as exc:
+            return Response({"detail": str(exc)}, status=exc.status)
+        return Response(ProductSerializer(upload.product, context={'request': request}).data)
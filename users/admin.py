@@ -1,4 +1,20 @@
 from django.contrib import admin
-from .models import  User
+from .models import  User, UserPurge
+from .utils.claims import revoke_user_tokens
 
-admin.site.register(User)
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    actions = ['revoke_tokens']
+
+    @admin.action(description='Revoke all tokens of the selected users')
+    def revoke_tokens(self, request, queryset):
+        revoke_user_tokens(queryset.values_list('pk', flat=True))
+        self.message_user(request, 'Tokens revoked.')
+
+
+@admin.register(UserPurge)
+class UserPurgeAdmin(admin.ModelAdmin):
+    list_display = ['email', 'status', 'current_step', 'rows_deleted', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = [field.name for field in UserPurge._meta.fields]
@@ -0,0 +1,76 @@
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .utils.claims import get_claims_version
+from .utils.revocation import is_token_revoked
+
+
+class RevocableJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that also rejects tokens revoked through users.utils.revocation.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise InvalidToken(_('Token has been revoked'))
+        return validated_token
+
+
+class ClaimsJWTAuthentication(RevocableJWTAuthentication):
+    """
+    JWT authentication that builds the user from the claims of the verified token
+    instead of loading the user row on every request.
+
+    The returned user is a regular `User` instance whose claim-backed fields are
+    populated and whose other fields are deferred, so they are only fetched from
+    the database if a view actually reads them. Tokens are rejected once their
+    `claims_version` no longer matches the user's (see revoke_user_tokens).
+
+    Only use it on views that don't save the user: the claims can be up to one
+    access token lifetime old.
+    """
+
+    # Token claim -> User field, for the claims MyTokenObtainPairSerializer.get_token adds
+    claim_fields = {
+        'email': 'email',
+        'username': 'username',
+        'role': 'role',
+        'is_verified': 'is_verified',
+    }
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        version = get_claims_version(user_id)
+        if version is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if validated_token.get('claims_version', 0) != version:
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+        return self.user_from_claims(user_id, validated_token)
+
+    def user_from_claims(self, user_id, validated_token):
+        """
+        Returns a User with the fields carried by the token set and every other field deferred.
+        """
+        loaded = {api_settings.USER_ID_FIELD: user_id}
+        for claim, field in self.claim_fields.items():
+            if claim in validated_token:
+                loaded[field] = validated_token[claim]
+
+        field_names = []
+        values = []
+        for field in User._meta.concrete_fields:
+            if field.attname in loaded:
+                field_names.append(field.attname)
+                values.append(loaded[field.attname])
+
+        return User.from_db(User.objects.db, field_names, values)
@@ -0,0 +1,102 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_login_failed
+
+from .hashing import acheck_password, amake_password
+from .models import User
+from .utils.phone import format_phone_number
+
+
+class EmailOrPhoneBackend(ModelBackend):
+    """
+    Authenticates a user by email address or phone number.
+
+    The identifier is classified before touching the database, so the user is
+    resolved with a single query against one unique (indexed) column.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        lookup = self.get_lookup(username)
+        user = None
+        if lookup is not None:
+            try:
+                user = User._default_manager.get(**lookup)
+            except User.DoesNotExist:
+                pass
+
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """
+        See authenticate(). The password is verified in the hashing pool
+        (users.hashing), so the event loop is never blocked on the hasher.
+        """
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        lookup = self.get_lookup(username)
+        user = None
+        if lookup is not None:
+            try:
+                user = await User._default_manager.aget(**lookup)
+            except User.DoesNotExist:
+                pass
+
+        if user is None:
+            await amake_password(password)
+            return None
+
+        if await acheck_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    @staticmethod
+    def get_lookup(identifier):
+        """
+        Returns the filter used to find the user for ``identifier``,
+        or None if it is neither an email address nor a valid phone number.
+        """
+        identifier = str(identifier).strip()
+        if '@' in identifier:
+            return {'email': identifier}
+        try:
+            return {'phone': format_phone_number(identifier)}
+        except ValueError:
+            return None
+
+
+async def aauthenticate(request=None, **credentials):
+    """
+    Async counterpart of django.contrib.auth.authenticate().
+
+    Django's own aauthenticate() runs authenticate() in the single thread shared
+    by all sync code, which serialises every login on the password hasher.
+    """
+    backend = EmailOrPhoneBackend()
+    user = await backend.aauthenticate(request, **credentials)
+    if user is None:
+        await user_login_failed.asend(
+            sender=__name__,
+            credentials={
+                key: '********************' if key == 'password' else value
+                for key, value in credentials.items()
+            },
+            request=request,
+        )
+        return None
+    user.backend = f'{backend.__module__}.{type(backend).__name__}'
+    return user
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _param(name, default):
+    return settings.PASSWORD_HASHER_PARAMS.get(name, default)
+
+
+class TunablePBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2 with its iteration count taken from PASSWORD_HASHER_PARAMS['iterations'].
+    """
+
+    @property
+    def iterations(self):
+        return _param('iterations', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class TunableScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """
+    Scrypt with its cost taken from PASSWORD_HASHER_PARAMS
+    ('work_factor', 'block_size', 'parallelism', 'maxmem').
+    """
+
+    @property
+    def work_factor(self):
+        return _param('work_factor', hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return _param('block_size', hashers.ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return _param('parallelism', hashers.ScryptPasswordHasher.parallelism)
+
+    @property
+    def maxmem(self):
+        return _param('maxmem', hashers.ScryptPasswordHasher.maxmem)
+
+
+class TunableArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """
+    Argon2 with its cost taken from PASSWORD_HASHER_PARAMS
+    ('time_cost', 'memory_cost', 'parallelism').
+    """
+
+    @property
+    def time_cost(self):
+        return _param('time_cost', hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return _param('memory_cost', hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return _param('parallelism', hashers.Argon2PasswordHasher.parallelism)
+
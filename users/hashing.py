@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def init_process_worker():
+    """
+    Initializer for pool processes that compute password hashes.
+    """
+    import django
+    django.setup()
+
+
+def get_executor():
+    """
+    Returns the bounded pool password hashes are computed in.
+
+    PBKDF2, scrypt and argon2 release the GIL while hashing, so threads are the
+    default; PASSWORD_HASHING_EXECUTOR = 'process' switches to a process pool.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = settings.PASSWORD_HASHING_WORKERS
+                if settings.PASSWORD_HASHING_EXECUTOR == 'process':
+                    _executor = ProcessPoolExecutor(workers, initializer=init_process_worker)
+                else:
+                    _executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hashing')
+    return _executor
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+
+async def amake_password(password):
+    """
+    make_password() computed in the hashing pool instead of on the event loop.
+    """
+    return await _run(make_password, password)
+
+
+async def acheck_password(user, raw_password):
+    """
+    user.check_password() with the hash verified in the hashing pool.
+
+    Like check_password(), a correct password stored with an outdated hasher or
+    outdated parameters is re-hashed and saved.
+    """
+    is_correct, must_update = await _run(verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = await amake_password(raw_password)
+        await user.asave(update_fields=['password'])
+    return is_correct
+
+
+async def aset_password(user, raw_password):
+    """
+    user.set_password() with the hash computed in the hashing pool.
+    """
+    user.password = await amake_password(raw_password)
+    user._password = raw_password
@@ -0,0 +1,54 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.utils.bloom import BloomFilter
+
+
+def read_passwords(path):
+    """
+    Yields the lowercased passwords of a word list, one per line (optionally gzipped).
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            password = line.strip()
+            if password:
+                yield password.lower()
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds the memory-mapped Bloom filter of breached passwords '
+        'checked by users.password_policy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('wordlists', nargs='+', help='Password lists, one password per line.')
+        parser.add_argument(
+            '--output', default=settings.BREACHED_PASSWORDS_FILTER,
+            help='Filter file to write (defaults to BREACHED_PASSWORDS_FILTER).',
+        )
+        parser.add_argument('--error-rate', type=float, default=0.001)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if not output:
+            raise CommandError('Pass --output or set BREACHED_PASSWORDS_FILTER.')
+
+        capacity = sum(1 for path in options['wordlists'] for _ in read_passwords(path))
+        bloom = BloomFilter.for_capacity(capacity, options['error_rate'])
+        for path in options['wordlists']:
+            for password in read_passwords(path):
+                bloom.add(password)
+
+        # Write next to the target and rename, so running workers never map a partial file
+        tmp_path = f'{output}.tmp'
+        bloom.save(tmp_path)
+        os.replace(tmp_path, output)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {bloom.count} passwords ({len(bloom.bits) // 1024} KiB) to {output}.'
+        ))
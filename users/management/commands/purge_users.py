@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.models import UserPurge
+from users.purge import claimable_purges, run_purge
+
+
+class Command(BaseCommand):
+    help = 'Runs pending user deletions, and running ones whose worker died (see users.purge).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows deleted per statement.')
+        parser.add_argument('--retry-failed', action='store_true', help='Queue failed deletions again first.')
+        parser.add_argument(
+            '--poll', type=float, default=None,
+            help='Keep running, checking for new deletions every POLL seconds.',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            UserPurge.objects.filter(status=UserPurge.Status.FAILED).update(
+                status=UserPurge.Status.PENDING, error='',
+            )
+
+        while True:
+            pending = claimable_purges().order_by('pk')
+            for purge_id in pending.values_list('pk', flat=True):
+                if run_purge(purge_id, options['chunk_size']):
+                    purge = UserPurge.objects.get(pk=purge_id)
+                    self.stdout.write(f'{purge.email}: {purge.status}, {purge.rows_deleted} rows deleted')
+
+            if options['poll'] is None:
+                break
+            time.sleep(options['poll'])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = 'Deletes revoked tokens that have expired and no longer need to be tracked.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=10_000,
+            help='Number of rows deleted per statement.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        deleted = 0
+        while True:
+            ids = list(
+                RevokedToken.objects.filter(expires_at__lte=now)
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted += RevokedToken.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired revoked tokens.'))
@@ -3,7 +3,23 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from phonenumber_field.modelfields import PhoneNumberField
 import uuid
 
-class UserManager(BaseUserManager):
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Also drops the cached token claims of the updated users when a claim
+        field changes, since QuerySet.update() doesn't send post_save.
+        """
+        from .utils.claims import CLAIM_FIELDS, invalidate_users_claims
+
+        if CLAIM_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        user_ids = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        invalidate_users_claims(user_ids)
+        return updated
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """
     Custom manager for the User model.
     """
@@ -67,6 +83,8 @@ class User(AbstractBaseUser):
     updated_at = models.DateTimeField(auto_now=True, editable=True)
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     is_verified = models.BooleanField(default=False)
+    # Bumped to invalidate every token issued to the user (see users.authentication)
+    claims_version = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['phone']
@@ -84,4 +102,42 @@ class User(AbstractBaseUser):
         return self.is_admin
 
     def __str__(self):
-        return f'{self.email}'
\ No newline at end of file
+        return f'{self.email}'
+
+
+class RevokedToken(models.Model):
+    """
+    A JWT revoked before it expired, identified by its `jti` claim.
+    Rows can be deleted once `expires_at` has passed (see sweep_revoked_tokens).
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+
+class UserPurge(models.Model):
+    """
+    Background deletion of a user and every row that belongs to them (see users.purge).
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    user_id = models.BigIntegerField(db_index=True)
+    email = models.EmailField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING, db_index=True)
+    current_step = models.CharField(max_length=50, blank=True)
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Purge of {self.email} ({self.status})'
@@ -0,0 +1,133 @@
+import logging
+import os
+
+from django.conf import settings
+from django.contrib.auth.password_validation import CommonPasswordValidator
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+
+from .utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+SPECIAL_CHARACTERS = '@$!%*?&'
+
+DIGIT = 1
+LOWER = 2
+UPPER = 4
+SPECIAL = 8
+
+# Character class of every ASCII character, so the policy needs one lookup per character
+_ASCII_CLASSES = {}
+for _code in range(128):
+    _char = chr(_code)
+    if _char.isdigit():
+        _ASCII_CLASSES[_char] = DIGIT
+    elif _char.islower():
+        _ASCII_CLASSES[_char] = LOWER
+    elif _char.isupper():
+        _ASCII_CLASSES[_char] = UPPER
+    elif _char in SPECIAL_CHARACTERS:
+        _ASCII_CLASSES[_char] = SPECIAL
+
+
+def _character_class(char):
+    if char.isdigit():
+        return DIGIT
+    if char.islower():
+        return LOWER
+    if char.isupper():
+        return UPPER
+    return 0
+
+
+class BreachedPasswords:
+    """
+    Lookup of breached passwords backed by the Bloom filter file at
+    BREACHED_PASSWORDS_FILTER (see build_breached_password_filter).
+
+    The file is memory-mapped, so workers share one copy of it and each check is
+    a fixed number of bit probes. Without a filter file it falls back to
+    Django's common password list.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._filter = None
+        self._common = None
+
+    def __contains__(self, password):
+        password = password.lower().strip()
+        if self._filter is None and self._common is None:
+            self._load()
+        if self._filter is not None:
+            return password in self._filter
+        return password in self._common
+
+    def _load(self):
+        if self.path and os.path.exists(self.path):
+            self._filter = BloomFilter.load(self.path)
+        else:
+            if self.path:
+                logger.warning('Breached password filter %s not found, using the common password list.', self.path)
+            self._common = CommonPasswordValidator().passwords
+
+
+class PasswordPolicy:
+    """
+    Password rules shared by registration, password change and password reset.
+
+    Character classes are collected in a single pass over the password; the
+    first failing rule is reported, in the order the rules are listed in `messages`.
+    """
+
+    messages = {
+        'min_length': _("Password must be at least %(min_length)d characters long."),
+        DIGIT: _("Password must contain at least one digit."),
+        LOWER: _("Password must contain at least one lowercase letter."),
+        UPPER: _("Password must contain at least one uppercase letter."),
+        SPECIAL: _("Password must contain at least one special character (e.g. @$!%*?&)."),
+        'breached': _("This password has appeared in a data breach and can't be used."),
+    }
+
+    def __init__(self, min_length=8, breached_passwords=None):
+        self.min_length = min_length
+        self.breached_passwords = breached_passwords
+
+    def check(self, password):
+        """
+        Returns the message of the first rule ``password`` breaks, or None if it is acceptable.
+        """
+        if len(password) < self.min_length:
+            return self.messages['min_length'] % {'min_length': self.min_length}
+
+        found = 0
+        classes = _ASCII_CLASSES
+        for char in password:
+            char_class = classes.get(char)
+            found |= char_class if char_class is not None else _character_class(char)
+
+        for required in (DIGIT, LOWER, UPPER, SPECIAL):
+            if not found & required:
+                return self.messages[required]
+
+        if self.breached_passwords is not None and password in self.breached_passwords:
+            return self.messages['breached']
+        return None
+
+
+breached_passwords = BreachedPasswords(settings.BREACHED_PASSWORDS_FILTER)
+password_policy = PasswordPolicy(breached_passwords=breached_passwords)
+
+
+class BreachedPasswordValidator:
+    """
+    AUTH_PASSWORD_VALIDATORS entry rejecting passwords found in the breached password filter.
+    """
+
+    def validate(self, password, user=None):
+        if password in breached_passwords:
+            raise ValidationError(PasswordPolicy.messages['breached'], code='password_breached')
+
+    def get_help_text(self):
+        return _("Your password can't be a password that appeared in a data breach.")
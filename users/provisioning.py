@@ -0,0 +1,167 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from .hashing import init_process_worker
+from .models import User
+from .serializers import BulkUserSerializer
+from .utils.phone import format_phone_number
+
+# Columns that must be unique across the batch and the existing users
+UNIQUE_FIELDS = ('email', 'phone', 'username', 'passport_or_id', 'business_name')
+
+# Keeps `field__in` lookups well below the bound parameter limits of the database
+LOOKUP_CHUNK_SIZE = 1000
+
+
+def provision_users(rows, chunk_size=1000, workers=None, executor=None):
+    """
+    Validates and creates users in bulk.
+
+    Rows are validated without touching the database, checked for uniqueness
+    against each other and against existing users with one query per unique
+    column, hashed in a process pool and inserted with bulk_create in chunks.
+
+    Args:
+        rows: Iterable of dicts with the UserSerializer fields.
+        chunk_size: Number of users inserted per bulk_create.
+        workers: Size of the password hashing process pool (defaults to the CPU count).
+        executor: Existing executor to hash in instead of a new process pool;
+            web requests pass the shared pool of users.hashing.
+
+    Returns:
+        dict with the number of rows, the number of users created and a list of
+        per-row errors ({'row': <1-based row number>, 'errors': {...}}).
+    """
+    errors = []
+    valid = []
+    total = 0
+    for number, row in enumerate(rows, start=1):
+        total += 1
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'errors': {'non_field_errors': [
+                f'Invalid data. Expected a dictionary, but got {type(row).__name__}.'
+            ]}})
+            continue
+        serializer = BulkUserSerializer(data=normalize_row(row))
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            errors.append({'row': number, 'errors': serializer.errors})
+
+    valid = check_uniqueness(valid, errors)
+
+    passwords = [data.pop('password', None) for _, data in valid]
+    hashes = hash_passwords(passwords, workers, executor)
+
+    users = []
+    for (number, data), encoded in zip(valid, hashes):
+        user = BulkUserSerializer().build_user(data)
+        user.password = encoded
+        users.append((number, user))
+
+    created = 0
+    for start in range(0, len(users), chunk_size):
+        created += insert_chunk(users[start:start + chunk_size], errors)
+
+    errors.sort(key=lambda error: error['row'])
+    return {'total': total, 'created': created, 'errors': errors}
+
+
+def normalize_row(row):
+    """
+    Drops empty optional values and normalises the phone number to E.164.
+    """
+    row = {key: value for key, value in row.items() if value not in ('', None)}
+    phone = row.get('phone')
+    if isinstance(phone, str):
+        try:
+            row['phone'] = format_phone_number(phone)
+        except ValueError:
+            pass
+    row.setdefault('middle_name', '')
+    row.setdefault('business_name', None)
+    row.setdefault('license_status', None)
+    return row
+
+
+def check_uniqueness(valid, errors):
+    """
+    Returns the rows whose unique columns clash neither with an earlier row nor
+    with an existing user, recording an error for every other row.
+    """
+    taken = {field: existing_values(field, valid) for field in UNIQUE_FIELDS}
+
+    unique = []
+    for number, data in valid:
+        row_errors = {}
+        for field in UNIQUE_FIELDS:
+            value = data.get(field)
+            if value is None:
+                continue
+            if str(value) in taken[field]:
+                row_errors[field] = [f'user with this {field} already exists.']
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+            continue
+        for field in UNIQUE_FIELDS:
+            if data.get(field) is not None:
+                taken[field].add(str(data[field]))
+        unique.append((number, data))
+    return unique
+
+
+def existing_values(field, valid):
+    values = list({str(data[field]) for _, data in valid if data.get(field) is not None})
+    existing = set()
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        lookup = {f'{field}__in': values[start:start + LOOKUP_CHUNK_SIZE]}
+        existing.update(str(value) for value in User.objects.filter(**lookup).values_list(field, flat=True))
+    return existing
+
+
+def hash_passwords(passwords, workers=None, executor=None):
+    """
+    Hashes the passwords in `executor`, or else in a process pool of `workers`
+    processes started for the call; rows without one get an unusable password.
+    """
+    to_hash = [(index, password) for index, password in enumerate(passwords) if password]
+    hashes = [make_password(None) if not password else None for password in passwords]
+    if not to_hash:
+        return hashes
+
+    if executor is not None:
+        encoded = executor.map(make_password, [password for _, password in to_hash])
+    else:
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(to_hash) // (workers * 4))
+        with ProcessPoolExecutor(workers, initializer=init_process_worker) as pool:
+            encoded = list(pool.map(make_password, [password for _, password in to_hash], chunksize=chunksize))
+    for (index, _), value in zip(to_hash, encoded):
+        hashes[index] = value
+    return hashes
+
+
+def insert_chunk(chunk, errors):
+    """
+    Inserts one chunk of users with bulk_create. If a concurrent write makes the
+    chunk conflict, its rows are inserted one by one so only the clashing rows fail.
+    """
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create([user for _, user in chunk])
+        return len(chunk)
+    except IntegrityError:
+        pass
+
+    created = 0
+    for number, user in chunk:
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+            created += 1
+        except IntegrityError as exc:
+            errors.append({'row': number, 'errors': {'non_field_errors': [str(exc)]}})
+    return created
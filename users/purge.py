@@ -0,0 +1,137 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import User, UserPurge
+from .utils.claims import revoke_user_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def purge_steps(user_id):
+    """
+    Returns (label, queryset) pairs covering everything owned by the user,
+    ordered so that no step deletes rows still referenced by a later one.
+    """
+    from products.models import Address, Cart, CartItem, ImageUpload, Order, OrderItem, Product
+
+    return [
+        ('cart items', CartItem.objects.filter(Q(cart__client_id=user_id) | Q(product__seller_id=user_id))),
+        ('order items', OrderItem.objects.filter(Q(order__client_id=user_id) | Q(product__seller_id=user_id))),
+        ('orders', Order.objects.filter(client_id=user_id)),
+        ('carts', Cart.objects.filter(client_id=user_id)),
+        ('addresses', Address.objects.filter(client_id=user_id)),
+        ('image uploads', ImageUpload.objects.filter(Q(owner_id=user_id) | Q(product__seller_id=user_id))),
+        ('products', Product.objects.filter(seller_id=user_id)),
+    ]
+
+
+def schedule_user_purge(user):
+    """
+    Deactivates the user and revokes their tokens right away, then queues the
+    deletion of the user and their data.
+
+    Returns:
+        The UserPurge tracking the deletion; the one already queued or running
+        if the user was deleted before.
+    """
+    with transaction.atomic():
+        # Serializes concurrent deletions of the same user
+        User.objects.select_for_update().get(pk=user.pk)
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        revoke_user_tokens([user.pk])
+
+        purge = UserPurge.objects.filter(
+            user_id=user.pk, status__in=[UserPurge.Status.PENDING, UserPurge.Status.RUNNING],
+        ).order_by('pk').first()
+        if purge is not None:
+            return purge
+
+        purge = UserPurge.objects.create(user_id=user.pk, email=user.email)
+        if settings.USER_PURGE_IN_THREAD:
+            transaction.on_commit(lambda: start_purge_thread(purge.pk))
+    return purge
+
+
+def claimable_purges():
+    """
+    Purges waiting to run: the pending ones, and running ones that made no
+    progress for USER_PURGE_STALE_TIMEOUT seconds because their worker died.
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.USER_PURGE_STALE_TIMEOUT)
+    return UserPurge.objects.filter(
+        Q(status=UserPurge.Status.PENDING) | Q(status=UserPurge.Status.RUNNING, updated_at__lt=stale_before)
+    )
+
+
+def start_purge_thread(purge_id):
+    thread = threading.Thread(target=_purge_in_thread, args=(purge_id,), daemon=True, name=f'user-purge-{purge_id}')
+    thread.start()
+    return thread
+
+
+def _purge_in_thread(purge_id):
+    try:
+        run_purge(purge_id)
+    finally:
+        close_old_connections()
+        connection.close()
+
+
+def run_purge(purge_id, chunk_size=None):
+    """
+    Runs a pending or stale purge (see claimable_purges()). Rows are removed in chunks of `chunk_size` primary keys
+    with raw DELETE statements, so neither memory use nor lock time grows with the
+    amount of data the user owns, and progress is saved after every chunk. A
+    reclaimed purge carries on with whatever rows are left.
+
+    Returns:
+        False if the purge could not be claimed (e.g. another worker has it).
+    """
+    from products.changes import record_deletions
+    from products.models import Product
+
+    chunk_size = chunk_size or settings.USER_PURGE_CHUNK_SIZE
+
+    claimed = claimable_purges().filter(pk=purge_id).update(
+        status=UserPurge.Status.RUNNING, updated_at=timezone.now(),
+    )
+    if not claimed:
+        return False
+
+    purge = UserPurge.objects.get(pk=purge_id)
+    try:
+        for label, queryset in purge_steps(purge.user_id):
+            purge.current_step = label
+            purge.save(update_fields=['current_step', 'updated_at'])
+            while True:
+                ids = list(queryset.values_list('pk', flat=True)[:chunk_size])
+                if not ids:
+                    break
+                if queryset.model is Product:
+                    # Raw deletes skip post_delete, so write the sync's tombstones here
+                    record_deletions(ids, using=queryset.db)
+                deleted = queryset.model.objects.filter(pk__in=ids)._raw_delete(queryset.db)
+                purge.rows_deleted += deleted
+                purge.save(update_fields=['rows_deleted', 'updated_at'])
+
+        # Nothing references the user any more, so the regular delete stays cheap
+        purge.current_step = 'user'
+        purge.rows_deleted += User.objects.filter(pk=purge.user_id).delete()[0]
+        purge.status = UserPurge.Status.DONE
+        purge.current_step = ''
+        purge.finished_at = timezone.now()
+        purge.save()
+    except Exception as exc:
+        logger.exception('Purge of user %s failed', purge.user_id)
+        purge.status = UserPurge.Status.FAILED
+        purge.error = str(exc)
+        purge.finished_at = timezone.now()
+        purge.save()
+    return True
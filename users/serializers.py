@@ -1,17 +1,68 @@
-import phonenumbers
-
+from asgiref.sync import sync_to_async
 from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 from rest_framework_simplejwt.settings import api_settings
 
-from django.core.validators import validate_email
-from django.shortcuts import get_object_or_404
-from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+from .backends import aauthenticate
+from .hashing import acheck_password, aset_password
 from .models import User
+from .password_policy import password_policy
+from .utils.claims import build_claims, get_user_claims
+from .utils.phone import format_phone_number
+from .utils.revocation import is_token_revoked, revoke_token
+
+
+class AsyncValidationMixin:
+    """
+    Adds ais_valid(), an awaitable is_valid() for serializers whose validation
+    checks a password. The usual run_validation() (fields, validators) runs in
+    a worker thread, then `avalidate()` is awaited in place of `validate()`,
+    so the password hashing can go through the hashing pool.
+    """
+
+    _validating_async = False
+
+    async def avalidate(self, attrs):
+        return attrs
+
+    def run_validation(self, data=empty):
+        if not self._validating_async:
+            return super().run_validation(data)
+        # avalidate() takes over from validate() on the async path
+        self.validate = lambda attrs: attrs
+        try:
+            return super().run_validation(data)
+        finally:
+            del self.validate
+
+    async def ais_valid(self, raise_exception=False):
+        assert hasattr(self, 'initial_data'), (
+            'Cannot call `.ais_valid()` as no `data=` keyword argument was '
+            'passed when instantiating the serializer instance.'
+        )
+        if not hasattr(self, '_validated_data'):
+            self._validating_async = True
+            try:
+                attrs = await sync_to_async(self.run_validation)(self.initial_data)
+                self._validated_data = await self.avalidate(attrs)
+            except serializers.ValidationError as exc:
+                self._validated_data = {}
+                self._errors = serializers.as_serializer_error(exc)
+            else:
+                self._errors = {}
+            finally:
+                self._validating_async = False
+
+        if self._errors and raise_exception:
+            raise serializers.ValidationError(self.errors)
+        return not bool(self._errors)
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for user data"""
@@ -38,9 +89,14 @@ class UserSerializer(serializers.ModelSerializer):
             'is_verified': {'read_only': True},
         }
 
-    def create(self, validated_data):
-        password = validated_data.pop('password', None)
-        user = User(
+    def validate_password(self, value):
+        error = password_policy.check(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+    def build_user(self, validated_data):
+        return User(
             email=validated_data['email'],
             phone=validated_data['phone'],
             first_name=validated_data['first_name'],
@@ -53,11 +109,27 @@ class UserSerializer(serializers.ModelSerializer):
             role=validated_data['role'],
         )
 
+    def create(self, validated_data):
+        password = validated_data.pop('password', None)
+        user = self.build_user(validated_data)
+
         if password:
             user.set_password(password)
         user.save()
         return user
 
+    async def acreate(self, validated_data):
+        """
+        Async create(); the password is hashed in the hashing pool.
+        """
+        password = validated_data.pop('password', None)
+        user = self.build_user(validated_data)
+
+        if password:
+            await aset_password(user, password)
+        await user.asave()
+        return user
+
     def update(self, instance, validated_data):
         password = validated_data.pop('password', None)
         
@@ -79,6 +151,25 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
    
 
+class BulkUserSerializer(UserSerializer):
+    """
+    UserSerializer for bulk provisioning (users.provisioning).
+
+    Drops the per-row unique validators; uniqueness is checked for the whole
+    batch with one query per column instead.
+    """
+
+    class Meta(UserSerializer.Meta):
+        extra_kwargs = {
+            **UserSerializer.Meta.extra_kwargs,
+            'email': {'validators': []},
+            'phone': {'validators': []},
+            'username': {'validators': []},
+            'passport_or_id': {'validators': []},
+            'business_name': {'validators': []},
+        }
+
+
 class CustomTokenRefreshSerializer(TokenRefreshSerializer):
     """
     Custom jwt auth token
@@ -86,40 +177,33 @@ class CustomTokenRefreshSerializer(TokenRefreshSerializer):
     def validate(self, attrs):
         refresh = RefreshToken(attrs['refresh'])
 
+        if is_token_revoked(refresh):
+            raise serializers.ValidationError('Token has been revoked.')
+
         # Check token rotation and blacklisting
         if api_settings.ROTATE_REFRESH_TOKENS:
             if api_settings.BLACKLIST_AFTER_ROTATION:
-                try:
-                    refresh.blacklist()
-                except AttributeError:
-                    pass
+                revoke_token(refresh)
 
             refresh.set_jti()
             refresh.set_exp()
             refresh.set_iat()
 
         data = {'refresh': str(refresh)}
-        
-        user_id = refresh.get('user_id')
 
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
 
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
+        # Served from the claims cache, so a refresh normally doesn't touch the users table
+        claims = get_user_claims(user_id)
+        if claims is None:
             raise serializers.ValidationError('User not found.')
+        if refresh.get('claims_version', 0) != claims['claims_version']:
+            raise serializers.ValidationError('Token has been revoked.')
 
-        access_token = AccessToken.for_user(user)
-
-        access_token['phone'] = str(user.phone)
-        access_token['email'] = str(user.email)
-        access_token['business_name'] = str(user.business_name)
-        access_token['first_name'] = str(user.first_name)
-        access_token['middle_name'] = str(user.middle_name) if user.middle_name else ''
-        access_token['last_name'] = str(user.last_name)
-        access_token['username'] = str(user.username)
-        access_token['license_status'] = str(user.license_status)
-        access_token['role'] = user.role
-        access_token['is_verified'] = user.is_verified
+        access_token = AccessToken()
+        access_token[api_settings.USER_ID_CLAIM] = user_id
+        for claim, value in claims.items():
+            access_token[claim] = value
         
         data['access'] = str(access_token)
 
@@ -127,84 +211,41 @@ class CustomTokenRefreshSerializer(TokenRefreshSerializer):
 
      
 # Custom token obtain pair serializer
-class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+class MyTokenObtainPairSerializer(AsyncValidationMixin, TokenObtainPairSerializer):
+    """
+    Issues the token pair for an email address or phone number.
+
+    The `email` field accepts either; users.backends.EmailOrPhoneBackend resolves it
+    to a user in a single query and failures share the same error response.
+    """
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
 
         # Add custom claims
-        token['phone'] = str(user.phone)
-        token['email'] = str(user.email)
-        token['business_name'] = str(user.business_name)
-        token['first_name'] = str(user.first_name)
-        token['middle_name'] = str(user.middle_name) if user.middle_name else ''
-        token['last_name'] = str(user.last_name)
-        token['username'] = str(user.username)
-        token['license_status'] = str(user.license_status)
-        token['role'] = str(user.role)
-        token['is_verified'] = user.is_verified
+        for claim, value in build_claims(user).items():
+            token[claim] = value
 
         return token
 
     @staticmethod
     def validate_and_format_phone(phone_number):
-        # Remove any non-numeric characters from the phone number
-        phone_number = ''.join(filter(str.isdigit, phone_number))
-
-        # If the phone number starts with '254', remove it
-        if phone_number.startswith('254'):
-            phone_number = phone_number[3:]
-
-        # If the phone number starts with '0', remove the leading zero
-        if phone_number.startswith('0'):
-            phone_number = '+254' + phone_number[1:]
-        # If the phone number starts with '7', prepend '+254'
-        elif phone_number.startswith('7'):
-            phone_number = '+254' + phone_number
-        # If the phone number starts with '254', prepend '+'
-        elif phone_number.startswith('254'):
-            phone_number = '+' + phone_number
-        else:
-            raise ValueError('Invalid phone number format')
-
-        # Attempt to parse the phone number
-        parsed_phone = phonenumbers.parse(phone_number, None)
+        return format_phone_number(phone_number)
 
-        # Check if the parsed phone number is valid
-        if not phonenumbers.is_valid_number(parsed_phone):
-            raise ValueError('Invalid phone number')
-
-        # Format the phone number in E.164 format
-        formatted_phone_number = phonenumbers.format_number(parsed_phone, phonenumbers.PhoneNumberFormat.E164)
-
-        return formatted_phone_number
-
-    def validate(self, attrs):
-        email_or_phone = attrs.get('email')
-        password = attrs.get('password')
-
-        # Check if email_or_phone is a valid email address
-        try:
-            validate_email(email_or_phone)
-            # If it's a valid email address, use it as the credential
-            credentials = {'email': email_or_phone, 'password': password}
-        except ValidationError:
-            # If it's not a valid email address, assume it's a phone number
-            # and filter the email using the phone number
-            try:
-                # Attempt to parse and validate the phone number
-                valid_phone_number = self.validate_and_format_phone(email_or_phone)
-
-                # Retrieve the user by the formatted phone number
-                user = get_object_or_404(User, phone=valid_phone_number)
-                credentials = {'email': user.email, 'password': password}
-            except (phonenumbers.phonenumberutil.NumberParseException, User.DoesNotExist):
-                raise serializers.ValidationError('Invalid credentials')
+    async def avalidate(self, attrs):
+        user = await aauthenticate(
+            self.context.get('request'),
+            **{self.username_field: attrs[self.username_field], 'password': attrs['password']},
+        )
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
 
-        return super().validate(credentials)
+        self.user = user
+        refresh = self.get_token(user)
+        return {'refresh': str(refresh), 'access': str(refresh.access_token)}
     
 
-class ChangePasswordSerializer(serializers.Serializer):
+class ChangePasswordSerializer(AsyncValidationMixin, serializers.Serializer):
     """
     Handles changing password for authenticated users
     """
@@ -218,44 +259,33 @@ class ChangePasswordSerializer(serializers.Serializer):
         Validate that the current password is correct and the new password match.
         """
         user = self.context['request'].user
-        current_password = attrs.get('current_password')
-        new_password = attrs.get('new_password')
-        confirm_new_password = attrs.get('confirm_new_password')
 
-        if not user.check_password(current_password):
+        if not user.check_password(attrs.get('current_password')):
             raise serializers.ValidationError({"current_password": _("Current password is incorrect.")})
 
+        return self.check_new_passwords(attrs)
+
+    async def avalidate(self, attrs):
+        user = self.context['request'].user
+
+        if not await acheck_password(user, attrs.get('current_password')):
+            raise serializers.ValidationError({"current_password": _("Current password is incorrect.")})
+
+        return self.check_new_passwords(attrs)
+
+    def check_new_passwords(self, attrs):
+        """
+        Validate that the new passwords match and meet the password policy.
+        """
+        new_password = attrs.get('new_password')
+        confirm_new_password = attrs.get('confirm_new_password')
+
         if new_password != confirm_new_password:
             raise serializers.ValidationError({"new_password": _("New passwords do not match.")})
 
-        has_digit = False
-        has_lower = False
-        has_upper = False
-        has_special = False
-
-        for char in new_password:
-            if has_digit and has_lower and has_upper and has_special:
-                break
-            if char.isdigit():
-                has_digit = True
-            elif char.islower():
-                has_lower = True
-            elif char.isupper():
-                has_upper = True
-            elif char in '@$!%*?&':
-                has_special = True
-
-        if not has_digit:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one digit.")})
-        if not has_lower:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one lowercase letter.")})
-        if not has_upper:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one uppercase letter.")})
-        if not has_special:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one special character (e.g. @$!%*?&).")})
-
-        if new_password == new_password.lower() or new_password ==new_password.upper():
-            raise serializers.ValidationError({"new_password": _("Password must contain both uppercase and lowercase letters.")})
+        error = password_policy.check(new_password)
+        if error:
+            raise serializers.ValidationError({"new_password": error})
 
         return attrs
 
@@ -265,58 +295,15 @@ class ChangePasswordSerializer(serializers.Serializer):
         """
 
         user = self.context['request'].user
-        user.set_password(self.validate_data['new_password'])
+        user.set_password(self.validated_data['new_password'])
         user.save()
-        
-            
-class PasswordResetSerializer(serializers.Serializer):
-    """
-    Hand;es password reset at the login level
-    """
-    new_password = serializers.CharField(required=True, min_length=8)
-    confirm_password = serializers.CharField(required=True, min_length=8)
-
-    def validate(self, attrs):
-        """
-        Validate the new passwords ensuring they actually meet the rerequirements
-        """
-        new_password = attrs.get('new_password')
-        confirm_password = attrs.get('confirm_password')
 
-        if new_password != confirm_password:
-            raise serializers.ValidationError({"new_password": _("New Passwords do not match")})
-
-        has_digit  = False
-        has_lower = False
-        has_upper = False
-        has_special = False
-
-        for char in new_password:
-            if has_digit  and has_lower and has_upper and has_special:
-                break
-            if char.isdigit():
-                has_digit = True
-            elif char.islower():
-                has_lower = True
-            elif char.isupper():
-                has_upper = True
-            elif char in '@$!%*?&':
-                has_special = True
-
-        if not has_digit:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one digit.")})
-        if not has_lower:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one lowercase letter.")})
-        if not has_upper:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one uppercase letter.")})
-        if not has_special:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one special character (e.g. @$!%*?&).")})
-
-        if new_password == new_password.lower() or new_password == new_password.upper():
-            raise serializers.ValidationError({"new_password": _("Password must contain both uppercase and lowercase letters.")})
-
-        return attrs
+    async def asave(self):
+        user = self.context['request'].user
+        await aset_password(user, self.validated_data['new_password'])
+        await user.asave()
         
+            
 class PasswordResetSerializer(serializers.Serializer):
     """
     Hand;es password reset at the login level
@@ -334,33 +321,8 @@ class PasswordResetSerializer(serializers.Serializer):
         if new_password != confirm_password:
             raise serializers.ValidationError({"new_password": _("New Passwords do not match")})
 
-        has_digit  = False
-        has_lower = False
-        has_upper = False
-        has_special = False
-
-        for char in new_password:
-            if has_digit  and has_lower and has_upper and has_special:
-                break
-            if char.isdigit():
-                has_digit = True
-            elif char.islower():
-                has_lower = True
-            elif char.isupper():
-                has_upper = True
-            elif char in '@$!%*?&':
-                has_special = True
-
-        if not has_digit:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one digit.")})
-        if not has_lower:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one lowercase letter.")})
-        if not has_upper:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one uppercase letter.")})
-        if not has_special:
-            raise serializers.ValidationError({"new_password": _("Password must contain at least one special character (e.g. @$!%*?&).")})
-
-        if new_password == new_password.lower() or new_password == new_password.upper():
-            raise serializers.ValidationError({"new_password": _("Password must contain both uppercase and lowercase letters.")})
+        error = password_policy.check(new_password)
+        if error:
+            raise serializers.ValidationError({"new_password": error})
 
         return attrs
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+from .utils.claims import invalidate_user_claims
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_claims(sender, instance, **kwargs):
+    """
+    Drop the cached token claims of a user whenever the user changes.
+    """
+    invalidate_user_claims(instance.pk)
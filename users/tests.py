@@ -1,3 +1,303 @@
-from django.test import TestCase
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import RevokedToken, User, UserPurge
+from .purge import run_purge, schedule_user_purge
+from .serializers import AsyncValidationMixin
+from .throttling import IPRateThrottle
+from .utils.revocation import RevocationStore
+
+PASSWORD = 'Test-Pass-1!'
+
+
+def make_user(username, index, **extra_fields):
+    return User.objects.create_user(
+        email=f'{username}@example.com', phone=f'+2547{index:08d}', password=PASSWORD,
+        username=username, passport_or_id=username, first_name='Test', last_name=username.title(),
+        role=User.Roles.CLIENT, **extra_fields,
+    )
+
+
+class AuthTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('client', 1)
+
+    def login(self, user=None):
+        user = user or self.user
+        response = self.client.post(
+            '/api/v1/login/', {'email': user.email, 'password': PASSWORD}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def refresh(self, refresh):
+        return self.client.post('/api/v1/token/refresh/', {'refresh': refresh}, content_type='application/json')
+
+    def get_products(self, access):
+        return self.client.get('/api/v1/products/', headers={'Authorization': f'Bearer {access}'})
+
+
+class ClaimsJWTAuthenticationTests(AuthTestCase):
+    def test_token_is_accepted(self):
+        self.assertEqual(self.get_products(self.login()['access']).status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        access = self.login()['access']
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.get_products(access).status_code, 401)
+
+    @override_settings(CLAIMS_VERSION_CACHE_TTL=0)
+    def test_user_deactivated_with_update_is_rejected(self):
+        access = self.login()['access']
+        self.assertEqual(self.get_products(access).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get_products(access).status_code, 401)
+
+
+@override_settings(USER_CLAIMS_CACHE_TIMEOUT=300)
+class ClaimsCacheTests(AuthTestCase):
+    def test_refresh_sees_bulk_updates(self):
+        tokens = self.refresh(self.login()['refresh']).json()
+        self.assertEqual(AccessToken(tokens['access'])['first_name'], 'Test')
+        User.objects.filter(pk=self.user.pk).update(first_name='Renamed')
+        tokens = self.refresh(tokens['refresh']).json()
+        self.assertEqual(AccessToken(tokens['access'])['first_name'], 'Renamed')
+
+    @override_settings(TOKEN_REVOCATION_SYNC_INTERVAL=3600)
+    def test_warm_refresh_does_not_query_the_users_table(self):
+        refresh = self.refresh(self.login()['refresh']).json()['refresh']
+        # simplejwt rebinds its settings object on changes, so patch the one in use
+        with mock.patch.object(jwt_settings, 'BLACKLIST_AFTER_ROTATION', False), self.assertNumQueries(0):
+            response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200)
+
+        # With blacklisting, only the revocation of the used token is written
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.refresh(response.json()['refresh']).status_code, 200)
+        self.assertEqual([query['sql'] for query in queries if 'users_user"' in query['sql']], [])
+        self.assertTrue(any('users_revokedtoken' in query['sql'] for query in queries))
+
+    def test_refresh_fails_after_bulk_deactivation(self):
+        refresh = self.login()['refresh']
+        self.assertEqual(self.refresh(refresh).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.refresh(refresh).status_code, 400)
+
+
+class RevocationTests(AuthTestCase):
+    def test_revoke(self):
+        store = RevocationStore()
+        store.revoke('revoked-jti', timezone.now() + timedelta(hours=1))
+        self.assertTrue(store.is_revoked('revoked-jti'))
+        self.assertFalse(store.is_revoked('other-jti'))
+
+    def test_logout_revokes_both_tokens(self):
+        tokens = self.login()
+        response = self.client.post(
+            '/api/v1/logout/', {'refresh_token': tokens['refresh']}, content_type='application/json',
+            headers={'Authorization': f'Bearer {tokens["access"]}'},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get_products(tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 400)
+
+    def test_rotated_refresh_token_is_revoked(self):
+        refresh = self.login()['refresh']
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(refresh).status_code, 400)
+        self.assertEqual(self.refresh(response.json()['refresh']).status_code, 200)
+
+    @override_settings(TOKEN_REVOCATION_CAPACITY=10, TOKEN_REVOCATION_SYNC_INTERVAL=0)
+    def test_sync_does_not_rebuild_when_live_tokens_exceed_the_setting(self):
+        expires_at = timezone.now() + timedelta(hours=1)
+        RevokedToken.objects.bulk_create([RevokedToken(jti=f'jti-{i}', expires_at=expires_at) for i in range(15)])
+        store = RevocationStore()
+        store.sync(force_rebuild=True)
+        with mock.patch.object(store, '_rebuild', wraps=store._rebuild) as rebuild:
+            for _ in range(3):
+                store.sync()
+            self.assertFalse(rebuild.called)
+        self.assertTrue(store.is_revoked('jti-14'))
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+class ThrottleTests(AuthTestCase):
+    @throttle_rates(**{'login.ip': '3/min'})
+    def test_forwarded_for_does_not_bypass_the_ip_throttle(self):
+        statuses = [
+            self.client.post(
+                '/api/v1/login/', {'email': self.user.email, 'password': 'wrong'}, content_type='application/json',
+                headers={'X-Forwarded-For': f'10.0.0.{i}'},
+            ).status_code
+            for i in range(5)
+        ]
+        self.assertEqual(statuses, [401, 401, 401, 429, 429])
+
+    def test_rejected_requests_are_not_counted(self):
+        view = mock.Mock(throttle_scope='login')
+        request = APIRequestFactory().post('/api/v1/login/')
+        with throttle_rates(**{'login.ip': '2/min'}):
+            results = [IPRateThrottle().allow_request(request, view) for _ in range(6)]
+        self.assertEqual(results, [True, True, False, False, False, False])
+        # Only the two accepted requests count towards a higher limit
+        with throttle_rates(**{'login.ip': '3/min'}):
+            self.assertTrue(IPRateThrottle().allow_request(request, view))
+
+    @throttle_rates(**{'login.ip': '5/min'})
+    def test_concurrent_burst_is_limited(self):
+        view = mock.Mock(throttle_scope='login')
+        request = APIRequestFactory().post('/api/v1/login/')
+        cache_class = type(IPRateThrottle().cache)
+        get = cache_class.get
+        barrier = threading.Barrier(20)
+
+        def slow_get(cache, *args, **kwargs):
+            # A round trip to a networked cache
+            time.sleep(0.01)
+            return get(cache, *args, **kwargs)
+
+        def attempt():
+            barrier.wait()
+            return IPRateThrottle().allow_request(request, view)
+
+        with mock.patch.object(cache_class, 'get', slow_get), ThreadPoolExecutor(20) as pool:
+            results = list(pool.map(lambda _: attempt(), range(20)))
+        self.assertEqual(results.count(True), 5)
+
+    @throttle_rates(**{'login.ip': '3/min'})
+    def test_token_endpoint_shares_the_login_throttle(self):
+        statuses = [
+            self.client.post(
+                url, {'email': self.user.email, 'password': 'wrong'}, content_type='application/json',
+            ).status_code
+            for url in ['/api/v1/login/', '/api/v1/token/'] * 3
+        ]
+        self.assertEqual(statuses, [401, 401, 401, 429, 429, 429])
+
+
+class BulkProvisionTests(AuthTestCase):
+    def test_rows_that_are_not_objects_are_rejected(self):
+        access = self.login(make_user('admin', 2, is_admin=True))['access']
+        rows = [
+            {'email': 'seller@example.com', 'phone': '+254700000003', 'username': 'seller', 'passport_or_id': 'seller',
+             'first_name': 'Test', 'last_name': 'Seller', 'role': User.Roles.CLIENT, 'password': PASSWORD},
+            'seller2@example.com',
+            None,
+        ]
+        with mock.patch('users.provisioning.ProcessPoolExecutor') as process_pool:
+            response = self.client.post(
+                '/api/v1/register/bulk/', rows, content_type='application/json',
+                headers={'Authorization': f'Bearer {access}'},
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        report = response.json()
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3])
+        self.assertFalse(process_pool.called)
+        self.assertTrue(User.objects.get(username='seller').check_password(PASSWORD))
+
+
+@override_settings(USER_PURGE_IN_THREAD=False, USER_PURGE_STALE_TIMEOUT=600)
+class PurgeTests(AuthTestCase):
+    def test_deleting_twice_reuses_the_queued_purge(self):
+        purge = schedule_user_purge(self.user)
+        self.assertEqual(schedule_user_purge(self.user), purge)
+        self.assertEqual(UserPurge.objects.filter(user_id=self.user.pk).count(), 1)
+
+    def test_stale_running_purge_is_reclaimed(self):
+        purge = schedule_user_purge(self.user)
+        UserPurge.objects.filter(pk=purge.pk).update(status=UserPurge.Status.RUNNING)
+        self.assertFalse(run_purge(purge.pk))
+
+        UserPurge.objects.filter(pk=purge.pk).update(updated_at=timezone.now() - timedelta(seconds=601))
+        self.assertTrue(run_purge(purge.pk))
+        purge.refresh_from_db()
+        self.assertEqual(purge.status, UserPurge.Status.DONE)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+
+
+def ordered(attrs):
+    if attrs['low'] > attrs['high']:
+        raise serializers.ValidationError('low must not exceed high.')
+
+
+class RangeSerializer(AsyncValidationMixin, serializers.Serializer):
+    low = serializers.IntegerField()
+    high = serializers.IntegerField()
+
+    class Meta:
+        validators = [ordered]
+
+    def validate(self, attrs):
+        raise AssertionError('validate() runs on the sync path only')
+
+
+class AsyncValidationTests(AuthTestCase):
+    def test_ais_valid_runs_the_serializer_validators(self):
+        serializer = RangeSerializer(data={'low': 2, 'high': 1})
+        self.assertFalse(async_to_sync(serializer.ais_valid)())
+        self.assertIn('non_field_errors', serializer.errors)
+
+        serializer = RangeSerializer(data={'low': 1, 'high': 2})
+        self.assertTrue(async_to_sync(serializer.ais_valid)())
+        self.assertEqual(serializer.validated_data, {'low': 1, 'high': 2})
+
+    def test_ais_valid_rejects_missing_data(self):
+        serializer = RangeSerializer(data=None)
+        self.assertFalse(async_to_sync(serializer.ais_valid)())
+        self.assertIn('non_field_errors', serializer.errors)
+
+    def change_password(self, access, data):
+        return self.client.post(
+            '/api/v1/password-reset-auth-user/', data, content_type='application/json',
+            headers={'Authorization': f'Bearer {access}'},
+        )
+
+    def test_login_requires_both_fields(self):
+        response = self.client.post('/api/v1/login/', {'email': self.user.email}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json())
+
+    def test_login_rejects_wrong_password(self):
+        response = self.client.post(
+            '/api/v1/login/', {'email': self.user.email, 'password': 'wrong'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_change_password(self):
+        access = self.login()['access']
+        new_password = 'New-Pass-2!x'
+        response = self.change_password(access, {'current_password': 'wrong', 'new_password': new_password, 'confirm_new_password': new_password})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('current_password', response.json())
+
+        response = self.change_password(access, {'current_password': PASSWORD, 'new_password': 'short'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'new_password', 'confirm_new_password'})
+
+        response = self.change_password(access, {'current_password': PASSWORD, 'new_password': new_password, 'confirm_new_password': new_password})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(new_password))
@@ -0,0 +1,138 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .utils.phone import format_phone_number
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Sliding-window rate limit kept in the shared THROTTLE_CACHE.
+
+    Requests are counted in fixed windows with atomic cache increments; the
+    previous window's count is weighted by how much of it still overlaps the
+    sliding window. The limit is looked up under '<view.throttle_scope>.<kind>'
+    in DEFAULT_THROTTLE_RATES (e.g. 'login.ip': '20/min'), so every view
+    configures its own limits and a missing entry disables that throttle.
+    """
+
+    kind = None
+
+    def __init__(self):
+        self.cache = caches[settings.THROTTLE_CACHE]
+        self.wait_seconds = None
+
+    def get_ident_key(self, request, view):
+        """
+        Returns the value requests are counted by, or None to skip throttling.
+        """
+        raise NotImplementedError('.get_ident_key() must be overridden')
+
+    def get_rate(self, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return None
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}.{self.kind}')
+        if rate is None:
+            return None
+        num, period = rate.split('/')
+        return int(num), PERIODS[period[0]]
+
+    def allow_request(self, request, view):
+        rate = self.get_rate(view)
+        if rate is None:
+            return True
+        ident = self.get_ident_key(request, view)
+        if not ident:
+            return True
+
+        num_requests, period = rate
+        now = time.time()
+        window = int(now // period)
+        elapsed = now - window * period
+
+        digest = hashlib.md5(ident.encode()).hexdigest()
+        key = f'throttle:{view.throttle_scope}:{self.kind}:{digest}'
+        current_key = f'{key}:{window}'
+        previous_key = f'{key}:{window - 1}'
+
+        # Count first and decide on the count the increment returns, so that a
+        # burst of concurrent requests can't all pass on the same reading.
+        # add() is a no-op when the key exists, so the increment stays atomic.
+        self.cache.add(current_key, 0, period * 2)
+        try:
+            count = self.cache.incr(current_key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(current_key, 1, period * 2)
+            count = 1
+        estimate = self.cache.get(previous_key, 0) * (period - elapsed) / period + count
+        if estimate > num_requests:
+            # Rejected requests aren't counted, so a client that keeps retrying
+            # isn't locked out for longer than the window
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            self.wait_seconds = period - elapsed
+            return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    """
+    Limits requests per client IP address: REMOTE_ADDR, or the address the
+    NUM_PROXIES trusted proxies in front of the app put in X-Forwarded-For.
+    """
+    kind = 'ip'
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class AccountRateThrottle(SlidingWindowThrottle):
+    """
+    Limits requests per account, identified by the email address in the request body.
+    """
+    kind = 'account'
+
+    def get_ident_key(self, request, view):
+        email = request_field(request, 'email')
+        if isinstance(email, str) and '@' in email:
+            return email.strip().lower()
+        return None
+
+
+class PhoneRateThrottle(SlidingWindowThrottle):
+    """
+    Limits requests per phone number, taken from the `phone` field or from a
+    login identifier that is not an email address.
+    """
+    kind = 'phone'
+
+    def get_ident_key(self, request, view):
+        phone = request_field(request, 'phone') or request_field(request, 'email')
+        if not isinstance(phone, str) or '@' in phone:
+            return None
+        try:
+            return format_phone_number(phone)
+        except ValueError:
+            return ''.join(filter(str.isdigit, phone)) or None
+
+
+def request_field(request, name):
+    data = request.data
+    return data.get(name) if hasattr(data, 'get') else None
+
+
+AUTH_THROTTLE_CLASSES = [IPRateThrottle, AccountRateThrottle, PhoneRateThrottle]
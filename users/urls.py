@@ -1,5 +1,4 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView
 from .views import (
     MyTokenObtainPairView,
     CustomTokenRefreshView,
@@ -8,17 +7,22 @@ from .views import (
     PasswordResetConfirm,
     ChangePassword,
     UserLogout,
-    DeleteUser
+    DeleteUser,
+    DeleteUserStatus,
+    UserBulkProvision,
 )
 
 urlpatterns = [
-path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+# Same view as login/, so its throttles can't be sidestepped
+path('token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
 path('token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
 path('register/', UserRegistration.as_view(), name='user_register'),
+path('register/bulk/', UserBulkProvision.as_view(), name='user_bulk_provision'),
 path('login/', MyTokenObtainPairView.as_view(), name='user_login'),
 path('password-reset/', PasswordReset.as_view(), name='password_reset'),
 path('password-reset-confirm/<int:uid>/<str:token>/', PasswordResetConfirm.as_view(), name='password_reset_confirm'),
 path('password-reset-auth-user/', ChangePassword.as_view(), name='password_reset_auth_user'),
 path('logout/', UserLogout.as_view(), name='user_logout'),
 path('delete-user/<str:email>/', DeleteUser.as_view(), name='delete-user'),
+path('delete-user-status/<int:purge_id>/', DeleteUserStatus.as_view(), name='delete-user-status'),
 ]
\ No newline at end of file
@@ -0,0 +1,81 @@
+import hashlib
+import math
+import mmap
+import struct
+
+# File layout: magic, number of bits, number of hashes, number of keys, then the bit array
+FILE_MAGIC = b'BLM1'
+FILE_HEADER = struct.Struct('<4sQIQ')
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over string keys.
+
+    Membership tests never give false negatives; false positives happen at
+    roughly the error rate the filter was sized for. The bit array can be any
+    buffer supporting item access (a bytearray, or an mmap for a filter shared
+    between processes).
+    """
+
+    def __init__(self, num_bits, num_hashes, bits=None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate):
+        """
+        Returns an empty filter sized to hold ``capacity`` keys at ``error_rate``.
+        """
+        capacity = max(capacity, 1)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, key):
+        # Double hashing (Kirsch-Mitzenmacher): k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def save(self, path):
+        """
+        Writes the filter to ``path`` in the format read by load().
+        """
+        with open(path, 'wb') as f:
+            f.write(FILE_HEADER.pack(FILE_MAGIC, self.num_bits, self.num_hashes, self.count))
+            f.write(self.bits)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-maps a filter written by save(), read-only.
+
+        The pages are shared by every process that maps the same file, so the
+        filter costs no per-worker memory however large it is.
+        """
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, num_bits, num_hashes, count = FILE_HEADER.unpack_from(mapped)
+        if magic != FILE_MAGIC:
+            raise ValueError(f'{path} is not a Bloom filter file')
+        bloom = cls(num_bits, num_hashes, memoryview(mapped)[FILE_HEADER.size:])
+        bloom.count = count
+        return bloom
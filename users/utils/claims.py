@@ -0,0 +1,116 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from users.models import User
+
+# user_id -> (claims_version, expires_at); per process, refreshed every CLAIMS_VERSION_CACHE_TTL seconds
+_claims_versions = {}
+_MAX_CACHED_VERSIONS = 100_000
+
+# User fields the claims depend on (build_claims, and only active users get claims)
+CLAIM_FIELDS = frozenset({
+    'phone', 'email', 'business_name', 'first_name', 'middle_name', 'last_name', 'username',
+    'license_status', 'role', 'is_verified', 'claims_version', 'is_active',
+})
+
+
+def get_claims_version(user_id):
+    """
+    Returns the current claims version of a user, or None if the user does not
+    exist or is inactive, so deactivated users lose access like deleted ones.
+
+    The value is cached in-process for CLAIMS_VERSION_CACHE_TTL seconds, so an
+    authenticated request only reaches the database once per user per TTL.
+    Saving a user drops it right away (see users.signals); deactivations made
+    with QuerySet.update() take effect within the TTL.
+    """
+    now = time.monotonic()
+    cached = _claims_versions.get(user_id)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    version = (
+        User.objects.filter(pk=user_id, is_active=True)
+        .values_list('claims_version', flat=True)
+        .first()
+    )
+    if version is None:
+        _claims_versions.pop(user_id, None)
+        return None
+
+    if len(_claims_versions) >= _MAX_CACHED_VERSIONS:
+        _claims_versions.clear()
+    _claims_versions[user_id] = (version, now + settings.CLAIMS_VERSION_CACHE_TTL)
+    return version
+
+
+def revoke_user_tokens(user_ids):
+    """
+    Invalidates every token issued to the given users by bumping their claims version.
+
+    Other workers pick the change up once their cached version expires.
+    """
+    # UserQuerySet.update() drops the cached claims and versions
+    User.objects.filter(pk__in=list(user_ids)).update(claims_version=F('claims_version') + 1)
+
+
+def build_claims(user):
+    """
+    Returns the custom claims carried by the tokens issued to ``user``.
+    """
+    return {
+        'phone': str(user.phone),
+        'email': str(user.email),
+        'business_name': str(user.business_name),
+        'first_name': str(user.first_name),
+        'middle_name': str(user.middle_name) if user.middle_name else '',
+        'last_name': str(user.last_name),
+        'username': str(user.username),
+        'license_status': str(user.license_status),
+        'role': str(user.role),
+        'is_verified': user.is_verified,
+        'claims_version': user.claims_version,
+    }
+
+
+def get_user_claims(user_id):
+    """
+    Returns the custom claims of an active user, or None if there is no such user.
+
+    The claims are cached for USER_CLAIMS_CACHE_TIMEOUT seconds and dropped
+    whenever the user is saved or deleted (see users.signals) or updated in
+    bulk (see UserQuerySet.update). A timeout of 0 disables the cache, which
+    is the default without a cache shared by all workers.
+    """
+    key = _claims_cache_key(user_id)
+    if settings.USER_CLAIMS_CACHE_TIMEOUT:
+        claims = cache.get(key)
+        if claims is not None:
+            return claims
+
+    try:
+        user = User.objects.get(pk=user_id, is_active=True)
+    except User.DoesNotExist:
+        return None
+
+    claims = build_claims(user)
+    if settings.USER_CLAIMS_CACHE_TIMEOUT:
+        cache.set(key, claims, settings.USER_CLAIMS_CACHE_TIMEOUT)
+    return claims
+
+
+def invalidate_user_claims(user_id):
+    invalidate_users_claims([user_id])
+
+
+def invalidate_users_claims(user_ids):
+    for user_id in user_ids:
+        _claims_versions.pop(user_id, None)
+    cache.delete_many([_claims_cache_key(user_id) for user_id in user_ids])
+
+
+def _claims_cache_key(user_id):
+    return f'user-claims:{user_id}'
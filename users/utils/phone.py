@@ -0,0 +1,56 @@
+from functools import lru_cache
+
+import phonenumbers
+
+# Upper bound on the number of distinct phone numbers kept in the
+# normalisation cache. Each entry is a pair of short strings.
+PHONE_CACHE_SIZE = 4096
+
+
+def format_phone_number(phone_number):
+    """
+    Normalise a Kenyan phone number to E.164 (e.g. 0712345678 -> +254712345678).
+
+    Results are memoised on the digits of the input, so repeated logins from
+    the same number skip the full ``phonenumbers.parse`` round.
+
+    Raises:
+        ValueError: If the number is not a valid phone number.
+    """
+    formatted = _format_digits(''.join(filter(str.isdigit, phone_number)))
+    if formatted is None:
+        raise ValueError('Invalid phone number')
+    return formatted
+
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def _format_digits(phone_number):
+    """
+    Returns the E.164 form of a digits-only phone number, or None when it is invalid.
+    Invalid numbers are cached as well so junk input can't bypass the cache.
+    """
+    # If the phone number starts with '254', remove it
+    if phone_number.startswith('254'):
+        phone_number = phone_number[3:]
+
+    # If the phone number starts with '0', remove the leading zero
+    if phone_number.startswith('0'):
+        phone_number = '+254' + phone_number[1:]
+    # If the phone number starts with '7', prepend '+254'
+    elif phone_number.startswith('7'):
+        phone_number = '+254' + phone_number
+    # If the phone number starts with '254', prepend '+'
+    elif phone_number.startswith('254'):
+        phone_number = '+' + phone_number
+    else:
+        return None
+
+    try:
+        parsed_phone = phonenumbers.parse(phone_number, None)
+    except phonenumbers.NumberParseException:
+        return None
+
+    if not phonenumbers.is_valid_number(parsed_phone):
+        return None
+
+    return phonenumbers.format_number(parsed_phone, phonenumbers.PhoneNumberFormat.E164)
@@ -0,0 +1,109 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from users.models import RevokedToken
+from .bloom import BloomFilter
+
+# Rows revoked this close to the previous sync are read again, so tokens revoked
+# by transactions that committed out of order are not missed.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class RevocationStore:
+    """
+    Per-process view of the RevokedToken table.
+
+    Every revoked `jti` is kept in an in-memory Bloom filter that is topped up
+    from the table every TOKEN_REVOCATION_SYNC_INTERVAL seconds and rebuilt
+    every TOKEN_REVOCATION_REBUILD_INTERVAL seconds to drop expired entries.
+    A token that is not in the filter is not revoked, which settles the common
+    case without a database round trip; filter hits are confirmed against the table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._capacity = 0
+        self._synced_at = None
+        self._next_sync = 0.0
+        self._next_rebuild = 0.0
+
+    def is_revoked(self, jti):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        if jti not in self._filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, expires_at):
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=jti, expires_at=expires_at)],
+            ignore_conflicts=True,
+        )
+        if self._filter is not None and jti not in self._filter:
+            self._filter.add(jti)
+
+    def sync(self, force_rebuild=False):
+        """
+        Pulls tokens revoked since the last sync into the filter,
+        rebuilding it from scratch when it is due or full.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force_rebuild and now < self._next_sync:
+                return
+
+            if (
+                force_rebuild
+                or self._filter is None
+                or now >= self._next_rebuild
+                or self._filter.count >= self._capacity
+            ):
+                self._rebuild()
+                self._next_rebuild = now + settings.TOKEN_REVOCATION_REBUILD_INTERVAL
+            else:
+                self._pull_new()
+            self._next_sync = now + settings.TOKEN_REVOCATION_SYNC_INTERVAL
+
+    def _rebuild(self):
+        started_at = timezone.now()
+        live = RevokedToken.objects.filter(expires_at__gt=started_at)
+        capacity = max(settings.TOKEN_REVOCATION_CAPACITY, 2 * live.count())
+        bloom = BloomFilter.for_capacity(capacity, settings.TOKEN_REVOCATION_ERROR_RATE)
+        for jti in live.values_list('jti', flat=True).iterator(chunk_size=10_000):
+            bloom.add(jti)
+        self._filter = bloom
+        self._capacity = capacity
+        self._synced_at = started_at
+
+    def _pull_new(self):
+        started_at = timezone.now()
+        recent = RevokedToken.objects.filter(revoked_at__gte=self._synced_at - SYNC_OVERLAP)
+        for jti in recent.values_list('jti', flat=True).iterator(chunk_size=10_000):
+            if jti not in self._filter:
+                self._filter.add(jti)
+        self._synced_at = started_at
+
+
+revocation_store = RevocationStore()
+
+
+def revoke_token(token):
+    """
+    Revokes a validated simplejwt token until it expires.
+    """
+    revocation_store.revoke(
+        token[api_settings.JTI_CLAIM],
+        datetime_from_epoch(token['exp']),
+    )
+
+
+def is_token_revoked(token):
+    return revocation_store.is_revoked(token[api_settings.JTI_CLAIM])
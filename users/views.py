@@ -1,4 +1,6 @@
 import os
+import io
+import csv
 import json
 import requests
 
@@ -10,20 +12,25 @@ from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.contrib.auth import logout
 
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
 
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
+from core.openapi import schema_overrides
+from core.parsers import ORJSONParser
 
+from .throttling import AUTH_THROTTLE_CLASSES
 from .serializers import (
     MyTokenObtainPairSerializer,
     CustomTokenRefreshSerializer,
@@ -32,15 +39,29 @@ from .serializers import (
     PasswordResetSerializer,
 
 )
-from .models import  User
+from .models import  User, UserPurge
+from .purge import schedule_user_purge
+from .hashing import aset_password, get_executor
+from .provisioning import provision_users
+from .utils.revocation import revoke_token
 from .utils.token_expiry import ExpiringPasswordResetTokenGenerator
 
 
-class MyTokenObtainPairView(TokenObtainPairView):
+class MyTokenObtainPairView(AsyncAPIView, TokenObtainPairView):
     """
     Generates access and refresh token when a user logs in
     """
     serializer_class = MyTokenObtainPairSerializer
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'login'
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Verifies the credentials in the password hashing pool and returns the token pair.
+        """
+        serializer = self.get_serializer(data=request.data)
+        await serializer.ais_valid(raise_exception=True)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 class CustomTokenRefreshView(TokenRefreshView):
     """
@@ -48,39 +69,72 @@ class CustomTokenRefreshView(TokenRefreshView):
     """
     serializer_class = CustomTokenRefreshSerializer
 
-class UserRegistration(APIView):
+class UserRegistration(AsyncAPIView):
     """
     Handles User registration
     """
     authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'register'
 
-    def post(self, request):
+    async def post(self, request):
         serializer = UserSerializer(data=request.data)
         
-        if serializer.is_valid():
-            serializer.save()
+        if await sync_to_async(serializer.is_valid)():
+            await serializer.acreate(serializer.validated_data)
             return Response(
                 {"message": "User created successfully"}, 
                 status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-class ChangePassword(APIView):
+class UserBulkProvision(APIView):
+    """
+    Creates users in bulk (sellers and couriers onboarded in batches).
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [ORJSONParser, MultiPartParser]
+
+    def post(self, request):
+        """
+        Creates the users given as a JSON list of user objects, or as an uploaded
+        CSV file (`file`) with one user per row.
+
+        Returns:
+            The number of users created and the errors of every rejected row.
+        """
+        upload = request.FILES.get('file')
+        if upload is not None:
+            rows = csv.DictReader(io.TextIOWrapper(upload, encoding='utf-8'))
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            return Response(
+                {"error": "Send a list of users or a CSV file."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Hashed in the shared pool rather than processes forked from this worker
+        report = provision_users(rows, executor=get_executor())
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class ChangePassword(AsyncAPIView):
     """
     Allows authenticated users to change their password.
     """
 
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
+    async def post(self, request):
         """
         Handle the POST request for changing the password.
         
         """
         serializer = ChangePasswordSerializer(data=request.data, context={'request':request})
-        if serializer.is_valid():
-            serializer.save()
+        if await serializer.ais_valid():
+            await serializer.asave()
             return Response({"message": _("Password changed successfully.")}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -89,6 +143,8 @@ class PasswordReset(APIView):
     """
     Handles sending a password reset email.
     """
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'password_reset'
 
     def post(self, request):
         """
@@ -144,11 +200,11 @@ class PasswordReset(APIView):
 
         return Response({"message": _("If an account exists, a password reset link will be sent.")}, status=status.HTTP_200_OK)
 
-class PasswordResetConfirm(APIView):
+class PasswordResetConfirm(AsyncAPIView):
     """
     Handles setting the new password after confirming the reset token
     """
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         """
         Validate the token shared with the url in the password reset api along with receiving the new password. 
 
@@ -162,7 +218,7 @@ class PasswordResetConfirm(APIView):
         token = kwargs.get('token')
         try:
             uid = force_str(urlsafe_base64_decode(uidb64))
-            user = User.objects.get(pk=uid)
+            user = await User.objects.aget(pk=uid)
         except (TypeError, ValueError, OverflowError, User.DoesNotExist):
             return Response({"error": "Invalid user or token"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -179,24 +235,24 @@ class PasswordResetConfirm(APIView):
         if not serializer.is_valid():
             return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
         
-        user.set_password(password1)
-        user.save()
+        await aset_password(user, password1)
+        await user.asave()
 
         return Response({"message": "Password reset successful"}, status=status.HTTP_200_OK)
     
 class UserLogout(APIView):
     """
-    Handles user logout by ensuring the client removes the refresh token.
+    Handles user logout by revoking the refresh token and the current access token.
     """
     permission_classes = (IsAuthenticated,)
 
-    @swagger_auto_schema(
+    @schema_overrides(
         operation_summary="User Logout",
         responses={200: "OK"},
     )
     def post(self, request):
         """
-        Logs out the user by invalidating the token on the client-side.
+        Logs out the user by revoking both tokens until they expire.
 
         Args:
             request: The HTTP request containing the refresh token.
@@ -217,6 +273,16 @@ class UserLogout(APIView):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        if token.get(api_settings.USER_ID_CLAIM) != request.user.pk:
+            return Response(
+                {"error": "Refresh token does not belong to this user."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        revoke_token(token)
+        if request.auth is not None:
+            revoke_token(request.auth)
+
         logout(request)
         return Response({"detail": "Successfully logged out."}, status=status.HTTP_200_OK)
 
@@ -224,7 +290,8 @@ class DeleteUser(APIView):
     """
     Deletes a user from the database.
 
-    This class handles the logic for deleting a user from the database.
+    The user is deactivated immediately; their data is then removed in the
+    background in bounded chunks (see users.purge).
     """
     permission_classes = [IsAdminUser, IsAuthenticated]
 
@@ -237,7 +304,7 @@ class DeleteUser(APIView):
             email: Email address of the user to be deleted.
 
         Returns:
-            Response indicating whether the user was deleted successfully.
+            Response with the id of the purge job tracking the deletion.
         """
         if not email:
             return Response({"error": "Email is required to delete a user"}, status=status.HTTP_400_BAD_REQUEST)
@@ -247,5 +314,32 @@ class DeleteUser(APIView):
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        user.delete()
-        return Response({"message": "User deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
+        purge = schedule_user_purge(user)
+        return Response(
+            {"message": "User deactivated, deletion scheduled", "purge_id": purge.pk},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class DeleteUserStatus(APIView):
+    """
+    Reports the progress of a user deletion.
+    """
+    permission_classes = [IsAdminUser, IsAuthenticated]
+
+    def get(self, request, purge_id):
+        try:
+            purge = UserPurge.objects.get(pk=purge_id)
+        except UserPurge.DoesNotExist:
+            return Response({"error": "Deletion not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "purge_id": purge.pk,
+            "email": purge.email,
+            "status": purge.status,
+            "current_step": purge.current_step,
+            "rows_deleted": purge.rows_deleted,
+            "error": purge.error,
+            "created_at": purge.created_at,
+            "finished_at": purge.finished_at,
+        })